@@ -217,12 +217,41 @@ export async function updateGrade(assignmentId, data) {
   return handleResponse(res)
 }
 
+export async function bulkUpdateGrades(assignmentId, grades) {
+  const res = await fetch(`/api/grades/assignment/${assignmentId}/grades/bulk`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ grades }),
+    credentials: 'include'
+  })
+  return handleResponse(res)
+}
+
+export async function importGradesCSV(assignmentId, formData) {
+  const res = await fetch(`/api/grades/assignment/${assignmentId}/grades/import`, {
+    method: 'POST',
+    body: formData,
+    credentials: 'include'
+  })
+  return handleResponse(res)
+}
+
 // Announcements
 export async function getAnnouncements(classId) {
   const res = await fetch(`/api/announcements/${classId}/announcements`, { credentials: 'include' })
   return handleResponse(res)
 }
 
+// One page of announcements, newest first: resolves to { items, nextCursor }
+export async function getAnnouncementsPage(classId, { limit = 20, cursor } = {}) {
+  const params = new URLSearchParams({ limit })
+  if (cursor) params.set('cursor', cursor)
+  const res = await fetch(`/api/announcements/${classId}/announcements?${params}`, { credentials: 'include' })
+  const data = await handleResponse(res)
+  if (data.error) return data
+  return { items: data, nextCursor: res.headers.get('X-Next-Cursor') }
+}
+
 export async function createAnnouncement(classId, data) {
   const res = await fetch(`/api/announcements/${classId}/announcements`, {
     method: 'POST',
@@ -4,9 +4,9 @@ import {
   getClassroom, getRoster, getAttendanceSessions, createAttendanceSession,
   checkinAttendance, getAssignments, getAttendanceSessionDetails, updateAttendanceSession, deleteClassroom,
   removeStudentFromClass, getClassroomStatistics, addStudentToClass, manualAttendanceCheckin,
-  createAssignment, getGrades, updateGrade,
+  createAssignment, getGrades, updateGrade, bulkUpdateGrades, importGradesCSV,
   importRosterCSV, exportRosterCSV, exportAttendanceCSV, exportGradesCSV,
-  getAnnouncements, createAnnouncement, updateAnnouncement, deleteAnnouncement
+  getAnnouncementsPage, createAnnouncement, updateAnnouncement, deleteAnnouncement
 } from '@/api/apiClient'
 import { getInitials } from '@/lib/utils'
 import {
@@ -97,6 +97,7 @@ export default function ClassDetail() {
   const [assignments, setAssignments] = useState(null)
   const [stats, setStats] = useState(null)
   const [announcements, setAnnouncements] = useState(null)
+  const [announcementsCursor, setAnnouncementsCursor] = useState(null)
 
   const [checkinCode, setCheckinCode] = useState('')
 
@@ -177,7 +178,7 @@ export default function ClassDetail() {
     const promises = [
       getAttendanceSessions(id),
       getAssignments(id),
-      getAnnouncements(id)
+      getAnnouncementsPage(id)
     ]
 
     if (classroomData.is_instructor) {
@@ -189,7 +190,8 @@ export default function ClassDetail() {
 
     setAttendanceSessions(Array.isArray(results[0]) ? results[0] : [])
     setAssignments(Array.isArray(results[1]) ? results[1] : [])
-    setAnnouncements(Array.isArray(results[2]) ? results[2] : [])
+    setAnnouncements(Array.isArray(results[2]?.items) ? results[2].items : [])
+    setAnnouncementsCursor(results[2]?.nextCursor || null)
 
     if (classroomData.is_instructor) {
       setRoster(Array.isArray(results[3]) ? results[3] : [])
@@ -206,6 +208,20 @@ export default function ClassDetail() {
     fetchData()
   }, [fetchData])
 
+  // Rotating session codes expire; fetch the next one when the current one does
+  const rotatingSessionId = selectedSession?.is_open && selectedSession?.code_expires_at
+    ? selectedSession.id : null
+  const codeExpiresAt = selectedSession?.code_expires_at
+  useEffect(() => {
+    if (!rotatingSessionId || !sessionSheetOpen) return
+    const delay = Math.max(new Date(codeExpiresAt).getTime() - Date.now(), 0) + 250
+    const timer = setTimeout(async () => {
+      const details = await getAttendanceSessionDetails(rotatingSessionId)
+      if (details && !details.error) setSelectedSession(details)
+    }, delay)
+    return () => clearTimeout(timer)
+  }, [rotatingSessionId, codeExpiresAt, sessionSheetOpen])
+
 
 
   if (!classroom) {
@@ -285,6 +301,17 @@ export default function ClassDetail() {
   }
 
   // Announcement handlers
+  const handleLoadMoreAnnouncements = async () => {
+    if (!announcementsCursor) return
+    const page = await getAnnouncementsPage(id, { cursor: announcementsCursor })
+    if (page.error) {
+      toast.error("Failed to load announcements")
+      return
+    }
+    setAnnouncements(prev => [...(prev || []), ...page.items])
+    setAnnouncementsCursor(page.nextCursor || null)
+  }
+
   const handleOpenAnnouncementDialog = (announcement = null) => {
     if (announcement) {
       setEditingAnnouncement(announcement)
@@ -398,6 +425,39 @@ export default function ClassDetail() {
     }
   }
 
+  const reportGradeResults = (res) => {
+    const saved = (res.created || 0) + (res.updated || 0)
+    if (res.error) {
+      // A CSV that breaks partway keeps the grades saved before the bad line
+      toast.error(saved ? `${res.error} (${saved} grades saved)` : res.error)
+      return
+    }
+    if (res.failed) {
+      toast.error(`Saved ${saved} grades, ${res.failed} failed`)
+    } else {
+      toast.success(`Saved ${saved} grades`)
+    }
+  }
+
+  const handleSaveAllGrades = async () => {
+    const grades = studentGrades
+      .filter(s => s.score !== '' && s.score !== null && s.score !== undefined)
+      .map(s => ({ student_id: s.id, score: s.score, feedback: s.feedback || null }))
+    if (grades.length === 0) return
+    reportGradeResults(await bulkUpdateGrades(selectedAssignment.id, grades))
+  }
+
+  const handleImportGrades = async (event) => {
+    const file = event.target.files[0]
+    if (!file) return
+    const formData = new FormData()
+    formData.append('file', file)
+    const res = await importGradesCSV(selectedAssignment.id, formData)
+    reportGradeResults(res)
+    if (!res.error || res.created || res.updated) handleOpenGrading(selectedAssignment)
+    event.target.value = null
+  }
+
   // Attendance handlers
   const handleCreateSession = async () => {
     await createAttendanceSession(id)
@@ -657,6 +717,11 @@ export default function ClassDetail() {
                       </CardContent>
                     </Card>
                   ))}
+                  {announcementsCursor && (
+                    <Button variant="outline" className="w-full" onClick={handleLoadMoreAnnouncements}>
+                      Load older announcements
+                    </Button>
+                  )}
                 </div>
               )}
             </div>
@@ -843,7 +908,7 @@ export default function ClassDetail() {
                     <TableBody>
                       {attendanceSessions.map((session) => {
                         // Calculate attendance stats
-                        const presentCount = session.records?.filter(r => r.status === 'present').length || 0;
+                        const presentCount = session.counts?.present || 0;
                         const totalStudents = roster?.length || 0;
                         const rate = totalStudents > 0 ? Math.round((presentCount / totalStudents) * 100) : 0;
 
@@ -943,7 +1008,7 @@ export default function ClassDetail() {
               {/* Mobile View */}
               <div className="md:hidden space-y-4">
                 {attendanceSessions.map((session) => {
-                  const presentCount = session.records?.filter(r => r.status === 'present').length || 0;
+                  const presentCount = session.counts?.present || 0;
                   const totalStudents = roster?.length || 0;
                   const rate = totalStudents > 0 ? Math.round((presentCount / totalStudents) * 100) : 0;
 
@@ -1520,6 +1585,21 @@ export default function ClassDetail() {
               {selectedAssignment?.points_possible} points possible
             </SheetDescription>
           </SheetHeader>
+          {studentGrades.length > 0 && (
+            <div className="flex flex-wrap gap-2 pt-4">
+              <Button size="sm" onClick={handleSaveAllGrades}>
+                <Check className="mr-2 h-4 w-4" />
+                Save All
+              </Button>
+              <Button size="sm" variant="outline" asChild>
+                <label className="cursor-pointer">
+                  <Upload className="mr-2 h-4 w-4" />
+                  Import Scores
+                  <input type="file" hidden accept=".csv" onChange={handleImportGrades} />
+                </label>
+              </Button>
+            </div>
+          )}
           <div className="py-4">
             {studentGrades.length === 0 ? (
               <p className="text-muted-foreground text-center py-8">No students to grade</p>
@@ -0,0 +1,103 @@
+"""
+Attendance check-in codes.
+
+Sessions use one of two code modes, chosen at creation with
+ATTENDANCE_CODE_MODE:
+
+- 'static' (default): a random 4-digit code stored on the session.
+- 'rotating': a 6-digit code derived from an HMAC of the session id and the
+  current time step (TOTP-style, RFC 6238 truncation). It changes every
+  ATTENDANCE_CODE_PERIOD seconds without any write, and checking it is pure
+  CPU work. Codes from the previous ATTENDANCE_CODE_WINDOW steps are still
+  accepted so a code read off the projector just before it changes works.
+
+The HMAC key is ATTENDANCE_CODE_SECRET, falling back to SECRET_KEY; it must
+be the same on every worker.
+"""
+import datetime
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import time
+
+CODE_MODES = ('static', 'rotating')
+ROTATING_DIGITS = 6
+
+
+def code_mode():
+    mode = os.getenv('ATTENDANCE_CODE_MODE', 'static')
+    if mode not in CODE_MODES:
+        raise ValueError(f"Unknown ATTENDANCE_CODE_MODE: {mode}")
+    return mode
+
+
+def _period():
+    return int(os.getenv('ATTENDANCE_CODE_PERIOD', '30'))
+
+
+def _window():
+    return int(os.getenv('ATTENDANCE_CODE_WINDOW', '1'))
+
+
+def _secret():
+    key = os.getenv('ATTENDANCE_CODE_SECRET') or os.getenv('SECRET_KEY', 'dev-secret')
+    return key.encode('utf-8')
+
+
+def static_code():
+    """Generate a random 4-digit code."""
+    return ''.join(secrets.choice(string.digits) for _ in range(4))
+
+
+def rotating_code(session_id, step):
+    """Return the code for ``session_id`` during time step ``step``."""
+    digest = hmac.new(_secret(), f"{session_id}:{step}".encode('utf-8'),
+                      hashlib.sha256).digest()
+    offset = digest[-1] & 0x0F
+    value = int.from_bytes(digest[offset:offset + 4], 'big') & 0x7FFFFFFF
+    return str(value % 10 ** ROTATING_DIGITS).zfill(ROTATING_DIGITS)
+
+
+def code_step(now=None):
+    """Return the current rotating-code time step."""
+    now = time.time() if now is None else now
+    return int(now // _period())
+
+
+def current_code(session_id, now=None):
+    """Return ``(code, expires_at)`` for a rotating session; expires_at is naive UTC."""
+    now = time.time() if now is None else now
+    period = _period()
+    step = int(now // period)
+    expires_at = datetime.datetime.utcfromtimestamp((step + 1) * period)
+    return rotating_code(session_id, step), expires_at
+
+
+def display_code(session):
+    """Return ``(code, expires_at)`` to show the instructor; expires_at is None for static codes."""
+    if session.code_mode == 'rotating':
+        return current_code(session.pk)
+    return session.code, None
+
+
+def row_display_code(row):
+    """``display_code`` for a raw session row (``as_pymongo()`` or ``to_mongo()``)."""
+    if row.get('code_mode') == 'rotating':
+        return current_code(row['_id'])
+    return row.get('code'), None
+
+
+def code_matches(session_id, mode, stored_code, code, now=None):
+    """Check a submitted ``code`` for a session without touching storage."""
+    if not code:
+        return False
+    if mode != 'rotating':
+        return stored_code == code
+
+    # compare_digest only takes ASCII str, so compare bytes; any input is safe
+    submitted = str(code).encode('utf-8')
+    step = code_step(now)
+    return any(hmac.compare_digest(rotating_code(session_id, step - back).encode(), submitted)
+               for back in range(_window() + 1))
@@ -0,0 +1,265 @@
+"""
+Attendance record storage.
+
+Records live in one of two layouts, chosen with ATTENDANCE_STORAGE:
+
+- 'embedded' (default): the ``records`` list inside each AttendanceSession.
+- 'collection': one AttendanceEntry document per (session, student), with a
+  unique (session, student) index and a (classroom, student) index, so a
+  session read never ships every record and a check-in never rewrites an array.
+
+Everything that reads or writes records goes through this module and works
+with plain dicts (``{'student': ObjectId, 'status': str, 'timestamp': datetime}``).
+Move existing data with ``flask migrate-attendance`` before switching layouts.
+"""
+import datetime
+import os
+from mongoengine.errors import NotUniqueError
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from models import User, AttendanceSession, AttendanceRecord, AttendanceEntry
+
+STORAGE_MODES = ('embedded', 'collection')
+STATUSES = ('present', 'late', 'absent', 'excused')
+
+
+def storage_mode():
+    mode = os.getenv('ATTENDANCE_STORAGE', 'embedded')
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown ATTENDANCE_STORAGE: {mode}")
+    return mode
+
+
+def records_by_session(session_ids):
+    """Return ``{session_id: [record, ...]}`` for the given sessions."""
+    result = {sid: [] for sid in session_ids}
+    if not session_ids:
+        return result
+
+    if storage_mode() == 'collection':
+        entries = AttendanceEntry.objects(session__in=list(session_ids)) \
+            .only('session', 'student', 'status', 'timestamp').as_pymongo()
+        for e in entries:
+            result[e['session']].append(e)
+        return result
+
+    sessions = AttendanceSession.objects(id__in=list(session_ids)) \
+        .only('id', 'records').as_pymongo()
+    for sess in sessions:
+        result[sess['_id']] = [r for r in sess.get('records', []) if r.get('student')]
+    return result
+
+
+def status_map(session_ids):
+    """Return ``{session_id: {student_id: status}}`` for the given sessions."""
+    return {
+        sid: {r['student']: r.get('status', 'absent') for r in records}
+        for sid, records in records_by_session(session_ids).items()
+    }
+
+
+def _missing_students(session_ids):
+    """Return ids of users with records in the sessions who no longer exist."""
+    if storage_mode() == 'collection':
+        recorded = AttendanceEntry._get_collection().distinct(
+            'student', {'session': {'$in': session_ids}})
+    else:
+        recorded = AttendanceSession._get_collection().distinct(
+            'records.student', {'_id': {'$in': session_ids}})
+    existing = set(User.objects(id__in=recorded).distinct('id'))
+    return [student for student in recorded if student not in existing]
+
+
+def status_counts(session_ids):
+    """Return ``{session_id: {status: count}}`` with every status in STATUSES.
+
+    The counting runs as an aggregation, so only the totals leave the
+    database. Records of deleted users are not counted.
+    """
+    session_ids = list(session_ids)
+    result = {sid: dict.fromkeys(STATUSES, 0) for sid in session_ids}
+    if not session_ids:
+        return result
+
+    missing = _missing_students(session_ids)
+    if storage_mode() == 'collection':
+        match = {'session': {'$in': session_ids}}
+        if missing:
+            match['student'] = {'$nin': missing}
+        rows = AttendanceEntry.objects.aggregate([
+            {'$match': match},
+            {'$group': {'_id': {'session': '$session', 'status': '$status'},
+                        'count': {'$sum': 1}}},
+        ])
+    else:
+        rows = AttendanceSession.objects.aggregate([
+            {'$match': {'_id': {'$in': session_ids}}},
+            {'$unwind': '$records'},
+            {'$match': {'records.student': {'$exists': True, '$nin': missing}}},
+            {'$group': {'_id': {'session': '$_id', 'status': '$records.status'},
+                        'count': {'$sum': 1}}},
+        ])
+
+    for row in rows:
+        counts = result[row['_id']['session']]
+        # Records without a status read as absent, as in status_map
+        status = row['_id'].get('status') or 'absent'
+        counts[status] = counts.get(status, 0) + row['count']
+    return result
+
+
+def checked_in_sessions(session_ids, student_id):
+    """Return the ids of the sessions that have a record for ``student_id``."""
+    session_ids = list(session_ids)
+    if not session_ids:
+        return set()
+    if storage_mode() == 'collection':
+        return set(AttendanceEntry._get_collection().distinct(
+            'session', {'session': {'$in': session_ids}, 'student': student_id}))
+    # $elemMatch answers from the session documents without shipping records
+    return set(AttendanceSession._get_collection().distinct('_id', {
+        '_id': {'$in': session_ids},
+        'records': {'$elemMatch': {'student': student_id}}
+    }))
+
+
+def attendance_totals(classroom_id):
+    """Return ``(session_count, present_record_count)`` for the collection layout."""
+    return (AttendanceSession.objects(classroom=classroom_id).count(),
+            AttendanceEntry.objects(classroom=classroom_id, status='present').count())
+
+
+def add_checkin(session_id, classroom_id, student, code):
+    """Record ``student`` as present if the session is open and the code matches.
+
+    Pass ``code=None`` for sessions whose code is not stored (rotating codes,
+    already checked by the caller). Returns 'added', 'duplicate' or 'closed'.
+    """
+    if storage_mode() == 'collection':
+        # The entry lives outside the session document, so the open check is
+        # a separate read; a check-in racing the close itself may still land
+        conditions = {'is_open': True}
+        if code is not None:
+            conditions['code'] = code
+        if not AttendanceSession.objects(id=session_id, **conditions).only('id').first():
+            return 'closed'
+        try:
+            AttendanceEntry(session=session_id, classroom=classroom_id,
+                            student=student, status='present').save()
+        except NotUniqueError:
+            # The unique (session, student) index rejects a second check-in
+            return 'duplicate'
+        return 'added'
+
+    # Single conditional write: only pushes if the session is still open, the
+    # code still matches and the student has no record yet. Concurrent
+    # check-ins cannot overwrite each other or create duplicates.
+    conditions = {'is_open': True, 'records__student__ne': student.pk}
+    if code is not None:
+        conditions['code'] = code
+    added = AttendanceSession.objects(id=session_id, **conditions) \
+        .update_one(push__records=AttendanceRecord(student=student, status='present'))
+    if added:
+        return 'added'
+
+    # Work out which condition failed
+    current = AttendanceSession.objects(id=session_id).only('is_open', 'code').first()
+    if not current or not current.is_open or (code is not None and current.code != code):
+        return 'closed'
+    return 'duplicate'
+
+
+def add_checkins_bulk(entries):
+    """Write many present records in one unordered bulk_write.
+
+    ``entries`` are dicts with 'session', 'classroom', 'student' (ObjectIds)
+    and 'timestamp'. Students who already have a record are skipped, so the
+    same batch can be written twice. Returns the number of records added.
+    """
+    if storage_mode() == 'collection':
+        collection = AttendanceEntry._get_collection()
+        ops = [InsertOne({'session': e['session'], 'classroom': e['classroom'],
+                          'student': e['student'], 'status': 'present',
+                          'timestamp': e['timestamp']})
+               for e in entries]
+    else:
+        collection = AttendanceSession._get_collection()
+        ops = [UpdateOne({'_id': e['session'], 'records.student': {'$ne': e['student']}},
+                         {'$push': {'records': {'student': e['student'], 'status': 'present',
+                                                'timestamp': e['timestamp']}}})
+               for e in entries]
+    if not ops:
+        return 0
+
+    try:
+        result = collection.bulk_write(ops, ordered=False).bulk_api_result
+    except BulkWriteError as exc:
+        result = exc.details
+        # Duplicate keys are students already checked in; anything else is real
+        if any(err.get('code') != 11000 for err in result.get('writeErrors', [])):
+            raise
+    return result.get('nInserted', 0) + result.get('nModified', 0)
+
+
+def set_status(session_id, classroom_id, student, status):
+    """Create or update ``student``'s record. Returns the previous status or None."""
+    now = datetime.datetime.utcnow()
+
+    if storage_mode() == 'collection':
+        before = AttendanceEntry._get_collection().find_one_and_update(
+            {'session': session_id, 'student': student.pk},
+            {'$set': {'status': status, 'timestamp': now,
+                      'classroom': classroom_id}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        return before.get('status') if before else None
+
+    session = AttendanceSession.objects(id=session_id).only('records').as_pymongo().first()
+    existing = next((r for r in (session or {}).get('records', [])
+                     if r.get('student') == student.pk), None)
+    if existing:
+        AttendanceSession.objects(id=session_id, records__student=student.pk) \
+            .update_one(set__records__S__status=status, set__records__S__timestamp=now)
+        return existing.get('status')
+
+    AttendanceSession.objects(id=session_id, records__student__ne=student.pk) \
+        .update_one(push__records=AttendanceRecord(
+            student=student, status=status, timestamp=now))
+    return None
+
+
+def migrate_embedded_records(clear_embedded=False, batch_size=1000):
+    """Copy embedded session records into AttendanceEntry documents.
+
+    Idempotent: existing entries are left alone. With ``clear_embedded`` the
+    embedded lists are emptied once copied. Returns ``(sessions, records)``.
+    """
+    collection = AttendanceEntry._get_collection()
+    sessions_done = 0
+    records_done = 0
+
+    sessions = AttendanceSession.objects(records__0__exists=True) \
+        .only('id', 'classroom', 'records').as_pymongo()
+    for sess in sessions:
+        ops = [
+            UpdateOne(
+                {'session': sess['_id'], 'student': r['student']},
+                {'$setOnInsert': {
+                    'classroom': sess['classroom'],
+                    'status': r.get('status', 'absent'),
+                    'timestamp': r.get('timestamp') or datetime.datetime.utcnow()
+                }},
+                upsert=True
+            )
+            for r in sess.get('records', []) if r.get('student')
+        ]
+        for start in range(0, len(ops), batch_size):
+            collection.bulk_write(ops[start:start + batch_size], ordered=False)
+
+        if clear_embedded:
+            AttendanceSession.objects(id=sess['_id']).update_one(set__records=[])
+        sessions_done += 1
+        records_done += len(ops)
+
+    return sessions_done, records_done
@@ -0,0 +1,111 @@
+"""
+Sustained check-in throughput: direct writes vs the write buffer.
+
+Drives /api/roster/attendance/checkin through the Flask test client from a
+pool of threads (standing in for gunicorn's sync workers) and reports
+check-ins per second for CHECKIN_INGESTION=direct and =buffered. The
+buffered figure is end to end: the clock stops after the final flush.
+
+Run from the server directory:
+
+    python benchmarks/checkin_throughput.py --mongo-uri mongodb://localhost:27017/bench
+    python benchmarks/checkin_throughput.py            # mongomock, CPU cost only
+
+Use a throwaway database; the documents it creates are removed afterwards.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+os.environ['TESTING'] = 'True'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _connect(mongo_uri):
+    import mongoengine
+    if mongo_uri:
+        mongoengine.connect(host=mongo_uri)
+    else:
+        import mongomock
+        mongoengine.connect('checkin_bench', mongo_client_class=mongomock.MongoClient)
+
+
+def _run(app, session_id, code, student_ids, threads):
+    clients = []
+    for student_id in student_ids:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = str(student_id)
+        clients.append(client)
+
+    def check_in(client):
+        response = client.post('/api/roster/attendance/checkin',
+                               json={'session_id': session_id, 'code': code})
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(check_in, clients))
+    acknowledged = time.perf_counter() - start
+    return statuses, start, acknowledged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mongo-uri', help='MongoDB to benchmark against (default: mongomock)')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--storage', choices=('embedded', 'collection'), default='embedded')
+    args = parser.parse_args()
+
+    os.environ['ATTENDANCE_STORAGE'] = args.storage
+    _connect(args.mongo_uri)
+
+    import checkin_buffer
+    from attendance_store import status_map
+    from main import app
+    from models import AttendanceEntry, AttendanceSession, Classroom, User
+
+    instructor = User(email='bench-instructor@example.com', google_id='bench-instructor',
+                      name='Bench Instructor', role='instructor').save()
+    students = [User(email=f'bench-{i}@example.com', google_id=f'bench-{i}',
+                     name=f'Bench Student {i}', role='student').save()
+                for i in range(args.students)]
+    classroom = Classroom(name='Benchmark', term='Bench', instructor=instructor,
+                          students=students, join_code='BENCH-CHECKIN').save()
+    student_ids = [s.id for s in students]
+
+    try:
+        print(f"{args.students} check-ins, {args.threads} threads, "
+              f"{args.storage} storage, {'MongoDB' if args.mongo_uri else 'mongomock'}")
+        for mode in ('direct', 'buffered'):
+            os.environ['CHECKIN_INGESTION'] = mode
+            session_obj = AttendanceSession(classroom=classroom, code='4242').save()
+            buffer = None
+            if mode == 'buffered':
+                buffer = checkin_buffer.CheckinBuffer(spill_dir=tempfile.mkdtemp())
+                checkin_buffer._buffer = buffer
+
+            statuses, start, acknowledged = _run(
+                app, str(session_obj.id), '4242', student_ids, args.threads)
+            if buffer is not None:
+                buffer.close()
+            total = time.perf_counter() - start
+
+            written = len(status_map([session_obj.id])[session_obj.id])
+            assert statuses.count(200) == written == args.students, (statuses[:5], written)
+            print(f"  {mode:<9} {args.students / total:8.0f} check-ins/s end to end"
+                  f"   ({args.students / acknowledged:8.0f}/s acknowledged)")
+    finally:
+        AttendanceEntry.objects(classroom=classroom).delete()
+        AttendanceSession.objects(classroom=classroom).delete()
+        classroom.delete()
+        User.objects(id__in=student_ids + [instructor.id]).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Read-path cost: MongoEngine documents vs lean raw rows.
+
+Requests the roster, session list, assignment list and grade list of one
+large class through the Flask test client with LEAN_READS=none and =all,
+and reports milliseconds per request and peak Python memory per request.
+
+Run from the server directory:
+
+    python benchmarks/lean_reads.py --mongo-uri mongodb://localhost:27017/bench
+    python benchmarks/lean_reads.py            # mongomock, CPU cost only
+
+Use a throwaway database; the documents it creates are removed afterwards.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+os.environ['TESTING'] = 'True'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _connect(mongo_uri):
+    import mongoengine
+    if mongo_uri:
+        mongoengine.connect(host=mongo_uri)
+    else:
+        import mongomock
+        mongoengine.connect('lean_bench', mongo_client_class=mongomock.MongoClient)
+
+
+def _measure(client, url, repeat):
+    client.get(url)  # warm up identity map imports, index checks, etc.
+    start = time.perf_counter()
+    for _ in range(repeat):
+        assert client.get(url).status_code == 200
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    client.get(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mongo-uri', help='MongoDB to benchmark against (default: mongomock)')
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--assignments', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    _connect(args.mongo_uri)
+
+    from attendance_store import add_checkins_bulk
+    from lean_reads import configure_lean_reads
+    from main import app
+    from models import (AttendanceEntry, AttendanceSession, Assignment, Classroom,
+                        Grade, User)
+
+    instructor = User(email='bench-instructor@example.com', google_id='bench-instructor',
+                      name='Bench Instructor', role='instructor').save()
+    students = [User(email=f'bench-{i}@example.com', google_id=f'bench-{i}',
+                     name=f'Bench Student {i}', role='student', major='Physics',
+                     grad_year=2027).save()
+                for i in range(args.students)]
+    classroom = Classroom(name='Benchmark', term='Bench', instructor=instructor,
+                          students=students, join_code='BENCH-LEAN').save()
+    student_ids = [s.id for s in students]
+
+    try:
+        for _ in range(args.sessions):
+            session_obj = AttendanceSession(classroom=classroom, code='4242').save()
+            add_checkins_bulk([{'session': session_obj.id, 'classroom': classroom.id,
+                                'student': s, 'timestamp': session_obj.date}
+                               for s in student_ids])
+        assignments = [Assignment(classroom=classroom, title=f'Assignment {i}',
+                                  points_possible=10).save()
+                       for i in range(args.assignments)]
+        Grade.objects.insert([Grade(assignment=assignments[0], student=s, score=8)
+                              for s in students])
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = str(instructor.id)
+
+        routes = {
+            'roster': f'/api/roster/{classroom.id}/students',
+            'sessions': f'/api/roster/{classroom.id}/attendance/sessions',
+            'assignments': f'/api/grades/{classroom.id}/assignments',
+            'grades': f'/api/grades/assignment/{assignments[0].id}/grades',
+        }
+        print(f"{args.students} students, {args.sessions} sessions, "
+              f"{args.assignments} assignments, "
+              f"{'MongoDB' if args.mongo_uri else 'mongomock'}")
+        for route, url in routes.items():
+            results = {}
+            for mode in ('none', 'all'):
+                os.environ['LEAN_READS'] = mode
+                configure_lean_reads()
+                results[mode] = _measure(client, url, args.repeat)
+            (doc_time, doc_peak), (lean_time, lean_peak) = results['none'], results['all']
+            print(f"  {route:<12} documents {doc_time * 1000:7.1f} ms {doc_peak / 1024:7.0f} KiB"
+                  f"   lean {lean_time * 1000:7.1f} ms {lean_peak / 1024:7.0f} KiB")
+    finally:
+        Grade.objects(assignment__in=Assignment.objects(classroom=classroom)).delete()
+        Assignment.objects(classroom=classroom).delete()
+        AttendanceEntry.objects(classroom=classroom).delete()
+        AttendanceSession.objects(classroom=classroom).delete()
+        classroom.delete()
+        User.objects(id__in=student_ids + [instructor.id]).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Write-buffered attendance check-in.
+
+With CHECKIN_INGESTION=buffered, ``/api/roster/attendance/checkin`` validates
+against the open-session cache (see session_cache), appends the check-in to
+a local spill file and answers without waiting on MongoDB. A background thread
+writes accepted check-ins with one ``bulk_write`` per classroom every
+CHECKIN_FLUSH_MS milliseconds.
+
+Durability: a check-in is acknowledged only after its line is fsynced to the
+worker's current spill segment. Each flush closes the segment and deletes it
+once the batch is in MongoDB; a segment that fails to write is retried on
+the next flush. Every buffer holds an exclusive flock on its own lock file
+for as long as it lives, and the kernel drops it when the process dies, so
+a lock that can be taken marks a dead owner whatever its PID was reused
+for. Live buffers look for such owners when they start and every
+CHECKIN_RECOVER_INTERVAL seconds, and replay their segments. Writes skip
+students who already have a record, so replaying a segment twice is harmless.
+
+Trade-off: accepted check-ins are never re-checked against the database,
+and the bulk write does not look at the session's open flag or code. A
+session closed or given a new code on a host that does not share
+CHECKIN_CACHE_DIR can therefore still accept the previous code for up to
+CHECKIN_CACHE_TTL seconds (60 by default; lower it for multi-host setups).
+On one host invalidation is immediate. Rejections are always re-checked.
+
+Duplicate check-ins are answered from an in-memory set per session. Sets
+idle for CHECKIN_SEEN_TTL seconds are dropped; a repeat after that is
+acknowledged again and skipped when written.
+"""
+import atexit
+import datetime
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from bson import ObjectId
+from attendance_store import add_checkins_bulk
+from classroom_stats import record_attendance_change
+from etags import bump_version
+from session_cache import validate_checkin
+
+INGESTION_MODES = ('direct', 'buffered')
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def ingestion_mode():
+    mode = os.getenv('CHECKIN_INGESTION', 'direct')
+    if mode not in INGESTION_MODES:
+        raise ValueError(f"Unknown CHECKIN_INGESTION: {mode}")
+    return mode
+
+
+def _spill_dir():
+    return os.getenv('CHECKIN_SPILL_DIR',
+                     os.path.join(tempfile.gettempdir(), 'rooster-checkins'))
+
+
+class CheckinBuffer:
+    """Accepts check-ins in memory and on disk, and flushes them in batches."""
+
+    def __init__(self, spill_dir=None, start_flusher=True):
+        self.spill_dir = spill_dir or _spill_dir()
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.pid = os.getpid()
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # {session_id: (last_used, {student_id})}, least recently used first
+        self._seen = OrderedDict()
+        self._seen_ttl = float(os.getenv('CHECKIN_SEEN_TTL', '3600'))
+        self._pending = []
+        self._segment = 0
+        self._replayed = 0
+        self._spill = None
+        self._recover_interval = float(os.getenv('CHECKIN_RECOVER_INTERVAL', '30'))
+        self._last_recover = 0
+
+        self._owner_lock = self._take_owner_lock()
+        self._retry = self._recover()
+        self._open_segment()
+
+        if start_flusher:
+            interval = int(os.getenv('CHECKIN_FLUSH_MS', '250')) / 1000
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+            thread.start()
+            atexit.register(self.close)
+
+    def submit(self, session_id, code, student_id):
+        """Validate and accept a check-in.
+
+        Returns 'added', 'duplicate', 'closed', 'invalid_code' or 'not_enrolled'.
+        """
+        student_id = ObjectId(student_id)
+        outcome, session = validate_checkin(session_id, code, student_id)
+        if outcome != 'ok':
+            if outcome == 'closed' and session is not None:
+                with self._lock:
+                    self._seen.pop(session.id, None)
+            return outcome
+
+        entry = {'session': session.id, 'classroom': session.classroom_id,
+                 'student': student_id, 'timestamp': datetime.datetime.utcnow()}
+        with self._lock:
+            now = time.monotonic()
+            _, seen = self._seen.pop(session.id, (now, set()))
+            self._seen[session.id] = (now, seen)
+            if student_id in seen:
+                return 'duplicate'
+            self._write_spill(entry)
+            seen.add(student_id)
+            self._pending.append(entry)
+        return 'added'
+
+    def _evict_seen(self):
+        """Drop the duplicate sets of sessions idle for longer than CHECKIN_SEEN_TTL."""
+        cutoff = time.monotonic() - self._seen_ttl
+        with self._lock:
+            while self._seen:
+                session_id, (last_used, _) = next(iter(self._seen.items()))
+                if last_used > cutoff:
+                    break
+                del self._seen[session_id]
+
+    # ----- Spill files -----
+
+    def _lock_path(self, owner):
+        return os.path.join(self.spill_dir, f"owner-{owner}.lock")
+
+    def _take_owner_lock(self):
+        """Create this buffer's lock file, locked before any other worker can see it."""
+        pending = self._lock_path(self.owner) + '.new'
+        lock_file = open(pending, 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(pending, self._lock_path(self.owner))
+        return lock_file
+
+    def _segment_path(self, segment):
+        return os.path.join(self.spill_dir, f"checkins-{self.owner}-{segment}.jsonl")
+
+    def _open_segment(self):
+        self._segment += 1
+        self._spill_path = self._segment_path(self._segment)
+        self._spill = open(self._spill_path, 'a', encoding='utf-8')
+
+    def _write_spill(self, entry):
+        self._spill.write(json.dumps({
+            'session': str(entry['session']),
+            'classroom': str(entry['classroom']),
+            'student': str(entry['student']),
+            'timestamp': entry['timestamp'].isoformat()
+        }) + '\n')
+        self._spill.flush()
+        os.fsync(self._spill.fileno())
+
+    @staticmethod
+    def _read_spill(path):
+        entries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # A torn final line was never acknowledged
+                    continue
+                entries.append({
+                    'session': ObjectId(data['session']),
+                    'classroom': ObjectId(data['classroom']),
+                    'student': ObjectId(data['student']),
+                    'timestamp': datetime.datetime.fromisoformat(data['timestamp'])
+                })
+        return entries
+
+    def _lock_if_dead(self, owner):
+        """Return ``(dead, lock_file)`` for another buffer's ``owner`` id.
+
+        A dead owner's lock file is returned locked, so no other worker can
+        claim the same segments; it is None if the owner left no lock file.
+        """
+        try:
+            lock_file = open(self._lock_path(owner), 'r')
+        except FileNotFoundError:
+            return True, None
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False, None
+        return True, lock_file
+
+    def _recover(self):
+        """Claim the segments of buffers whose owner lock is free.
+
+        Returns ``[(path, entries), ...]`` for the caller to queue.
+        """
+        self._last_recover = time.monotonic()
+        owners = {}
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, 'checkins-*'))):
+            owner = os.path.basename(path).split('-')[1]
+            if owner != self.owner:
+                owners.setdefault(owner, []).append(path)
+
+        recovered = []
+        for owner, paths in owners.items():
+            dead, lock_file = self._lock_if_dead(owner)
+            if not dead:
+                continue
+            try:
+                for path in paths:
+                    self._replayed += 1
+                    claimed = self._segment_path(f"replay{self._replayed}")
+                    try:
+                        # Atomic claim: only one live worker gets each segment
+                        os.rename(path, claimed)
+                    except FileNotFoundError:
+                        continue
+                    recovered.append((claimed, self._read_spill(claimed)))
+                if lock_file is not None:
+                    try:
+                        os.remove(self._lock_path(owner))
+                    except FileNotFoundError:
+                        # Another worker judged this owner dead first
+                        pass
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+        return recovered
+
+    # ----- Flushing -----
+
+    def flush(self):
+        """Write everything accepted so far. Returns the number of records added."""
+        self._evict_seen()
+        with self._flush_lock:
+            recovered = []
+            if time.monotonic() - self._last_recover >= self._recover_interval:
+                recovered = self._recover()
+            with self._lock:
+                self._retry.extend(recovered)
+                if self._pending:
+                    self._spill.close()
+                    self._retry.append((self._spill_path, self._pending))
+                    self._pending = []
+                    self._open_segment()
+                batches, self._retry = self._retry, []
+
+            added = 0
+            for index, (path, entries) in enumerate(batches):
+                try:
+                    added += self._write_batch(entries)
+                except Exception:
+                    # Keep the segment on disk and try again next time
+                    with self._lock:
+                        self._retry = batches[index:] + self._retry
+                    raise
+                os.remove(path)
+            return added
+
+    @staticmethod
+    def _write_batch(entries):
+        by_classroom = {}
+        for entry in entries:
+            by_classroom.setdefault(entry['classroom'], []).append(entry)
+
+        added = 0
+        for classroom_id, group in by_classroom.items():
+            count = add_checkins_bulk(group)
+            if count:
+                record_attendance_change(classroom_id, None, 'present', count=count)
+                bump_version(classroom_id)
+            added += count
+        return added
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Check-in flush failed; will retry")
+
+    def close(self):
+        """Stop the flusher and write what is left."""
+        stop = getattr(self, '_stop', None)
+        if stop is not None:
+            stop.set()
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._spill.close()
+                if not self._pending and os.path.exists(self._spill_path) \
+                        and os.path.getsize(self._spill_path) == 0:
+                    os.remove(self._spill_path)
+                if not glob.glob(self._segment_path('*')) \
+                        and os.path.exists(self._lock_path(self.owner)):
+                    os.remove(self._lock_path(self.owner))
+                # Unflushed segments stay claimable once the lock is released
+                self._owner_lock.close()
+
+
+def get_buffer():
+    """Return this process's buffer, creating it (and its flusher) on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            # The flusher thread only runs outside tests; tests call flush()
+            _buffer = CheckinBuffer(start_flusher=not os.getenv('TESTING'))
+        return _buffer
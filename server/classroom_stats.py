@@ -0,0 +1,435 @@
+"""
+Classroom statistics engines.
+
+The aggregation engine pushes the counting into MongoDB and only ships the
+final numbers back. The python engine walks the documents the way the
+statistics endpoint originally did; it stays available for test backends
+that lack aggregation support and can be forced with
+``STATISTICS_ENGINE=python``.
+"""
+import datetime
+import os
+from collections import Counter
+from flask import current_app, has_app_context
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from attendance_store import attendance_totals, records_by_session, storage_mode
+from models import User, Classroom, Assignment, Grade, AttendanceSession, ClassroomStats
+from utils import get_ref_id, get_safe_list, reference_id, reference_ids
+
+ENGINES = ('aggregation', 'python')
+
+
+def _add_roster_entry(major_counts, year_counts, major, grad_year, count=1):
+    m = major or 'Undeclared'
+    major_counts[m] = major_counts.get(m, 0) + count
+
+    y_key = str(grad_year) if grad_year else 'Unknown'
+    year_counts[y_key] = year_counts.get(y_key, 0) + count
+
+
+# ----- Aggregation engine -----
+
+
+def _aggregate_roster_counts(classroom):
+    pipeline = [
+        {'$match': {'_id': {'$in': reference_ids(classroom, 'students')}}},
+        {'$group': {
+            '_id': {'major': '$major', 'grad_year': '$grad_year'},
+            'count': {'$sum': 1}
+        }},
+    ]
+    major_counts = {}
+    year_counts = {}
+    for row in User.objects.aggregate(pipeline):
+        _add_roster_entry(major_counts, year_counts, row['_id'].get('major'),
+                          row['_id'].get('grad_year'), row['count'])
+    return major_counts, year_counts
+
+
+def _aggregate_attendance_totals(classroom):
+    if storage_mode() == 'collection':
+        return attendance_totals(classroom.pk)
+
+    # $filter/$size counts present records per session without unwinding them
+    pipeline = [
+        {'$match': {'classroom': classroom.pk}},
+        {'$group': {
+            '_id': None,
+            'sessions': {'$sum': 1},
+            'present': {'$sum': {'$size': {'$filter': {
+                'input': {'$ifNull': ['$records', []]},
+                'as': 'r',
+                'cond': {'$eq': ['$$r.status', 'present']}
+            }}}}
+        }},
+    ]
+    rows = list(AttendanceSession.objects.aggregate(pipeline))
+    if not rows:
+        return 0, 0
+    return rows[0]['sessions'], rows[0]['present']
+
+
+def _aggregate_grade_totals(classroom):
+    assignment_ids = Assignment.objects(classroom=classroom).distinct('id')
+    if not assignment_ids:
+        return 0, 0
+
+    pipeline = [
+        {'$match': {'assignment': {'$in': assignment_ids}, 'score': {'$ne': None}}},
+        {'$lookup': {
+            'from': Assignment._get_collection_name(),
+            'localField': 'assignment',
+            'foreignField': '_id',
+            'as': 'assignment_doc'
+        }},
+        {'$unwind': '$assignment_doc'},
+        {'$match': {'assignment_doc.points_possible': {'$gt': 0}}},
+        {'$group': {
+            '_id': None,
+            'total': {'$sum': {'$multiply': [
+                {'$divide': ['$score', '$assignment_doc.points_possible']}, 100]}},
+            'count': {'$sum': 1}
+        }},
+    ]
+    rows = list(Grade.objects.aggregate(pipeline))
+    if not rows:
+        return 0, 0
+    return rows[0]['total'], rows[0]['count']
+
+
+# ----- Python engine -----
+
+
+def _python_roster_counts(classroom):
+    # Safely iterate students using self-healing utility
+    major_counts = {}
+    year_counts = {}
+    for s in get_safe_list(classroom, 'students'):
+        _add_roster_entry(major_counts, year_counts, s.major, s.grad_year)
+    return major_counts, year_counts
+
+
+def _python_attendance_totals(classroom):
+    session_ids = [s.pk for s in AttendanceSession.objects(classroom=classroom).only('id')]
+    total_present = 0
+    for records in records_by_session(session_ids).values():
+        total_present += sum(1 for r in records if r.get('status') == 'present')
+    return len(session_ids), total_present
+
+
+def _python_grade_totals(classroom):
+    assignments = {a.pk: a for a in Assignment.objects(classroom=classroom)}
+    if not assignments:
+        return 0, 0
+
+    total_score_percentage = 0
+    grade_count = 0
+    for g in Grade.objects(assignment__in=list(assignments)).no_dereference():
+        assignment = assignments.get(reference_id(g, 'assignment'))
+        if g.score is not None and assignment and assignment.points_possible > 0:
+            total_score_percentage += (g.score / assignment.points_possible) * 100
+            grade_count += 1
+    return total_score_percentage, grade_count
+
+
+_SECTIONS = {
+    'aggregation': (_aggregate_roster_counts, _aggregate_attendance_totals,
+                    _aggregate_grade_totals),
+    'python': (_python_roster_counts, _python_attendance_totals,
+               _python_grade_totals),
+}
+
+
+def build_statistics(major_counts, year_counts, total_sessions, total_present,
+                     grade_total, grade_count):
+    """Turn raw counters into the statistics endpoint response."""
+    major_counts = {k: v for k, v in major_counts.items() if v > 0}
+    year_counts = {k: v for k, v in year_counts.items() if v > 0}
+    total_students = sum(major_counts.values())
+
+    overall_attendance_rate = 0
+    if total_students > 0 and total_sessions > 0:
+        overall_attendance_rate = (
+            total_present / (total_students * total_sessions)) * 100
+
+    average_grade = 0
+    if grade_count > 0:
+        average_grade = grade_total / grade_count
+
+    return {
+        'total_students': total_students,
+        'major_distribution': major_counts,
+        'year_distribution': year_counts,
+        'attendance_rate': round(overall_attendance_rate, 1),
+        'average_grade': round(average_grade, 1)
+    }
+
+
+def compute_counters(classroom, engine=None):
+    """Compute the raw statistics counters for ``classroom`` from scratch.
+
+    ``engine`` is 'aggregation' or 'python'; it defaults to the
+    STATISTICS_ENGINE environment variable, then 'aggregation'. If the
+    database cannot run a pipeline, the python engine is used instead.
+    """
+    engine = engine or os.getenv('STATISTICS_ENGINE', 'aggregation')
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown statistics engine: {engine}")
+
+    try:
+        roster, attendance, grades = _SECTIONS[engine]
+        major_counts, year_counts = roster(classroom)
+        total_sessions, total_present = attendance(classroom)
+        grade_total, grade_count = grades(classroom)
+    except (NotImplementedError, OperationFailure) as e:
+        if engine == 'python':
+            raise
+        if has_app_context():
+            current_app.logger.warning(
+                "Statistics aggregation unavailable, using python engine: %s", e)
+        return compute_counters(classroom, engine='python')
+
+    return {
+        'major_counts': major_counts,
+        'year_counts': year_counts,
+        'total_sessions': total_sessions,
+        'total_present': total_present,
+        'grade_total': grade_total,
+        'grade_count': grade_count,
+    }
+
+
+def compute_statistics(classroom, engine=None):
+    """Compute roster, attendance and grade statistics for ``classroom`` from scratch."""
+    return build_statistics(**compute_counters(classroom, engine))
+
+
+# ----- Class list counts -----
+
+
+def _count_lookup(collection, as_field, extra_match=None):
+    match = {'$expr': {'$eq': ['$classroom', '$$classroom_id']}}
+    match.update(extra_match or {})
+    return {'$lookup': {
+        'from': collection,
+        'let': {'classroom_id': '$_id'},
+        'pipeline': [{'$match': match}, {'$count': 'n'}],
+        'as': as_field
+    }}
+
+
+def _aggregate_classroom_counts(classroom_ids):
+    pipeline = [
+        {'$match': {'_id': {'$in': classroom_ids}}},
+        _count_lookup(Assignment._get_collection_name(), 'assignments'),
+        _count_lookup(AttendanceSession._get_collection_name(), 'open_sessions',
+                      {'is_open': True}),
+        {'$project': {
+            'students': {'$size': {'$ifNull': ['$students', []]}},
+            'assignments': {'$ifNull': [{'$arrayElemAt': ['$assignments.n', 0]}, 0]},
+            'open_sessions': {'$ifNull': [{'$arrayElemAt': ['$open_sessions.n', 0]}, 0]},
+        }},
+    ]
+    return {
+        row.pop('_id'): row for row in Classroom.objects.aggregate(pipeline)
+    }
+
+
+def _python_classroom_counts(classroom_ids):
+    assignments = Counter(Assignment.objects(classroom__in=classroom_ids)
+                          .scalar('classroom').no_dereference())
+    open_sessions = Counter(AttendanceSession.objects(classroom__in=classroom_ids, is_open=True)
+                            .scalar('classroom').no_dereference())
+    assignments = Counter({get_ref_id(k): v for k, v in assignments.items()})
+    open_sessions = Counter({get_ref_id(k): v for k, v in open_sessions.items()})
+    return {
+        c['_id']: {
+            'students': len(c.get('students', [])),
+            'assignments': assignments[c['_id']],
+            'open_sessions': open_sessions[c['_id']],
+        }
+        for c in Classroom.objects(id__in=classroom_ids).only('students').as_pymongo()
+    }
+
+
+def classroom_counts(classroom_ids, engine=None):
+    """Return ``{classroom_id: {'students', 'assignments', 'open_sessions'}}``.
+
+    The aggregation engine answers for every classroom in one pipeline; the
+    engine is chosen and falls back exactly as in ``compute_counters``.
+    """
+    classroom_ids = list(classroom_ids)
+    if not classroom_ids:
+        return {}
+    engine = engine or os.getenv('STATISTICS_ENGINE', 'aggregation')
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown statistics engine: {engine}")
+
+    if engine == 'python':
+        return _python_classroom_counts(classroom_ids)
+    try:
+        return _aggregate_classroom_counts(classroom_ids)
+    except (NotImplementedError, OperationFailure) as e:
+        if has_app_context():
+            current_app.logger.warning(
+                "Classroom count aggregation unavailable, using python engine: %s", e)
+        return _python_classroom_counts(classroom_ids)
+
+
+# ----- Materialized rollup -----
+#
+# ClassroomStats holds the counters above and is kept current with atomic
+# $inc upserts from the routes that change them, so no increment is dropped
+# even before the rollup exists. A document without ``built_at`` only holds
+# increments and is never served; the next read builds it in full.
+#
+# A rebuild never overwrites the counters. It snapshots them, recomputes
+# from the source collections, and applies the difference as one more $inc,
+# guarded on the snapshot's ``built_at`` so only one concurrent rebuild
+# lands. Increments arriving while it runs stay on top of the result; the
+# only error left is a change written during the recompute itself, which
+# can be counted twice. Profile edits move the student between major and
+# year buckets in every class they are enrolled in. Cascade deletes are not
+# tracked; `flask rebuild-stats` repairs that drift.
+
+
+def _encode_key(key):
+    """Escape a distribution key so it is a legal MongoDB field name."""
+    return key.replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+
+def _decode_key(key):
+    return key.replace('%24', '$').replace('%2E', '.').replace('%25', '%')
+
+
+def _inc(classroom, increments):
+    increments = {k: v for k, v in increments.items() if v}
+    if not increments:
+        return
+    ClassroomStats._get_collection().update_one(
+        {'_id': get_ref_id(classroom)},
+        {'$inc': increments,
+         '$set': {'updated_at': datetime.datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def _counter_fields(doc):
+    """Flatten a rollup document (or computed counters) to ``{field: value}``."""
+    fields = {name: doc.get(name) or 0 for name in
+              ('total_sessions', 'total_present', 'grade_total', 'grade_count')}
+    for name in ('major_counts', 'year_counts'):
+        for key, value in (doc.get(name) or {}).items():
+            fields[f'{name}.{key}'] = value
+    return fields
+
+
+def rebuild_rollup(classroom, engine=None):
+    """Recompute the ClassroomStats rollup for ``classroom`` and return it."""
+    collection = ClassroomStats._get_collection()
+    classroom_id = get_ref_id(classroom)
+    snapshot = collection.find_one({'_id': classroom_id}) or {}
+
+    counters = compute_counters(classroom, engine)
+    computed = _counter_fields({
+        'major_counts': {_encode_key(k): v for k, v in counters['major_counts'].items()},
+        'year_counts': {_encode_key(k): v for k, v in counters['year_counts'].items()},
+        'total_sessions': counters['total_sessions'],
+        'total_present': counters['total_present'],
+        'grade_total': counters['grade_total'],
+        'grade_count': counters['grade_count'],
+    })
+    current = _counter_fields(snapshot)
+    increments = {field: computed.get(field, 0) - current.get(field, 0)
+                  for field in set(computed) | set(current)}
+    increments = {k: v for k, v in increments.items() if v}
+
+    now = datetime.datetime.utcnow()
+    built_at = snapshot.get('built_at')
+    update = {'$set': {'built_at': now, 'updated_at': now}}
+    if increments:
+        update['$inc'] = increments
+    try:
+        collection.update_one(
+            {'_id': classroom_id,
+             'built_at': built_at if built_at else {'$exists': False}},
+            update, upsert=True
+        )
+    except DuplicateKeyError:
+        # Another rebuild got there first; its result is just as current
+        pass
+    return ClassroomStats.objects(id=classroom_id).first()
+
+
+def get_statistics(classroom):
+    """Return the statistics response for ``classroom`` from its rollup document."""
+    stats = ClassroomStats.objects(id=classroom.pk).first()
+    if not stats or not stats.built_at:
+        stats = rebuild_rollup(classroom)
+
+    return build_statistics(
+        {_decode_key(k): v for k, v in (stats.major_counts or {}).items()},
+        {_decode_key(k): v for k, v in (stats.year_counts or {}).items()},
+        stats.total_sessions, stats.total_present,
+        stats.grade_total, stats.grade_count
+    )
+
+
+def _add_enrollment_increments(increments, major, grad_year, delta):
+    major = _encode_key(major or 'Undeclared')
+    year = _encode_key(str(grad_year) if grad_year else 'Unknown')
+    increments[f'major_counts.{major}'] = increments.get(f'major_counts.{major}', 0) + delta
+    increments[f'year_counts.{year}'] = increments.get(f'year_counts.{year}', 0) + delta
+
+
+def record_enrollment(classroom, students, delta):
+    """Count ``students`` (User documents) as added (+1) or removed (-1)."""
+    increments = {}
+    for s in students:
+        _add_enrollment_increments(increments, s.major, s.grad_year, delta)
+    _inc(classroom, increments)
+
+
+def record_profile_change(user, old_major, old_grad_year):
+    """Move ``user`` to its current major and year buckets in every class it is in.
+
+    Call after saving a profile edit, with the values it had before.
+    """
+    if (old_major, old_grad_year) == (user.major, user.grad_year):
+        return
+    increments = {}
+    _add_enrollment_increments(increments, old_major, old_grad_year, -1)
+    _add_enrollment_increments(increments, user.major, user.grad_year, 1)
+    for classroom_id in Classroom.objects(students=user.pk).scalar('id'):
+        _inc(classroom_id, increments)
+
+
+def record_session_created(classroom):
+    """Count a newly opened attendance session."""
+    _inc(classroom, {'total_sessions': 1})
+
+
+def record_attendance_change(classroom, old_status, new_status, count=1):
+    """Account for ``count`` records going from ``old_status`` (None if new) to ``new_status``."""
+    delta = (new_status == 'present') - (old_status == 'present')
+    _inc(classroom, {'total_present': delta * count})
+
+
+def record_grade_change(classroom, points_possible, old_score, new_score):
+    """Account for a grade going from ``old_score`` to ``new_score`` (None if ungraded)."""
+    record_grade_changes(classroom, points_possible, [(old_score, new_score)])
+
+
+def record_grade_changes(classroom, points_possible, changes):
+    """``record_grade_change`` for many ``(old_score, new_score)`` pairs in one update."""
+    if not points_possible or points_possible <= 0:
+        return
+    increments = {'grade_total': 0, 'grade_count': 0}
+    for old_score, new_score in changes:
+        if old_score is not None:
+            increments['grade_total'] -= (old_score / points_possible) * 100
+            increments['grade_count'] -= 1
+        if new_score is not None:
+            increments['grade_total'] += (new_score / points_possible) * 100
+            increments['grade_count'] += 1
+    _inc(classroom, increments)
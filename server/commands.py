@@ -0,0 +1,83 @@
+"""
+Maintenance commands, available through the ``flask`` CLI:
+
+    flask --app main rebuild-stats [CLASSROOM_ID]
+    flask --app main migrate-attendance [--clear-embedded]
+    flask --app main ensure-indexes
+    flask --app main check-indexes
+    flask --app main sweep-jobs
+"""
+import click
+from models import Classroom
+from classroom_stats import rebuild_rollup
+from etags import bump_version
+from attendance_store import migrate_embedded_records
+from indexes import ensure_indexes, index_report
+from jobs import sweep_jobs
+
+
+@click.command('rebuild-stats')
+@click.argument('classroom_id', required=False)
+def rebuild_stats_command(classroom_id):
+    """Recompute ClassroomStats rollups from scratch to repair drift."""
+    classrooms = Classroom.objects(id=classroom_id) if classroom_id \
+        else Classroom.objects
+    rebuilt = 0
+    for classroom in classrooms.no_dereference():
+        rebuild_rollup(classroom)
+        # Cached statistics responses would otherwise keep the drifted numbers
+        bump_version(classroom.pk)
+        rebuilt += 1
+    click.echo(f"Rebuilt statistics for {rebuilt} classroom(s).")
+
+
+@click.command('migrate-attendance')
+@click.option('--clear-embedded', is_flag=True,
+              help='Empty AttendanceSession.records once copied.')
+def migrate_attendance_command(clear_embedded):
+    """Copy embedded attendance records into the attendance_records collection.
+
+    Safe to re-run. Switch to ATTENDANCE_STORAGE=collection afterwards.
+    """
+    sessions, records = migrate_embedded_records(clear_embedded=clear_embedded)
+    click.echo(f"Migrated {records} record(s) from {sessions} session(s).")
+
+
+@click.command('ensure-indexes')
+def ensure_indexes_command():
+    """Build every declared index in the background."""
+    for collection, name in ensure_indexes():
+        click.echo(f"{collection}: {name}")
+
+
+@click.command('check-indexes')
+def check_indexes_command():
+    """List declared indexes that are missing and existing ones never used."""
+    report = index_report()
+    if not report:
+        click.echo("All declared indexes exist.")
+    for collection, problems in report.items():
+        for fields in problems['missing']:
+            click.echo(f"{collection}: missing {fields}")
+        for name in problems['unused']:
+            click.echo(f"{collection}: unused {name}")
+
+
+@click.command('sweep-jobs')
+def sweep_jobs_command():
+    """Requeue stale jobs, fail stuck ones and delete expired results.
+
+    Run it periodically (e.g. from cron) so jobs lost with a worker recover.
+    """
+    requeued, failed, removed = sweep_jobs()
+    click.echo(f"Requeued {requeued} job(s), failed {failed} stuck job(s), "
+               f"removed {removed} expired result(s).")
+
+
+def register_commands(app):
+    """Attach the maintenance commands to ``app.cli``."""
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(migrate_attendance_command)
+    app.cli.add_command(ensure_indexes_command)
+    app.cli.add_command(check_indexes_command)
+    app.cli.add_command(sweep_jobs_command)
@@ -0,0 +1,98 @@
+"""
+Negotiated response compression.
+
+JSON, CSV and other text responses are compressed with brotli or gzip,
+whichever the client prefers in ``Accept-Encoding`` (brotli only when the
+optional ``brotli`` package is installed). Buffered responses are compressed
+once they reach COMPRESSION_MIN_SIZE bytes. Streamed responses (CSV exports)
+are compressed chunk by chunk as they are generated, so memory use stays
+flat.
+
+Set RESPONSE_COMPRESSION=off when a proxy in front of the app already
+compresses responses.
+"""
+import gzip
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/csv', 'text/plain', 'text/html')
+
+
+def _enabled():
+    return os.getenv('RESPONSE_COMPRESSION', 'on').lower() not in ('off', 'false', '0')
+
+
+def _min_size():
+    return int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+
+
+def _choose_encoding():
+    offered = (['br'] if brotli is not None else []) + ['gzip']
+    encoding = request.accept_encodings.best_match(offered)
+    # best_match treats "*" as accepting anything; only use what was named
+    return encoding if encoding in request.accept_encodings.values() else None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+        compress, finish = compressor.compress, compressor.flush
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            out = compress(chunk)
+            if out:
+                yield out
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """``after_request`` hook: compress ``response`` if the client and the payload allow it."""
+    if not _enabled() or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    if response.status_code != 200 or 'Content-Encoding' in response.headers \
+            or response.direct_passthrough:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < _min_size():
+            return response
+        response.set_data(_compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    """Register the compression hook on ``app``."""
+    app.after_request(compress_response)
@@ -0,0 +1,116 @@
+"""
+Enrollment lookups answered by the multikey index on ``Classroom.students``.
+
+Membership checks never load or dereference the roster; they ask MongoDB
+whether the id is present and let the index do the work. Adds and removals
+are conditional atomic updates, so the statistics rollup is only adjusted
+when the roster actually changed.
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+from models import Classroom
+from classroom_stats import record_enrollment
+from session_cache import invalidate_classroom
+from etags import bump_version
+from utils import get_ref_id
+
+
+def _to_object_id(value):
+    """Normalize a document, DBRef, ObjectId or id string to an ObjectId."""
+    if isinstance(value, str):
+        try:
+            return ObjectId(value)
+        except InvalidId:
+            return None
+    return get_ref_id(value)
+
+
+def is_enrolled(classroom, user):
+    """Return True if ``user`` is listed in ``classroom.students``.
+
+    Both arguments may be documents, references or raw ids.
+    """
+    classroom_id = _to_object_id(classroom)
+    user_id = _to_object_id(user)
+    if classroom_id is None or user_id is None:
+        return False
+
+    return Classroom.objects(pk=classroom_id, students=user_id) \
+        .only('id').first() is not None
+
+
+def enrolled_ids(classroom, users):
+    """Return the subset of ``users`` enrolled in ``classroom`` as a set of ObjectIds.
+
+    Answers the whole batch with one aggregation instead of one check per user.
+    """
+    classroom_id = _to_object_id(classroom)
+    user_ids = list({uid for uid in (_to_object_id(u) for u in users)
+                     if uid is not None})
+    if classroom_id is None or not user_ids:
+        return set()
+
+    pipeline = [
+        {'$match': {'_id': classroom_id, 'students': {'$in': user_ids}}},
+        {'$unwind': '$students'},
+        {'$match': {'students': {'$in': user_ids}}},
+        {'$project': {'_id': 0, 'students': 1}},
+    ]
+    return {row['students'] for row in Classroom.objects.aggregate(pipeline)}
+
+
+def enroll(classroom, user):
+    """Atomically add the User ``user`` to ``classroom.students``.
+
+    Returns True if the user was added, False if already enrolled.
+    """
+    classroom_id = _to_object_id(classroom)
+    user_id = _to_object_id(user)
+    added = Classroom.objects(pk=classroom_id, students__ne=user_id) \
+        .update_one(push__students=user_id)
+    if added:
+        record_enrollment(classroom_id, [user], 1)
+        invalidate_classroom(classroom_id)
+        bump_version(classroom_id)
+    return bool(added)
+
+
+def unenroll(classroom, user):
+    """Atomically remove the User ``user`` from ``classroom.students``.
+
+    Returns True if the user was removed, False if not enrolled.
+    """
+    classroom_id = _to_object_id(classroom)
+    user_id = _to_object_id(user)
+    removed = Classroom.objects(pk=classroom_id, students=user_id) \
+        .update_one(pull__students=user_id)
+    if removed:
+        record_enrollment(classroom_id, [user], -1)
+        invalidate_classroom(classroom_id)
+        bump_version(classroom_id)
+    return bool(removed)
+
+
+def enroll_many(classroom, users):
+    """Add many User documents to ``classroom.students`` with one ``$addToSet``.
+
+    Returns the users that were newly enrolled; users already on the roster
+    are left out.
+    """
+    classroom_id = _to_object_id(classroom)
+    already = enrolled_ids(classroom_id, users)
+    new_users = []
+    seen = set(already)
+    for u in users:
+        if u.pk not in seen:
+            seen.add(u.pk)
+            new_users.append(u)
+    if not new_users:
+        return []
+
+    Classroom.objects(pk=classroom_id).update_one(
+        add_to_set__students=[u.pk for u in new_users])
+    record_enrollment(classroom_id, new_users, 1)
+    invalidate_classroom(classroom_id)
+    bump_version(classroom_id)
+    return new_users
@@ -0,0 +1,122 @@
+"""
+Conditional GET for classroom-scoped reads.
+
+Every Classroom carries a ``version`` counter. Routes that change anything a
+classroom's read endpoints return (roster, sessions and check-ins, assignments
+and grades, announcements, the classroom itself, or the profile of someone in
+it) call ``bump_version``. Read endpoints wrapped with ``classroom_etag`` then
+answer a matching ``If-None-Match`` with 304 after a single projection query
+for the version, without building the payload.
+
+Tags are weak and include the viewer and the full request path, because the
+same URL returns different bodies to instructors and students. The version
+is read before the view runs, so a change that races with the request only
+ever makes the stored tag stale, never the reverse.
+"""
+import functools
+import hashlib
+from flask import make_response, request, session
+from mongoengine.errors import ValidationError
+from mongoengine.queryset.visitor import Q
+from models import Classroom, AttendanceSession, Assignment
+from utils import get_ref_id
+
+
+def bump_version(*classroom_ids):
+    """Invalidate the cached reads of the given classrooms."""
+    ids = [get_ref_id(c) or c for c in classroom_ids if c is not None]
+    if ids:
+        Classroom.objects(id__in=ids).update(inc__version=1)
+
+
+def bump_versions_for_user(user):
+    """Invalidate every classroom that shows ``user``'s profile."""
+    Classroom.objects(Q(instructor=user) | Q(students=user)).update(inc__version=1)
+
+
+def classroom_version(classroom_id):
+    """Return the classroom's version counter, or None if it does not exist."""
+    try:
+        row = Classroom.objects(id=classroom_id).only('version').as_pymongo().first()
+    except ValidationError:
+        return None
+    return row.get('version', 0) if row else None
+
+
+def _classroom_of(model, doc_id):
+    try:
+        row = model.objects(id=doc_id).only('classroom').as_pymongo().first()
+    except ValidationError:
+        return None
+    return row['classroom'] if row else None
+
+
+def session_classroom(kwargs):
+    return _classroom_of(AttendanceSession, kwargs['session_id'])
+
+
+def assignment_classroom(kwargs):
+    return _classroom_of(Assignment, kwargs['assignment_id'])
+
+
+def _make_tag(*parts):
+    raw = '|'.join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _conditional(view, compute_tag, kwargs):
+    user_id = session.get('user_id')
+    parts = compute_tag(user_id, kwargs) if user_id else None
+    if parts is None:
+        return view(**kwargs)
+
+    tag = _make_tag(user_id, request.full_path, *parts)
+    if request.if_none_match.contains_weak(tag):
+        response = make_response('', 304)
+    else:
+        response = make_response(view(**kwargs))
+        if response.status_code != 200:
+            return response
+    response.set_etag(tag, weak=True)
+    # Let the browser keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def classroom_etag(resolve=None, extra=None):
+    """Decorate a GET view whose body depends on one classroom and the viewer.
+
+    ``resolve(view_kwargs)`` returns the classroom id (default: the
+    ``classroom_id`` URL argument). ``extra()`` adds anything else the body
+    depends on, such as the current rotating-code step.
+    """
+    def compute_tag(user_id, kwargs):
+        classroom_id = resolve(kwargs) if resolve else kwargs['classroom_id']
+        version = classroom_version(classroom_id) if classroom_id else None
+        if version is None:
+            return None
+        return [classroom_id, version] + ([extra()] if extra else [])
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            return _conditional(view, compute_tag, kwargs)
+        return wrapper
+    return decorator
+
+
+def class_list_etag(view):
+    """Decorate the class list: its tag covers the version of every listed class."""
+    def compute_tag(user_id, kwargs):
+        try:
+            rows = Classroom.objects(
+                (Q(instructor=user_id) | Q(students=user_id)) & Q(status='active')
+            ).only('version').order_by('id').as_pymongo()
+            return [(row['_id'], row.get('version', 0)) for row in rows]
+        except ValidationError:
+            return None
+
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        return _conditional(view, compute_tag, kwargs)
+    return wrapper
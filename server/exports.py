@@ -0,0 +1,146 @@
+"""
+CSV export row generators.
+
+Each generator yields the header row followed by one row per student, read
+from lean ``as_pymongo()`` projections. The export routes stream them
+straight to the client; background jobs write them to a stored result.
+"""
+from bson import ObjectId
+from models import User, Assignment, Grade, AttendanceSession
+from attendance_store import status_map
+from utils import reference_ids
+
+
+def sanitize_for_csv(value):
+    """Prevent CSV injection (Formula Injection)."""
+    if not value:
+        return ""
+    value = str(value)
+    if value.startswith(('=', '+', '-', '@')):
+        return f"'{value}"
+    return value
+
+
+def parse_id_list(value):
+    """Parse a comma-separated id list such as ``?assignments=a,b``.
+
+    Returns None when ``value`` is empty; raises ValueError on a malformed id.
+    """
+    if not value:
+        return None
+    ids = [item.strip() for item in value.split(',') if item.strip()]
+    if not all(ObjectId.is_valid(item) for item in ids):
+        raise ValueError('Invalid id')
+    return [ObjectId(item) for item in ids]
+
+
+def roster_rows(classroom):
+    """Yield the roster export, in roster order."""
+    student_ids = reference_ids(classroom, 'students')
+    students = {
+        s['_id']: s for s in User.objects(id__in=student_ids)
+        .only('name', 'email', 'student_id', 'major', 'grad_year').as_pymongo()
+    }
+
+    yield ['Name', 'Email', 'Student ID', 'Major', 'Grad Year']
+
+    for student_id in student_ids:
+        s = students.get(student_id)
+        if not s:
+            # Skip dangling references
+            continue
+        yield [
+            sanitize_for_csv(s.get('name')),
+            sanitize_for_csv(s.get('email')),
+            sanitize_for_csv(s.get('student_id')),
+            sanitize_for_csv(s.get('major')),
+            sanitize_for_csv(s.get('grad_year'))
+        ]
+
+
+def attendance_rows(classroom):
+    """Yield the attendance export: one status column per session and a rate."""
+    # Project only what the export needs; statuses come from whichever
+    # attendance layout is active, indexed as {session_id: {student_id: status}}
+    sessions = list(AttendanceSession.objects(classroom=classroom)
+                    .order_by('date').only('id', 'date').as_pymongo())
+    statuses = status_map([sess['_id'] for sess in sessions])
+
+    students = User.objects(id__in=reference_ids(classroom, 'students')) \
+        .order_by('name').only('name', 'email', 'student_id').as_pymongo()
+
+    # Header: Name, Email, [Date1, Date2, ...]
+    yield ['Name', 'Email', 'Student ID'] + \
+        [sess['date'].strftime('%Y-%m-%d') for sess in sessions] + \
+        ['Attendance Rate']
+
+    for s in students:
+        row = [sanitize_for_csv(s.get('name')), sanitize_for_csv(
+            s.get('email')), sanitize_for_csv(s.get('student_id'))]
+        present_count = 0
+        for sess in sessions:
+            status = statuses[sess['_id']].get(s['_id'], 'absent')
+            row.append(status)
+            if status == 'present':
+                present_count += 1
+
+        rate = 0
+        if len(sessions) > 0:
+            rate = (present_count / len(sessions)) * 100
+        row.append(f"{rate:.1f}%")
+
+        yield row
+
+
+def grade_rows(classroom, assignment_ids=None):
+    """Yield the gradebook export, optionally limited to ``assignment_ids``."""
+    assignments = Assignment.objects(classroom=classroom)
+    if assignment_ids is not None:
+        assignments = assignments.filter(id__in=assignment_ids)
+
+    assignments = list(assignments.only('id', 'title', 'points_possible').as_pymongo())
+
+    # Pre-fetch all grades for these assignments to avoid N*M queries, reading
+    # only raw ids and scores so no Grade documents are built
+    all_grades = Grade.objects(
+        assignment__in=[a['_id'] for a in assignments], score__ne=None
+    ).only('student', 'assignment', 'score').as_pymongo()
+
+    # Build a map: (student_id, assignment_id) -> score
+    grade_map = {(g['student'], g['assignment']): g['score'] for g in all_grades}
+
+    students = User.objects(id__in=reference_ids(classroom, 'students')) \
+        .order_by('name').only('name', 'email', 'student_id').as_pymongo()
+
+    # Header
+    headers = ['Name', 'Email', 'Student ID']
+    for a in assignments:
+        headers.append(f"{a['title']} (/{a['points_possible']})")
+    headers.append("Average %")
+    yield headers
+
+    for s in students:
+        row = [
+            sanitize_for_csv(s.get('name')),
+            sanitize_for_csv(s.get('email')),
+            sanitize_for_csv(s.get('student_id'))
+        ]
+        total_percentage = 0
+        count = 0
+
+        for a in assignments:
+            score = grade_map.get((s['_id'], a['_id']))
+            if score is not None:
+                row.append(score)
+                if a['points_possible'] > 0:
+                    total_percentage += (score / a['points_possible']) * 100
+                    count += 1
+            else:
+                row.append('')
+
+        avg = 0
+        if count > 0:
+            avg = total_percentage / count
+        row.append(f"{avg:.1f}%")
+
+        yield row
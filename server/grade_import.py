@@ -0,0 +1,219 @@
+"""
+Bulk grade entry for one assignment.
+
+Entries come from a JSON list (students by id) or a CSV upload (students by
+email) and are processed in batches. Each batch resolves every student with
+one ``$in`` query, reads the previous scores with one query and writes every
+grade with a single unordered ``bulk_write`` of upserts keyed on the
+(assignment, student) unique index. The statistics rollup gets one ``$inc``
+per batch. The report carries one result per row instead of failing the
+whole upload on the first bad line.
+
+Batches are committed as a CSV is read, so a file that turns out to be
+unreadable partway (bad encoding, malformed quoting) keeps the rows before
+the bad line; the report says where reading stopped.
+"""
+import csv
+import datetime
+import math
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models import User, Grade
+from classroom_stats import record_grade_changes
+from utils import reference_id, reference_ids
+
+BATCH_SIZE = 1000
+
+# Marks an entry that leaves the stored feedback untouched
+KEEP = object()
+
+
+def _parse_score(value):
+    """Return ``value`` as a finite float, or None to clear the score."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError
+    score = float(value)
+    if not math.isfinite(score):
+        raise ValueError
+    return score
+
+
+class GradeImport:
+    """Accumulates the outcome of one bulk grade entry."""
+
+    def __init__(self, assignment, classroom):
+        self.assignment = assignment
+        self.classroom_id = reference_id(assignment, 'classroom')
+        self.enrolled = set(reference_ids(classroom, 'students'))
+        self.results = []
+        self.error = None
+        self._seen = set()
+
+    @property
+    def written(self):
+        """Number of grades created or updated so far."""
+        return sum(r['status'] in ('created', 'updated') for r in self.results)
+
+    def report(self):
+        statuses = [r['status'] for r in self.results]
+        report = {
+            'ok': self.error is None,
+            'created': statuses.count('created'),
+            'updated': statuses.count('updated'),
+            'skipped': statuses.count('skipped'),
+            'failed': statuses.count('error'),
+            'results': sorted(self.results, key=lambda r: r['row'])
+        }
+        if self.error:
+            report['error'] = self.error
+        return report
+
+    def _error(self, row, key, message):
+        self.results.append({'row': row, 'student': key, 'status': 'error',
+                             'error': message})
+
+    def process_batch(self, entries, by='id'):
+        """Write a batch of ``(row, key, score, feedback)`` entries.
+
+        ``key`` is a student id (``by='id'``) or email (``by='email'``);
+        ``feedback`` may be KEEP to leave the stored value alone.
+        """
+        if not entries:
+            return
+
+        keys = []
+        for _, key, _, _ in entries:
+            if by == 'id' and not ObjectId.is_valid(key):
+                continue
+            keys.append(ObjectId(key) if by == 'id' else key)
+        field = 'id' if by == 'id' else 'email'
+        students = {
+            str(u['_id']) if by == 'id' else u['email']: u['_id']
+            for u in User.objects(**{f'{field}__in': keys}).only('email').as_pymongo()
+        }
+
+        # Validate every row before touching the grades
+        valid = []
+        for row, key, score, feedback in entries:
+            student_id = students.get(key)
+            if student_id is None:
+                self._error(row, key, 'Student not found')
+                continue
+            if student_id not in self.enrolled:
+                self._error(row, key, 'Student not enrolled')
+                continue
+            if student_id in self._seen:
+                self._error(row, key, 'Duplicate student')
+                continue
+            try:
+                score = _parse_score(score)
+            except (TypeError, ValueError):
+                self._error(row, key, 'Invalid score')
+                continue
+            self._seen.add(student_id)
+            valid.append((row, key, student_id, score, feedback))
+
+        if not valid:
+            return
+
+        previous = {
+            g['student']: g.get('score') for g in Grade.objects(
+                assignment=self.assignment,
+                student__in=[student_id for _, _, student_id, _, _ in valid]
+            ).only('student', 'score').as_pymongo()
+        }
+
+        now = datetime.datetime.utcnow()
+        ops = []
+        for _, _, student_id, score, feedback in valid:
+            update = {'score': score, 'updated_at': now}
+            if feedback is not KEEP:
+                update['feedback'] = feedback
+            ops.append(UpdateOne({'assignment': self.assignment.pk, 'student': student_id},
+                                 {'$set': update}, upsert=True))
+
+        failed = set()
+        try:
+            Grade._get_collection().bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            failed = {err['index'] for err in e.details.get('writeErrors', [])}
+
+        changes = []
+        for index, (row, key, student_id, score, _) in enumerate(valid):
+            if index in failed:
+                self._error(row, key, 'Could not save grade')
+                continue
+            self.results.append({'row': row, 'student': key, 'status':
+                                 'updated' if student_id in previous else 'created'})
+            changes.append((previous.get(student_id), score))
+
+        record_grade_changes(self.classroom_id, self.assignment.points_possible, changes)
+
+    def run(self, items, batch_size=BATCH_SIZE):
+        """Apply a JSON list of ``{'student_id', 'score', 'feedback'}`` objects.
+
+        ``score`` is required (null clears it); ``feedback`` is optional.
+        Rows are numbered by their position in the list.
+        """
+        batch = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or 'score' not in item:
+                self._error(index, None, 'Each entry needs student_id and score')
+                continue
+            batch.append((index, str(item.get('student_id')), item['score'],
+                          item.get('feedback', KEEP)))
+            if len(batch) >= batch_size:
+                self.process_batch(batch)
+                batch = []
+        self.process_batch(batch)
+        return self.report()
+
+    def run_csv(self, text_stream, batch_size=BATCH_SIZE):
+        """Apply a CSV with ``email`` and ``score`` columns (``feedback`` optional).
+
+        Rows with a blank score are skipped, as are blank feedback cells, so a
+        partly filled sheet never clears existing grades. Rows are numbered
+        by their line in the file. A header that cannot be used raises
+        ValueError before anything is written; a later read error stops the
+        import after writing the rows before it and is set as ``error``.
+        """
+        reader = csv.DictReader(text_stream)
+        try:
+            fieldnames = reader.fieldnames
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ValueError(f'Could not read the CSV header: {e}')
+        if not fieldnames:
+            raise ValueError('CSV file is empty or has no header row')
+
+        # Normalize headers to lowercase
+        reader.fieldnames = [name.strip().lower() for name in fieldnames]
+        if 'email' not in reader.fieldnames or 'score' not in reader.fieldnames:
+            raise ValueError('CSV needs email and score columns')
+
+        batch = []
+        try:
+            for row in reader:
+                row_number = reader.line_num
+                email = (row.get('email') or '').strip()
+                score = (row.get('score') or '').strip()
+                feedback = (row.get('feedback') or '').strip()
+
+                if not email:
+                    self._error(row_number, None, 'Email is required')
+                    continue
+                if not score:
+                    self.results.append({'row': row_number, 'student': email,
+                                         'status': 'skipped'})
+                    continue
+
+                batch.append((row_number, email, score, feedback or KEEP))
+                if len(batch) >= batch_size:
+                    self.process_batch(batch, by='email')
+                    batch = []
+        except (csv.Error, UnicodeDecodeError) as e:
+            self.error = f'Stopped reading after line {reader.line_num}: {e}'
+        self.process_batch(batch, by='email')
+        return self.report()
@@ -2,6 +2,7 @@
 # See: https://docs.gunicorn.org/en/stable/settings.html
 
 import multiprocessing
+import os
 
 # Bind to all interfaces on port 5000
 bind = "0.0.0.0:5000"
@@ -30,3 +31,22 @@ limit_request_field_size = 8190
 
 # Process naming
 proc_name = "rooster-api"
+
+
+def when_ready(server):
+    """Refuse to serve while a unique index is missing (AUTO_CREATE_INDEXES=false).
+
+    Duplicate detection relies on them. Checked here rather than when main
+    is imported, so `flask --app main ensure-indexes` can still build them.
+    """
+    from dotenv import load_dotenv
+    from mongoengine import connect, disconnect
+    from indexes import require_unique_indexes
+
+    load_dotenv()
+    # The master's own connection; workers connect after the fork
+    connect(host=os.getenv('MONGO_URI', 'mongodb://localhost:27017/class_roster'))
+    try:
+        require_unique_indexes()
+    finally:
+        disconnect()
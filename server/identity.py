@@ -0,0 +1,69 @@
+"""
+Request-scoped identity map.
+
+Documents loaded during a request are kept on ``flask.g`` keyed by class and
+id, so the session user and any classroom/assignment looked up more than once
+cost a single query. Ownership checks compare raw ObjectIds and never
+dereference the referenced document.
+"""
+from flask import g, has_app_context, session
+from models import User
+from utils import get_ref_id, reference_id
+
+
+def _identity_map():
+    if not has_app_context():
+        return None
+    if 'identity_map' not in g:
+        g.identity_map = {}
+    return g.identity_map
+
+
+def remember(*docs):
+    """Register already-loaded documents so later lookups reuse them."""
+    identity_map = _identity_map()
+    if identity_map is None:
+        return
+    for doc in docs:
+        if doc is not None and doc.pk is not None:
+            identity_map[(doc.__class__, str(doc.pk))] = doc
+
+
+def get_document(cls, doc_id):
+    """Return the ``cls`` document with ``doc_id``, querying at most once per request.
+
+    Behaves like ``cls.objects(id=doc_id).first()``; missing documents are not cached.
+    """
+    if doc_id is None:
+        return None
+    identity_map = _identity_map()
+    key = (cls, str(get_ref_id(doc_id) or doc_id))
+    if identity_map is not None and key in identity_map:
+        return identity_map[key]
+
+    doc = cls.objects(id=doc_id).first()
+    remember(doc)
+    return doc
+
+
+def get_reference(doc, field_name):
+    """Resolve a ReferenceField through the identity map instead of dereferencing it."""
+    field = doc._fields.get(field_name) if doc is not None else None
+    if field is None:
+        return None
+    return get_document(field.document_type, reference_id(doc, field_name))
+
+
+def get_current_user():
+    """Return the signed-in User, loaded once per request, or None."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    return get_document(User, user_id)
+
+
+def is_instructor(classroom, user):
+    """Return True if ``user`` is the instructor of ``classroom``, by id only."""
+    if classroom is None or user is None:
+        return False
+    return reference_id(classroom, 'instructor') == get_ref_id(user)
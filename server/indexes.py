@@ -0,0 +1,132 @@
+"""
+Index bootstrap and health check.
+
+Every Document class declares the indexes its queries need in ``meta``.
+MongoEngine builds missing ones on a model's first query in each process,
+which blocks that request while a large collection is indexed. Run
+``flask ensure-indexes`` before deploying a release that adds indexes to
+build them in the background instead; AUTO_CREATE_INDEXES=false turns the
+first-query build off entirely. Duplicate detection (check-ins in the
+collection layout, grade upserts) depends on the unique indexes, so with
+the build off ``require_unique_indexes`` refuses to serve without them. It
+runs when gunicorn is ready (gunicorn.conf.py), not on import, so the
+``flask`` commands that build the indexes keep working.
+
+``index_report`` compares what is declared with what exists and, where the
+server supports ``$indexStats``, flags indexes that have never been used.
+"""
+import os
+from pymongo.errors import OperationFailure
+from models import (
+    User, Classroom, Assignment, Grade, AttendanceSession, AttendanceEntry,
+    Announcement, ClassroomStats, Job
+)
+
+MODELS = (User, Classroom, Assignment, Grade, AttendanceSession, AttendanceEntry,
+          Announcement, ClassroomStats, Job)
+
+
+def _auto_create_enabled():
+    return os.getenv('AUTO_CREATE_INDEXES', 'true').lower() != 'false'
+
+
+def configure_auto_create():
+    """Apply AUTO_CREATE_INDEXES to every model."""
+    enabled = _auto_create_enabled()
+    for model in MODELS:
+        model._meta['auto_create_index'] = enabled
+
+
+def _raw_collection(model):
+    # _get_collection() would build the indexes we are about to inspect
+    return model._get_db()[model._get_collection_name()]
+
+
+def _key(fields):
+    return tuple((name, direction) for name, direction in fields)
+
+
+def ensure_indexes(models=MODELS):
+    """Create every declared index as a background build.
+
+    Returns a list of ``(collection, index_name)`` for each index requested;
+    indexes that already exist are left untouched by MongoDB.
+    """
+    created = []
+    for model in models:
+        collection = _raw_collection(model)
+        for spec in model._meta['index_specs']:
+            options = {k: v for k, v in spec.items() if k != 'fields'}
+            name = collection.create_index(spec['fields'], background=True, **options)
+            created.append((collection.name, name))
+    return created
+
+
+def _index_usage(collection):
+    """Return ``{index_name: ops}`` from ``$indexStats``, or None if unsupported."""
+    try:
+        return {row['name']: row['accesses']['ops']
+                for row in collection.aggregate([{'$indexStats': {}}])}
+    except (OperationFailure, NotImplementedError):
+        return None
+
+
+def index_report(models=MODELS):
+    """Compare declared indexes with the ones that exist.
+
+    Returns ``{collection: {'missing': [keys], 'unused': [names]}}`` for
+    collections with anything to report. ``unused`` lists existing indexes
+    (other than _id) with no recorded accesses since the server started; it
+    is empty when ``$indexStats`` is unavailable.
+    """
+    report = {}
+    for model in models:
+        collection = _raw_collection(model)
+        existing = {_key(info['key']): name
+                    for name, info in collection.index_information().items()}
+        missing = [spec['fields'] for spec in model._meta['index_specs']
+                   if _key(spec['fields']) not in existing]
+
+        usage = _index_usage(collection) or {}
+        unused = sorted(name for name, ops in usage.items()
+                        if ops == 0 and name != '_id_')
+
+        if missing or unused:
+            report[collection.name] = {'missing': missing, 'unused': unused}
+    return report
+
+
+def log_index_report(logger):
+    """Log missing and unused indexes; never raises."""
+    try:
+        report = index_report()
+    except Exception as e:
+        logger.warning("Index check skipped: %s", e)
+        return
+    for collection, problems in report.items():
+        for fields in problems['missing']:
+            logger.warning("Missing index on %s: %s (run `flask ensure-indexes`)",
+                           collection, fields)
+        for name in problems['unused']:
+            logger.info("Unused index on %s: %s", collection, name)
+
+
+def require_unique_indexes(models=MODELS):
+    """Raise RuntimeError if AUTO_CREATE_INDEXES=false and a unique index is missing.
+
+    Without them duplicate check-ins and grades are stored silently instead
+    of being rejected.
+    """
+    if _auto_create_enabled():
+        return
+    missing = []
+    for model in models:
+        collection = _raw_collection(model)
+        existing = {_key(info['key']) for info in collection.index_information().values()}
+        missing.extend(f"{collection.name} {spec['fields']}"
+                       for spec in model._meta['index_specs']
+                       if spec.get('unique') and _key(spec['fields']) not in existing)
+    if missing:
+        raise RuntimeError(
+            "Missing unique indexes with AUTO_CREATE_INDEXES=false: "
+            f"{', '.join(missing)}. Run `flask --app main ensure-indexes` first.")
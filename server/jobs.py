@@ -0,0 +1,252 @@
+"""
+Background job runner for long imports and exports.
+
+Jobs are stored in the ``jobs`` collection and executed by a
+``concurrent.futures`` pool owned by each server process, so a large file no
+longer ties up a request worker and no extra services are needed. Workers
+only receive the job id; inputs travel through MongoDB and export files are
+written to GridFS (the ``job_results`` bucket, keyed by job id), so a result
+is not bound by the 16MB document limit.
+
+A pool dies with its server worker, taking its queued and running jobs with
+it. ``sweep_jobs`` (``flask sweep-jobs``, run periodically) hands stale
+queued jobs to a live pool, fails jobs running past JOB_TIMEOUT and removes
+result files whose job has expired.
+
+JOB_EXECUTOR selects the pool: 'process' (default), 'thread', or 'inline'
+(run synchronously on submit; the default when TESTING is set).
+"""
+import csv
+import datetime
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import gridfs
+from mongoengine import connect
+from models import Classroom, Job
+from exports import attendance_rows, grade_rows, roster_rows
+from roster_import import import_roster
+from utils import reference_id, reference_ids
+
+EXECUTORS = ('process', 'thread', 'inline')
+TERMINAL_STATUSES = ('succeeded', 'failed')
+RESULTS_BUCKET = 'job_results'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _executor_mode():
+    default = 'inline' if os.getenv('TESTING') else 'process'
+    mode = os.getenv('JOB_EXECUTOR', default)
+    if mode not in EXECUTORS:
+        raise ValueError(f"Unknown JOB_EXECUTOR: {mode}")
+    return mode
+
+
+def _init_worker(mongo_uri):
+    """Give each pool process its own MongoDB connection."""
+    connect(host=mongo_uri)
+
+
+def _get_executor(mode):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv('JOB_WORKERS', '2'))
+            if mode == 'process':
+                # spawn, not fork: a forked MongoClient is not safe to reuse
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(os.getenv('MONGO_URI',
+                                        'mongodb://localhost:27017/class_roster'),)
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def result_store():
+    """Return the GridFS bucket holding export files."""
+    return gridfs.GridFS(Job._get_db(), collection=RESULTS_BUCKET)
+
+
+def _discard_executor(executor):
+    """Forget ``executor`` so the next submit builds a fresh pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _dispatch(job_id):
+    mode = _executor_mode()
+    if mode == 'inline':
+        run_job(job_id)
+        return
+    executor = _get_executor(mode)
+    try:
+        executor.submit(run_job, job_id)
+    except BrokenProcessPool:
+        # A pool process died (e.g. OOM-killed); the pool refuses all work
+        # from then on. Jobs it was holding are picked up by sweep_jobs.
+        _discard_executor(executor)
+        _get_executor(mode).submit(run_job, job_id)
+
+
+def submit_job(kind, classroom, owner, params=None, payload=None):
+    """Store a queued job and hand it to the pool. Returns the Job."""
+    job = Job(kind=kind, classroom=classroom, owner=owner,
+              params=params or {}, payload=payload)
+    job.save()
+
+    _dispatch(str(job.id))
+    if _executor_mode() == 'inline':
+        job.reload()
+    return job
+
+
+class _Progress:
+    """Throttled writer for a job's percent-complete counter."""
+
+    def __init__(self, job_id, total, interval=0.5):
+        self.job_id = job_id
+        self.total = max(total, 1)
+        self.interval = interval
+        self.done = 0
+        self._last_write = 0
+
+    def update(self, done):
+        self.done = done
+        now = time.monotonic()
+        if now - self._last_write >= self.interval:
+            self._last_write = now
+            percent = min(99, int(self.done * 100 / self.total))
+            Job.objects(id=self.job_id).update_one(set__progress=percent)
+
+    def advance(self, count=1):
+        self.update(self.done + count)
+
+
+def _write_csv(job, rows, progress):
+    """Stream ``rows`` into the job's GridFS result file."""
+    with result_store().new_file(_id=job.id, filename=RESULT_FILENAMES[job.kind],
+                                 content_type='text/csv', encoding='utf-8') as output:
+        writer = csv.writer(output)
+        for row in rows:
+            writer.writerow(row)
+            progress.advance()
+    return {}
+
+
+def _run_roster_import(job, classroom):
+    total_lines = job.payload.count(b'\n') or 1
+    progress = _Progress(job.id, total_lines)
+    stream = io.TextIOWrapper(io.BytesIO(job.payload), encoding='utf-8-sig',
+                              newline='')
+    report = import_roster(classroom, stream, on_progress=progress.update)
+    return {'result': report}
+
+
+def _run_export(rows_for):
+    def run(job, classroom):
+        total_rows = len(reference_ids(classroom, 'students')) + 1
+        progress = _Progress(job.id, total_rows)
+        return _write_csv(job, rows_for(job, classroom), progress)
+    return run
+
+
+TASKS = {
+    'roster_import': _run_roster_import,
+    'roster_export': _run_export(lambda job, c: roster_rows(c)),
+    'attendance_export': _run_export(lambda job, c: attendance_rows(c)),
+    'grades_export': _run_export(
+        lambda job, c: grade_rows(c, job.params.get('assignment_ids'))),
+}
+
+RESULT_FILENAMES = {
+    'roster_export': 'roster.csv',
+    'attendance_export': 'attendance.csv',
+    'grades_export': 'grades.csv',
+}
+
+
+def run_job(job_id):
+    """Execute a queued job. Runs inside the pool; safe to call more than once."""
+    claimed = Job.objects(id=job_id, status='queued').update_one(
+        set__status='running', set__started_at=datetime.datetime.utcnow())
+    if not claimed:
+        return
+
+    job = Job.objects(id=job_id).no_dereference().first()
+    try:
+        classroom = Classroom.objects(id=reference_id(job, 'classroom')).first()
+        if not classroom:
+            raise ValueError('Classroom not found')
+
+        outcome = TASKS[job.kind](job, classroom)
+        # A job swept as failed while it ran stays failed
+        Job.objects(id=job_id, status='running').update_one(
+            set__status='succeeded',
+            set__progress=100,
+            set__result_filename=RESULT_FILENAMES.get(job.kind),
+            set__finished_at=datetime.datetime.utcnow(),
+            unset__payload=True,
+            **{f'set__{k}': v for k, v in outcome.items()}
+        )
+    except Exception as e:
+        result_store().delete(job.id)
+        Job.objects(id=job_id, status='running').update_one(
+            set__status='failed',
+            set__error=str(e),
+            set__finished_at=datetime.datetime.utcnow()
+        )
+
+
+def sweep_jobs(queued_after=None, running_timeout=None):
+    """Recover jobs lost with a dead worker's pool.
+
+    Jobs queued for more than ``queued_after`` seconds (JOB_REQUEUE_AFTER,
+    default 300) are handed to this process's pool again; ``run_job`` claims
+    each job once, so a job that was only waiting its turn still runs once.
+    Jobs running for more than ``running_timeout`` seconds (JOB_TIMEOUT,
+    default 3600) are failed. Result files of expired jobs are deleted.
+    Returns ``(requeued, failed, removed_files)``.
+    """
+    if queued_after is None:
+        queued_after = float(os.getenv('JOB_REQUEUE_AFTER', '300'))
+    if running_timeout is None:
+        running_timeout = float(os.getenv('JOB_TIMEOUT', '3600'))
+    now = datetime.datetime.utcnow()
+
+    stale = [str(job_id) for job_id in Job.objects(
+        status='queued',
+        created_at__lt=now - datetime.timedelta(seconds=queued_after)
+    ).scalar('id')]
+    for job_id in stale:
+        _dispatch(job_id)
+
+    failed = Job.objects(
+        status='running',
+        started_at__lt=now - datetime.timedelta(seconds=running_timeout)
+    ).update(set__status='failed',
+             set__error='The job did not finish in time',
+             set__finished_at=now)
+
+    store = result_store()
+    file_ids = Job._get_db()[f'{RESULTS_BUCKET}.files'].distinct('_id')
+    live = set(Job.objects(id__in=file_ids).scalar('id'))
+    removed = 0
+    for file_id in file_ids:
+        if file_id not in live:
+            store.delete(file_id)
+            removed += 1
+
+    return len(stale), failed, removed
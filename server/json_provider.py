@@ -0,0 +1,104 @@
+"""
+JSON provider for the app.
+
+Encodes with orjson when it is installed and falls back to the standard
+library otherwise. The two paths decode to the same values but are not
+byte-identical: the standard library escapes non-ASCII characters
+(``ensure_ascii``) where orjson writes raw UTF-8, and orjson writes NaN and
+infinities as ``null``. Besides the usual types it serializes:
+
+- ``datetime`` as ISO 8601 UTC with a ``Z`` suffix (naive values are taken
+  to be UTC, as MongoDB returns them), the format every route already uses.
+- ``ObjectId`` and ``DBRef`` as the id string.
+- MongoEngine documents as their stored fields, with ``_id`` exposed as
+  ``id``.
+
+Raw ``as_pymongo()`` rows therefore serialize directly, keeping their
+``_id`` key.
+"""
+import datetime
+import json
+from bson import DBRef, ObjectId
+from flask.json.provider import DefaultJSONProvider
+from mongoengine.base import BaseDocument
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Datetimes go through _default so aware values are normalized to UTC too
+_ORJSON_OPTIONS = 0 if orjson is None else (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    | orjson.OPT_NON_STR_KEYS
+)
+
+
+def format_datetime(value):
+    """Return ``value`` as an ISO 8601 UTC string ending in ``Z``."""
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + 'Z'
+
+
+def document_dict(doc):
+    """Return a MongoEngine document's stored fields, ``_id`` renamed to ``id``."""
+    data = doc.to_mongo().to_dict()
+    data.pop('_cls', None)
+    if '_id' in data:
+        data['id'] = data.pop('_id')
+    return data
+
+
+def _default(o):
+    if isinstance(o, datetime.datetime):
+        return format_datetime(o)
+    if isinstance(o, datetime.date):
+        return o.isoformat()
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, DBRef):
+        return str(o.id)
+    if isinstance(o, BaseDocument):
+        return document_dict(o)
+    return DefaultJSONProvider.default(o)
+
+
+class RoosterJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available."""
+
+    default = staticmethod(_default)
+
+    def _orjson_dumps(self, obj, indent=False, sort_keys=None):
+        option = _ORJSON_OPTIONS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # orjson covers Flask's own formatting arguments; anything else
+        # (cls=, custom separators...) goes to the standard library
+        if orjson is not None and not kwargs.keys() - {'indent', 'sort_keys', 'separators'} \
+                and kwargs.get('separators', (',', ':')) == (',', ':'):
+            return self._orjson_dumps(obj, bool(kwargs.get('indent')),
+                                      kwargs.get('sort_keys')).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Skip the bytes -> str -> bytes round trip of the default provider
+        return self._app.response_class(self._orjson_dumps(obj, indent) + b'\n',
+                                        mimetype=self.mimetype)
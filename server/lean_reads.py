@@ -0,0 +1,67 @@
+"""
+Lean read path for the heaviest list endpoints.
+
+The roster, session list, assignment list and grade list only need a few
+fields of each document. On the lean path they query with ``.only()`` and
+``.as_pymongo()`` and map the raw rows straight to response dicts, skipping
+MongoEngine's document construction, validation and dereference proxies.
+The document path loads full documents and hands the routes the same rows
+via ``to_mongo()``, so both paths share the response mapping and can be
+compared directly (see tests/test_lean_reads.py).
+
+LEAN_READS selects the routes that use the lean path: 'all' (default),
+'none', or a comma-separated list of names from LEAN_ROUTES; any route left
+out reads documents. It is parsed once by ``configure_lean_reads`` at
+startup, so a bad value stops the app instead of failing every request.
+"""
+import os
+from utils import get_safe_list
+
+LEAN_ROUTES = ('roster', 'sessions', 'assignments', 'grades')
+
+_routes = None
+
+
+def lean_routes():
+    """Parse LEAN_READS into a set of route names; raises ValueError if invalid."""
+    value = os.getenv('LEAN_READS', 'all').strip().lower()
+    if value == 'all':
+        return set(LEAN_ROUTES)
+    if value == 'none':
+        return set()
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(LEAN_ROUTES)
+    if unknown:
+        raise ValueError(f"Unknown LEAN_READS route: {', '.join(sorted(unknown))}")
+    return names
+
+
+def configure_lean_reads():
+    """Validate LEAN_READS and cache the routes it selects."""
+    global _routes
+    _routes = lean_routes()
+
+
+def lean_enabled(route):
+    """Return True if ``route`` (one of LEAN_ROUTES) reads raw rows."""
+    if _routes is None:
+        configure_lean_reads()
+    return route in _routes
+
+
+def fetch_rows(route, queryset, *fields):
+    """Return ``queryset``'s results as raw dicts.
+
+    The lean path projects to ``fields`` (``_id`` is always included); the
+    document path returns every stored field of each loaded document.
+    """
+    if lean_enabled(route):
+        return list(queryset.only(*fields).as_pymongo())
+    return [doc.to_mongo().to_dict() for doc in queryset]
+
+
+def safe_list_rows(route, parent_doc, field_name, *fields):
+    """``get_safe_list`` as raw dicts, in stored order, with the same self-healing."""
+    if lean_enabled(route):
+        return get_safe_list(parent_doc, field_name, fields=fields)
+    return [doc.to_mongo().to_dict() for doc in get_safe_list(parent_doc, field_name)]
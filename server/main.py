@@ -4,6 +4,13 @@ from routes.grades import grades_bp
 from routes.roster import roster_bp
 from routes.classrooms import classrooms_bp
 from routes.api import api_bp
+from routes.jobs import jobs_bp
+from commands import register_commands
+from indexes import configure_auto_create, log_index_report, require_unique_indexes
+from compression import init_compression
+from json_provider import RoosterJSONProvider
+from lean_reads import configure_lean_reads
+from pagination import NEXT_CURSOR_HEADER
 from mongoengine.errors import ValidationError as MongoValidationError
 import os
 from dotenv import load_dotenv
@@ -14,6 +21,8 @@ from mongoengine import connect
 load_dotenv()
 
 app = Flask(__name__)
+# orjson-backed when installed; also encodes ObjectId, datetime and documents
+app.json = RoosterJSONProvider(app)
 # Security: Enforce strong secret key in production
 if os.getenv('FLASK_DEBUG', 'False').lower() != 'true' and not os.getenv('SECRET_KEY'):
     raise ValueError(
@@ -25,9 +34,13 @@ app.secret_key = os.getenv("SECRET_KEY", "dev-secret")
 if not os.getenv('TESTING'):
     connect(host=os.getenv('MONGO_URI', 'mongodb://localhost:27017/class_roster'))
 
+configure_auto_create()
+configure_lean_reads()
+
  # Enable CORS for development; allow credentials so SPA can use cookies
 CORS(app, supports_credentials=True, origins=[
-     os.getenv('FRONTEND_URL', 'http://localhost:5173')])
+     os.getenv('FRONTEND_URL', 'http://localhost:5173')],
+     expose_headers=[NEXT_CURSOR_HEADER])
 
 # Configure session cookie for cross-site OAuth redirects in dev.
 # `SameSite=None` with `Secure=True` is required by modern browsers to allow
@@ -40,6 +53,9 @@ app.config.update({
     'SESSION_COOKIE_HTTPONLY': True,
 })
 
+# gzip/brotli for large JSON and CSV responses (RESPONSE_COMPRESSION=off to disable)
+init_compression(app)
+
 
 @app.route('/')
 def hello_world():
@@ -108,7 +124,18 @@ app.register_blueprint(auth_bp)
 
 app.register_blueprint(announcements_bp, url_prefix='/api/announcements')
 
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+
+# Maintenance commands (flask --app main <command>)
+register_commands(app)
+
+# Report missing/unused indexes once per process; never blocks startup
+if not os.getenv('TESTING') and os.getenv('CHECK_INDEXES_ON_STARTUP', 'true').lower() != 'false':
+    log_index_report(app.logger)
+
 
 if __name__ == '__main__':
+    # Checked when serving only, so `flask ensure-indexes` can still build them
+    require_unique_indexes()
     debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     app.run(debug=debug_mode)
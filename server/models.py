@@ -1,7 +1,7 @@
 from mongoengine import (
     Document, StringField, EmailField, ReferenceField, ListField,
     DateTimeField, BooleanField, IntField, FloatField, EmbeddedDocument,
-    EmbeddedDocumentField, CASCADE, PULL
+    EmbeddedDocumentField, ObjectIdField, DictField, BinaryField, CASCADE, PULL
 )
 import datetime
 
@@ -39,8 +39,18 @@ class Classroom(Document):
     deleted_at = DateTimeField()  # When status changed to inactive
 
     created_at = DateTimeField(default=datetime.datetime.utcnow)
+    # Bumped by every change its read endpoints would show; see etags
+    version = IntField(default=0)
 
-    meta = {'collection': 'classrooms'}
+    meta = {
+        'collection': 'classrooms',
+        'indexes': [
+            # Class lists: "taught by" and "enrolled in", active classes only.
+            # The students prefix also backs enrollment membership checks.
+            ('instructor', 'status'),
+            ('students', 'status')
+        ]
+    }
 
 
 class Assignment(Document):
@@ -50,7 +60,11 @@ class Assignment(Document):
     points_possible = FloatField(required=True)
     due_date = DateTimeField()
 
-    meta = {'collection': 'assignments'}
+    meta = {
+        'collection': 'assignments',
+        # Per-class listing, ordered and paginated by _id
+        'indexes': [('classroom', 'id')]
+    }
 
 
 class Grade(Document):
@@ -64,7 +78,9 @@ class Grade(Document):
     meta = {
         'collection': 'grades',
         'indexes': [
-            {'fields': ('assignment', 'student'), 'unique': True}
+            {'fields': ('assignment', 'student'), 'unique': True},
+            # A student's grades across a class's assignments
+            ('student', 'assignment')
         ]
     }
 
@@ -80,11 +96,38 @@ class AttendanceSession(Document):
     classroom = ReferenceField(Classroom, required=True)
     date = DateTimeField(required=True, default=datetime.datetime.utcnow)
     code = StringField()  # Code for students to check in
+    # 'rotating' sessions derive their code from the time; see attendance_codes
+    code_mode = StringField(choices=('static', 'rotating'), default='static')
     is_open = BooleanField(default=True)
 
     records = ListField(EmbeddedDocumentField(AttendanceRecord))
 
-    meta = {'collection': 'attendance_sessions'}
+    meta = {
+        'collection': 'attendance_sessions',
+        # Session lists and exports sort a class's sessions by date
+        'indexes': [('classroom', '-date')]
+    }
+
+
+class AttendanceEntry(Document):
+    """One student's attendance in a session, for the 'collection' storage layout.
+
+    Replaces AttendanceSession.records when ATTENDANCE_STORAGE=collection.
+    """
+    session = ReferenceField(AttendanceSession, required=True)
+    classroom = ReferenceField(Classroom, required=True)
+    student = ReferenceField(User, required=True)
+    status = StringField(
+        choices=('present', 'late', 'absent', 'excused'), default='absent')
+    timestamp = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'attendance_records',
+        'indexes': [
+            {'fields': ('session', 'student'), 'unique': True},
+            ('classroom', 'student')
+        ]
+    }
 
 
 class Announcement(Document):
@@ -95,4 +138,57 @@ class Announcement(Document):
     created_at = DateTimeField(default=datetime.datetime.utcnow)
     updated_at = DateTimeField()
 
-    meta = {'collection': 'announcements'}
+    meta = {
+        'collection': 'announcements',
+        # Serves the newest-first class feed; _id breaks created_at ties
+        'indexes': [('classroom', '-created_at', '-id')]
+    }
+
+
+class ClassroomStats(Document):
+    """Materialized statistics counters, keyed by the classroom's id."""
+    id = ObjectIdField(primary_key=True)
+
+    # Distribution keys are escaped so they are legal field names
+    major_counts = DictField()
+    year_counts = DictField()
+    total_sessions = IntField(default=0)
+    total_present = IntField(default=0)
+    grade_total = FloatField(default=0)
+    grade_count = IntField(default=0)
+
+    # Set once the counters hold a full recompute, not just increments
+    built_at = DateTimeField()
+    updated_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {'collection': 'classroom_stats'}
+
+
+class Job(Document):
+    """A background import/export job and its stored result."""
+    kind = StringField(required=True, choices=(
+        'roster_import', 'roster_export', 'attendance_export', 'grades_export'))
+    classroom = ReferenceField(Classroom, required=True)
+    owner = ReferenceField(User, required=True, reverse_delete_rule=CASCADE)
+    status = StringField(
+        choices=('queued', 'running', 'succeeded', 'failed'), default='queued')
+    progress = IntField(default=0)  # Percent complete
+
+    params = DictField()
+    payload = BinaryField()  # Uploaded input (imports)
+    result = DictField()  # JSON result (import report)
+    result_filename = StringField()
+    error = StringField()
+
+    created_at = DateTimeField(default=datetime.datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'collection': 'jobs',
+        'indexes': [
+            ('owner', '-created_at'),
+            # Finished jobs and their results are kept for a week
+            {'fields': ['created_at'], 'expireAfterSeconds': 7 * 24 * 3600}
+        ]
+    }
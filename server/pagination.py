@@ -0,0 +1,79 @@
+"""
+Opt-in keyset pagination for list endpoints.
+
+List endpoints keep returning a plain JSON array. When the client passes
+``?limit=N`` only that many items are returned, and if more remain the
+response carries an opaque ``X-Next-Cursor`` header to send back as
+``?cursor=...`` for the following page. Cursors encode the sort key of the
+last item returned, so each page is an indexed range query rather than a skip.
+"""
+import base64
+import datetime
+import json
+from flask import jsonify, request
+
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(*values):
+    """Encode sort-key values (str, int, float or datetime) as an opaque token."""
+    payload = [
+        {'dt': v.isoformat()} if isinstance(v, datetime.datetime) else v
+        for v in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token from encode_cursor back into its list of values."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, list):
+            raise ValueError
+        return [
+            datetime.datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v
+            for v in payload
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+
+
+def get_page_args():
+    """Read ``limit`` and ``cursor`` from the query string.
+
+    Returns ``(limit, cursor_values)``; either is None when not supplied.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        limit = int(limit)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+    else:
+        cursor = None
+    return limit, cursor
+
+
+def paginated_response(results, limit, cursor_for):
+    """Trim ``results`` to one page and attach the next-page cursor header.
+
+    Callers fetch ``limit + 1`` items so a further page can be detected
+    without a count query. ``cursor_for(item)`` returns the cursor token that
+    resumes after ``item``.
+    """
+    next_cursor = None
+    if limit is not None and len(results) > limit:
+        results = results[:limit]
+        next_cursor = cursor_for(results[-1])
+
+    response = jsonify(results)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
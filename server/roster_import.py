@@ -0,0 +1,149 @@
+"""
+Bulk roster CSV import.
+
+Rows are parsed as a stream and processed in batches: each batch resolves
+every email with one ``$in`` query, creates the missing users with one
+``insert_many`` and enrolls everyone with one ``$addToSet``. The result
+reports per-row errors and duplicates instead of silently skipping them.
+"""
+import csv
+import uuid
+from bson import ObjectId
+from mongoengine.errors import ValidationError
+from pymongo.errors import BulkWriteError
+from models import User
+from enrollment import enroll_many
+
+BATCH_SIZE = 1000
+
+
+def _parse_grad_year(value):
+    value = (value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def _new_user(row, email, name):
+    return User(
+        id=ObjectId(),
+        email=email,
+        name=name,
+        google_id=f"imported_{uuid.uuid4()}",
+        major=row.get('major') or None,
+        grad_year=_parse_grad_year(row.get('grad_year')),
+        student_id=row.get('student_id') or None,
+        picture="https://ui-avatars.com/api/?name=" + name.replace(" ", "+")
+    )
+
+
+class RosterImport:
+    """Accumulates the outcome of one import."""
+
+    def __init__(self, classroom):
+        self.classroom = classroom
+        self.added = 0
+        self.created = 0
+        self.errors = []
+        self.duplicates = []
+        self._seen_emails = set()
+
+    def report(self):
+        return {
+            'ok': True,
+            'added': self.added,
+            'created': self.created,
+            'errors': self.errors,
+            'duplicates': self.duplicates
+        }
+
+    def process_batch(self, rows):
+        """Import a batch of ``(row_number, email, name, row)`` tuples."""
+        if not rows:
+            return
+
+        existing = {
+            u.email: u for u in User.objects(
+                email__in=[email for _, email, _, _ in rows]
+            ).only('id', 'email', 'major', 'grad_year')
+        }
+
+        # Build and validate the users that need creating
+        to_create = []
+        batch_users = []
+        for row_number, email, name, row in rows:
+            student = existing.get(email)
+            if not student:
+                student = _new_user(row, email, name)
+                try:
+                    student.validate()
+                except ValidationError:
+                    self.errors.append({'row': row_number, 'email': email,
+                                        'error': 'Invalid email address'})
+                    continue
+                to_create.append((row_number, student))
+            batch_users.append((row_number, student))
+
+        failed = set()
+        if to_create:
+            try:
+                User._get_collection().insert_many(
+                    [student.to_mongo() for _, student in to_create], ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get('writeErrors', []):
+                    row_number, student = to_create[err['index']]
+                    failed.add(student.pk)
+                    self.errors.append({'row': row_number, 'email': student.email,
+                                        'error': 'Could not create user'})
+            self.created += len(to_create) - len(failed)
+
+        batch_users = [(n, u) for n, u in batch_users if u.pk not in failed]
+        newly_enrolled = {u.pk for u in enroll_many(
+            self.classroom, [u for _, u in batch_users])}
+        for row_number, student in batch_users:
+            if student.pk in newly_enrolled:
+                self.added += 1
+            else:
+                self.duplicates.append({'row': row_number, 'email': student.email,
+                                        'reason': 'Already enrolled'})
+
+    def run(self, text_stream, batch_size=BATCH_SIZE, on_progress=None):
+        """Import every row of a CSV text stream and return the report.
+
+        ``on_progress(rows_read)`` is called after each batch is written.
+        """
+        reader = csv.DictReader(text_stream)
+        if not reader.fieldnames:
+            raise ValueError('CSV file is empty or has no header row')
+
+        # Normalize headers to lowercase
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+
+        batch = []
+        for row in reader:
+            row_number = reader.line_num
+            email = (row.get('email') or '').strip()
+            name = (row.get('name') or '').strip()
+
+            if not email or not name:
+                self.errors.append({'row': row_number, 'email': email or None,
+                                    'error': 'Email and Name are required'})
+                continue
+            if email in self._seen_emails:
+                self.duplicates.append({'row': row_number, 'email': email,
+                                        'reason': 'Duplicate row in file'})
+                continue
+            self._seen_emails.add(email)
+
+            batch.append((row_number, email, name, row))
+            if len(batch) >= batch_size:
+                self.process_batch(batch)
+                batch = []
+                if on_progress:
+                    on_progress(reader.line_num)
+
+        self.process_batch(batch)
+        return self.report()
+
+
+def import_roster(classroom, text_stream, batch_size=BATCH_SIZE, on_progress=None):
+    """Import a roster CSV into ``classroom`` and return the per-row report."""
+    return RosterImport(classroom).run(text_stream, batch_size, on_progress)
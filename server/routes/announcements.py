@@ -1,47 +1,81 @@
-from flask import Blueprint, jsonify, session, request
+from flask import Blueprint, jsonify, request
+from mongoengine.queryset.visitor import Q
+from bson import ObjectId
+from bson.errors import InvalidId
 from models import User, Classroom, Announcement
+from enrollment import is_enrolled
+from identity import get_current_user, get_document, get_reference, is_instructor
+from pagination import encode_cursor, get_page_args, paginated_response
+from etags import bump_version, classroom_etag
+from utils import reference_id
 import datetime
 
 announcements_bp = Blueprint('announcements', __name__)
 
 
-def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.objects(id=user_id).first()
-
-
 @announcements_bp.route('/<classroom_id>/announcements', methods=['GET'])
+@classroom_etag()
 def list_announcements(classroom_id):
-    """List all announcements for a classroom (newest first)."""
+    """List announcements for a classroom (newest first).
+
+    Supports ``?limit=N&cursor=...`` keyset pagination on (created_at, _id).
+    """
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
     # Must be instructor or student
-    if user != classroom.instructor and user not in classroom.students:
+    if not is_instructor(classroom, user) and not is_enrolled(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    announcements = Announcement.objects(
-        classroom=classroom).order_by('-created_at')
-
-    return jsonify([{
-        'id': str(a.id),
-        'title': a.title,
-        'content': a.content,
-        'author': {
-            'id': str(a.author.id),
-            'name': a.author.name,
-            'picture': a.author.picture
-        },
-        'created_at': a.created_at.isoformat() + 'Z',
-        'updated_at': a.updated_at.isoformat() + 'Z' if a.updated_at else None
-    } for a in announcements])
+    try:
+        limit, cursor = get_page_args()
+        if cursor:
+            before_created, before_id = cursor[0], ObjectId(cursor[1])
+    except (ValueError, TypeError, IndexError, InvalidId) as e:
+        return jsonify({'error': str(e) or 'Invalid cursor'}), 400
+
+    announcements = Announcement.objects(classroom=classroom) \
+        .order_by('-created_at', '-id')
+    if cursor:
+        announcements = announcements.filter(
+            Q(created_at__lt=before_created) |
+            Q(created_at=before_created, id__lt=before_id))
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        announcements = announcements.limit(limit + 1)
+    announcements = list(announcements.as_pymongo())
+
+    # Load every author on the page in one query
+    authors = {
+        u['_id']: u for u in User.objects(
+            id__in=list({a['author'] for a in announcements})
+        ).only('name', 'picture').as_pymongo()
+    }
+
+    results = []
+    for a in announcements:
+        author = authors.get(a['author'], {})
+        results.append({
+            'id': str(a['_id']),
+            'title': a['title'],
+            'content': a['content'],
+            'author': {
+                'id': str(a['author']),
+                'name': author.get('name'),
+                'picture': author.get('picture')
+            },
+            'created_at': a['created_at'],
+            'updated_at': a.get('updated_at')
+        })
+
+    created = {str(a['_id']): a['created_at'] for a in announcements}
+    return paginated_response(
+        results, limit, lambda item: encode_cursor(created[item['id']], item['id']))
 
 
 @announcements_bp.route('/<classroom_id>/announcements', methods=['POST'])
@@ -51,11 +85,11 @@ def create_announcement(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
-    if user != classroom.instructor:
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Only instructor can create announcements'}), 403
 
     data = request.json
@@ -72,12 +106,13 @@ def create_announcement(classroom_id):
         content=content
     )
     announcement.save()
+    bump_version(classroom)
 
     return jsonify({
         'id': str(announcement.id),
         'title': announcement.title,
         'content': announcement.content,
-        'created_at': announcement.created_at.isoformat() + 'Z'
+        'created_at': announcement.created_at
     })
 
 
@@ -88,11 +123,11 @@ def update_announcement(announcement_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    announcement = Announcement.objects(id=announcement_id).first()
+    announcement = get_document(Announcement, announcement_id)
     if not announcement:
         return jsonify({'error': 'Announcement not found'}), 404
 
-    if user != announcement.classroom.instructor:
+    if not is_instructor(get_reference(announcement, 'classroom'), user):
         return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
@@ -103,6 +138,7 @@ def update_announcement(announcement_id):
 
     announcement.updated_at = datetime.datetime.utcnow()
     announcement.save()
+    bump_version(reference_id(announcement, 'classroom'))
 
     return jsonify({'ok': True})
 
@@ -114,13 +150,14 @@ def delete_announcement(announcement_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    announcement = Announcement.objects(id=announcement_id).first()
+    announcement = get_document(Announcement, announcement_id)
     if not announcement:
         return jsonify({'error': 'Announcement not found'}), 404
 
-    if user != announcement.classroom.instructor:
+    if not is_instructor(get_reference(announcement, 'classroom'), user):
         return jsonify({'error': 'Permission denied'}), 403
 
     announcement.delete()
+    bump_version(reference_id(announcement, 'classroom'))
 
     return jsonify({'ok': True})
@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, session, request
-from models import User
+from identity import get_current_user
+from classroom_stats import record_profile_change
+from etags import bump_versions_for_user
 
 api_bp = Blueprint('api', __name__)
 
@@ -15,7 +17,7 @@ def user():
     if not user_id:
         return jsonify({'user': None}), 401
 
-    user = User.objects(id=user_id).first()
+    user = get_current_user()
     if not user:
         return jsonify({'user': None}), 404
 
@@ -39,7 +41,7 @@ def update_user():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    user = User.objects(id=user_id).first()
+    user = get_current_user()
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
@@ -52,11 +54,16 @@ def update_user():
         if data['role'] in ['student', 'instructor']:
             user.role = data['role']
 
+    old_major, old_grad_year = user.major, user.grad_year
     for field in allowed_fields:
         if field in data:
             setattr(user, field, data[field])
 
     user.save()
+    # Enrolled classes count students by major and year
+    record_profile_change(user, old_major, old_grad_year)
+    # Rosters and class pages show the profile
+    bump_versions_for_user(user)
     return jsonify({'ok': True})
 
 
@@ -4,6 +4,7 @@ import requests
 from urllib.parse import urlencode
 from flask import Blueprint, request, redirect, session, current_app, jsonify
 from models import User
+from etags import bump_versions_for_user
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -100,6 +101,7 @@ def auth_callback():
             user.name = name
             user.picture = picture
             user.save()
+            bump_versions_for_user(user)
 
     # Store user ID in session
     session['user_id'] = str(user.id)
@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify, session, request
-from models import User, Classroom, Assignment, Grade, AttendanceSession
+from flask import Blueprint, jsonify, request
+from models import User, Classroom
 from mongoengine import Q
-from utils import get_safe_list
+from classroom_stats import classroom_counts, get_statistics
+from enrollment import enroll, is_enrolled
+from etags import bump_version, class_list_etag, classroom_etag
+from identity import get_current_user, get_document, get_reference, is_instructor
 import secrets
 import string
 import datetime
@@ -9,128 +12,67 @@ import datetime
 classrooms_bp = Blueprint('classrooms', __name__)
 
 
-def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.objects(id=user_id).first()
-
-
-def is_enrolled(classroom, user):
-    """Safely check if user is in classroom.students without crashing on zombie refs."""
-    try:
-        valid_students = get_safe_list(classroom, 'students')
-        return user in valid_students
-    except Exception:
-        return False
-
-
 @classrooms_bp.route('/<classroom_id>/statistics', methods=['GET'])
+@classroom_etag()
 def get_classroom_statistics(classroom_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
-    if user != classroom.instructor:
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    # 1. Roster Statistics (Major & Grad Year)
-    # Safely iterate students using self-healing utility
-    valid_students = get_safe_list(classroom, 'students')
-    total_students = len(valid_students)
-
-    major_counts = {}
-    year_counts = {}
-
-    for s in valid_students:
-        # Major
-        m = s.major or 'Undeclared'
-        major_counts[m] = major_counts.get(m, 0) + 1
-
-        # Grad Year
-        y = s.grad_year
-        y_key = str(y) if y else 'Unknown'
-        year_counts[y_key] = year_counts.get(y_key, 0) + 1
-
-    # 2. Attendance Statistics
-    sessions = AttendanceSession.objects(classroom=classroom)
-    total_sessions = sessions.count()
-    overall_attendance_rate = 0
-
-    if total_students > 0 and total_sessions > 0:
-        total_possible_records = total_students * total_sessions
-        total_present = 0
-        for sess in sessions:
-            # Count how many records have status 'present'
-            # Note: records is a list of EmbeddedDocuments
-            present_count = sum(
-                1 for r in sess.records if r.status == 'present')
-            total_present += present_count
-
-        overall_attendance_rate = (
-            total_present / total_possible_records) * 100
-
-    # 3. Grade Statistics
-    assignments = Assignment.objects(classroom=classroom)
-    total_assignments = assignments.count()
-    average_grade = 0
-
-    if total_assignments > 0:
-        # Get all grades for these assignments
-        all_grades = Grade.objects(assignment__in=assignments)
-
-        total_score_percentage = 0
-        grade_count = 0
-
-        for g in all_grades:
-            if g.score is not None and g.assignment.points_possible > 0:
-                percentage = (g.score / g.assignment.points_possible) * 100
-                total_score_percentage += percentage
-                grade_count += 1
-
-        if grade_count > 0:
-            average_grade = total_score_percentage / grade_count
-
-    return jsonify({
-        'total_students': total_students,
-        'major_distribution': major_counts,
-        'year_distribution': year_counts,
-        'attendance_rate': round(overall_attendance_rate, 1),
-        'average_grade': round(average_grade, 1)
-    })
+    # Served from the materialized rollup: one primary-key read
+    return jsonify(get_statistics(classroom))
 
 
 @classrooms_bp.route('/', methods=['GET'])
+@class_list_etag
 def list_classrooms():
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    # Classes where user is instructor OR student, only active ones
-    classes = Classroom.objects(
+    include = set(filter(None, request.args.get('include', '').split(',')))
+
+    # Classes where user is instructor OR student, only active ones,
+    # projected to the listed fields
+    classes = list(Classroom.objects(
         (Q(instructor=user) | Q(students=user)) & Q(status='active'))
+        .only('name', 'term', 'section', 'instructor', 'join_code').as_pymongo())
+
+    # All instructors in one query
+    instructors = {
+        u['_id']: u for u in User.objects(
+            id__in=list({c['instructor'] for c in classes})
+        ).only('name').as_pymongo()
+    }
+    counts = classroom_counts([c['_id'] for c in classes]) if 'counts' in include else {}
 
     results = []
     for c in classes:
-        try:
-            # c.instructor might raise DoesNotExist if instructor was deleted
-            inst = c.instructor
-            results.append({
-                'id': str(c.id),
-                'name': c.name,
-                'term': c.term,
-                'section': c.section,
-                'instructor_name': inst.name,
-                'is_instructor': inst == user,
-                'join_code': c.join_code if inst == user else None
-            })
-        except Exception:
+        inst = instructors.get(c['instructor'])
+        if not inst:
             # Skip classes with broken/deleted instructor
             continue
+        viewer_is_instructor = c['instructor'] == user.pk
+        data = {
+            'id': str(c['_id']),
+            'name': c['name'],
+            'term': c['term'],
+            'section': c.get('section'),
+            'instructor_name': inst.get('name'),
+            'is_instructor': viewer_is_instructor,
+            'join_code': c.get('join_code') if viewer_is_instructor else None
+        }
+        if 'counts' in include:
+            data['counts'] = counts.get(c['_id'], {
+                'students': 0, 'assignments': 0, 'open_sessions': 0})
+        results.append(data)
 
     return jsonify(results)
 
@@ -188,15 +130,12 @@ def join_classroom():
     if not classroom:
         return jsonify({'error': 'Invalid join code'}), 404
 
-    if user == classroom.instructor:
+    if is_instructor(classroom, user):
         return jsonify({'error': 'You are the instructor of this class'}), 400
 
-    if is_enrolled(classroom, user):
+    if not enroll(classroom, user):
         return jsonify({'error': 'Already enrolled in this class'}), 400
 
-    classroom.students.append(user)
-    classroom.save()
-
     return jsonify({
         'id': str(classroom.id),
         'name': classroom.name,
@@ -205,19 +144,24 @@ def join_classroom():
 
 
 @classrooms_bp.route('/<classroom_id>', methods=['GET'])
+@classroom_etag()
 def get_classroom(classroom_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
     # Check permission
-    if user != classroom.instructor and not is_enrolled(classroom, user):
+    if not is_instructor(classroom, user) and not is_enrolled(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
+    # Served from the identity map when the viewer is the instructor
+    instructor = get_reference(classroom, 'instructor')
+    viewer_is_instructor = is_instructor(classroom, user)
+
     return jsonify({
         'id': str(classroom.id),
         'name': classroom.name,
@@ -225,11 +169,11 @@ def get_classroom(classroom_id):
         'section': classroom.section,
         'description': classroom.description,
         'instructor': {
-            'name': classroom.instructor.name,
-            'email': classroom.instructor.email
+            'name': instructor.name if instructor else None,
+            'email': instructor.email if instructor else None
         },
-        'is_instructor': classroom.instructor == user,
-        'join_code': classroom.join_code if classroom.instructor == user else None
+        'is_instructor': viewer_is_instructor,
+        'join_code': classroom.join_code if viewer_is_instructor else None
     })
 
 
@@ -240,17 +184,18 @@ def delete_classroom(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
     # Only instructor can delete
-    if classroom.instructor != user:
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Only the instructor can delete this class'}), 403
 
     # Soft delete: set status to inactive
     classroom.status = 'inactive'
     classroom.deleted_at = datetime.datetime.utcnow()
     classroom.save()
+    bump_version(classroom)
 
     return jsonify({'ok': True, 'message': 'Class has been deleted'})
@@ -1,77 +1,93 @@
-from flask import Blueprint, jsonify, session, request, Response
+from flask import Blueprint, jsonify, request, Response
 from models import User, Classroom, Assignment, Grade
-from utils import get_safe_list, get_safe_reference
+from utils import (
+    get_safe_references, heal_dangling_references, iter_csv, parse_iso_datetime,
+    reference_id
+)
+from enrollment import is_enrolled
+from classroom_stats import record_grade_change
+from identity import get_current_user, get_document, get_reference, is_instructor
+from bson import ObjectId
+from bson.errors import InvalidId
+from exports import grade_rows, parse_id_list
+from pagination import encode_cursor, get_page_args, paginated_response
+from etags import assignment_classroom, bump_version, classroom_etag
+from grade_import import GradeImport
+from lean_reads import fetch_rows, lean_enabled
 import datetime
-import csv
 import io
 
 grades_bp = Blueprint('grades', __name__)
 
 
-def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.objects(id=user_id).first()
-
-
-def sanitize_for_csv(value):
-    """Prevent CSV injection (Formula Injection)."""
-    if not value:
-        return ""
-    value = str(value)
-    if value.startswith(('=', '+', '-', '@')):
-        return f"'{value}"
-    return value
-
-
-def is_enrolled(classroom, user):
-    """Safely check if user is in classroom.students without crashing on zombie refs."""
-    try:
-        valid_students = get_safe_list(classroom, 'students')
-        return user in valid_students
-    except Exception:
-        return False
-
-
 @grades_bp.route('/<classroom_id>/assignments', methods=['GET'])
+@classroom_etag()
 def list_assignments(classroom_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
-    if user != classroom.instructor and not is_enrolled(classroom, user):
+    if not is_instructor(classroom, user) and not is_enrolled(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    assignments = Assignment.objects(classroom=classroom)
+    try:
+        limit, cursor = get_page_args()
+        due_after = request.args.get('due_after')
+        due_before = request.args.get('due_before')
+        due_after = parse_iso_datetime(due_after) if due_after else None
+        due_before = parse_iso_datetime(due_before) if due_before else None
+        after_id = ObjectId(cursor[0]) if cursor else None
+    except (ValueError, TypeError, InvalidId) as e:
+        return jsonify({'error': str(e) or 'Invalid query parameters'}), 400
+
+    assignments = Assignment.objects(classroom=classroom).order_by('id')
+    # Optional due-date window: ?due_after=<iso>&due_before=<iso>
+    if due_after:
+        assignments = assignments.filter(due_date__gte=due_after)
+    if due_before:
+        assignments = assignments.filter(due_date__lte=due_before)
+    if after_id:
+        assignments = assignments.filter(id__gt=after_id)
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        assignments = assignments.limit(limit + 1)
+    assignments = fetch_rows('assignments', assignments,
+                             'title', 'description', 'points_possible', 'due_date')
+
+    # Students get their own grades from one query joined in memory
+    viewer_is_instructor = is_instructor(classroom, user)
+    grades = {}
+    if not viewer_is_instructor and assignments:
+        grades = {
+            g['assignment']: g for g in Grade.objects(
+                student=user, assignment__in=[a['_id'] for a in assignments]
+            ).only('assignment', 'score', 'feedback').as_pymongo()
+        }
 
     results = []
     for a in assignments:
         data = {
-            'id': str(a.id),
-            'title': a.title,
-            'description': a.description,
-            'points_possible': a.points_possible,
-            'due_date': a.due_date.isoformat() if a.due_date else None
+            'id': str(a['_id']),
+            'title': a['title'],
+            'description': a.get('description'),
+            'points_possible': a['points_possible'],
+            'due_date': a.get('due_date')
         }
 
         # If student, include their grade
-        if user != classroom.instructor:
-            grade = Grade.objects(assignment=a, student=user).first()
-            if grade:
-                data['score'] = grade.score
-                data['feedback'] = grade.feedback
-            else:
-                data['score'] = None
-                data['feedback'] = None
+        if not viewer_is_instructor:
+            grade = grades.get(a['_id'], {})
+            data['score'] = grade.get('score')
+            data['feedback'] = grade.get('feedback')
 
         results.append(data)
 
-    return jsonify(results)
+    return paginated_response(results, limit,
+                              lambda item: encode_cursor(item['id']))
 
 
 @grades_bp.route('/<classroom_id>/assignments', methods=['POST'])
@@ -80,8 +96,8 @@ def create_assignment(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
-    if not classroom or classroom.instructor != user:
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
@@ -103,30 +119,34 @@ def create_assignment(classroom_id):
         due_date=due_date
     )
     assignment.save()
+    bump_version(classroom)
 
     return jsonify({'id': str(assignment.id), 'title': assignment.title})
 
 
 @grades_bp.route('/assignment/<assignment_id>/grades', methods=['GET'])
+@classroom_etag(resolve=assignment_classroom)
 def get_grades(assignment_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    assignment = Assignment.objects(id=assignment_id).first()
+    assignment = get_document(Assignment, assignment_id)
     if not assignment:
         return jsonify({'error': 'Assignment not found'}), 404
 
-    classroom = assignment.classroom
+    classroom = get_reference(assignment, 'classroom')
 
-    if user == classroom.instructor:
+    if is_instructor(classroom, user):
+        if lean_enabled('grades'):
+            return jsonify(_lean_grade_list(assignment))
         # Get all grades for this assignment
         # Use no_dereference to avoid crashing on iteration if zombies exist
-        grades = Grade.objects(assignment=assignment).no_dereference()
+        grades = list(Grade.objects(assignment=assignment).no_dereference())
+        # Resolve every student in one query; self-heal grades of deleted students
+        students = get_safe_references(grades, 'student')
         results = []
-        for g in grades:
-            # Self-heal references if students were deleted
-            student = get_safe_reference(g, 'student')
+        for g, student in zip(grades, students):
             if student:
                 results.append({
                     'student_id': str(student.id),
@@ -137,25 +157,48 @@ def get_grades(assignment_id):
         return jsonify(results)
     elif is_enrolled(classroom, user):
         # Get only own grade
-        grade = Grade.objects(assignment=assignment, student=user).first()
+        grade = fetch_rows('grades', Grade.objects(assignment=assignment, student=user)
+                           .limit(1), 'score', 'feedback')
         if not grade:
             return jsonify({'score': None})
         return jsonify({
-            'score': grade.score,
-            'feedback': grade.feedback
+            'score': grade[0].get('score'),
+            'feedback': grade[0].get('feedback')
         })
     else:
         return jsonify({'error': 'Permission denied'}), 403
 
 
+def _lean_grade_list(assignment):
+    """Instructor grade list from raw rows: one Grade query and one User query."""
+    grades = list(Grade.objects(assignment=assignment)
+                  .only('student', 'score', 'feedback').as_pymongo())
+    students = {
+        u['_id']: u for u in User.objects(
+            id__in=list({g['student'] for g in grades})
+        ).only('name').as_pymongo()
+    }
+
+    # Same self-healing as get_safe_references: a grade needs its student
+    heal_dangling_references(
+        Grade, 'student', [g['_id'] for g in grades if g['student'] not in students])
+
+    return [{
+        'student_id': str(g['student']),
+        'student_name': students[g['student']].get('name'),
+        'score': g.get('score'),
+        'feedback': g.get('feedback')
+    } for g in grades if g['student'] in students]
+
+
 @grades_bp.route('/assignment/<assignment_id>/grades', methods=['POST'])
 def update_grade(assignment_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    assignment = Assignment.objects(id=assignment_id).first()
-    if not assignment or assignment.classroom.instructor != user:
+    assignment = get_document(Assignment, assignment_id)
+    if not assignment or not is_instructor(get_reference(assignment, 'classroom'), user):
         return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
@@ -171,73 +214,96 @@ def update_grade(assignment_id):
     if not grade:
         grade = Grade(assignment=assignment, student=student)
 
+    old_score = grade.score
     grade.score = float(score) if score is not None else None
     grade.feedback = feedback
     grade.save()
+    record_grade_change(reference_id(assignment, 'classroom'),
+                        assignment.points_possible, old_score, grade.score)
+    bump_version(reference_id(assignment, 'classroom'))
 
     return jsonify({'ok': True})
 
 
-@grades_bp.route('/<classroom_id>/grades/export', methods=['GET'])
-def export_grades_csv(classroom_id):
+@grades_bp.route('/assignment/<assignment_id>/grades/bulk', methods=['POST'])
+def bulk_update_grades(assignment_id):
+    """Save many grades at once: ``{"grades": [{"student_id", "score", "feedback"}]}``."""
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
-    if not classroom or classroom.instructor != user:
+    assignment = get_document(Assignment, assignment_id)
+    classroom = get_reference(assignment, 'classroom')
+    if not assignment or not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    assignments = Assignment.objects(classroom=classroom)
-    students = sorted(classroom.students, key=lambda x: x.name)
+    data = request.get_json(silent=True) or {}
+    items = data.get('grades')
+    if not isinstance(items, list):
+        return jsonify({'error': 'grades must be a list'}), 400
 
-    # Pre-fetch all grades for these assignments to avoid N*M queries
-    # A cleaner way is to just query all grades for this classroom's assignments
-    all_grades = Grade.objects(assignment__in=assignments)
+    importer = GradeImport(assignment, classroom)
+    try:
+        report = importer.run(items)
+    finally:
+        # Batches already written must invalidate cached reads even on error
+        if importer.written:
+            bump_version(classroom)
+    return jsonify(report)
 
-    # Build a map: (student_id, assignment_id) -> Grade
-    grade_map = {}
-    for g in all_grades:
-        grade_map[(g.student.id, g.assignment.id)] = g
 
-    output = io.StringIO()
-    writer = csv.writer(output)
+@grades_bp.route('/assignment/<assignment_id>/grades/import', methods=['POST'])
+def import_grades_csv(assignment_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
 
-    # Header
-    headers = ['Name', 'Email', 'Student ID']
-    for a in assignments:
-        headers.append(f"{a.title} (/{a.points_possible})")
-    headers.append("Average %")
-    writer.writerow(headers)
-
-    for s in students:
-        row = [
-            sanitize_for_csv(s.name),
-            sanitize_for_csv(s.email),
-            sanitize_for_csv(s.student_id)
-        ]
-        total_percentage = 0
-        count = 0
-
-        for a in assignments:
-            g = grade_map.get((s.id, a.id))
-            if g and g.score is not None:
-                row.append(g.score)
-                if a.points_possible > 0:
-                    total_percentage += (g.score / a.points_possible) * 100
-                    count += 1
-            else:
-                row.append('')
-
-        avg = 0
-        if count > 0:
-            avg = total_percentage / count
-        row.append(f"{avg:.1f}%")
-
-        writer.writerow(row)
+    assignment = get_document(Assignment, assignment_id)
+    classroom = get_reference(assignment, 'classroom')
+    if not assignment or not is_instructor(classroom, user):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    importer = GradeImport(assignment, classroom)
+    try:
+        # Decode incrementally rather than reading the whole upload into memory
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        report = importer.run_csv(stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        # Batches already written must invalidate cached reads even on error
+        if importer.written:
+            bump_version(classroom)
+
+    # A file unreadable partway still reports the rows written before it
+    return jsonify(report), 200 if report['ok'] else 400
+
+
+@grades_bp.route('/<classroom_id>/grades/export', methods=['GET'])
+def export_grades_csv(classroom_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    # Optional column filter: ?assignments=<id>,<id>,...
+    try:
+        selected_ids = parse_id_list(request.args.get('assignments'))
+    except ValueError:
+        return jsonify({'error': 'Invalid assignment id'}), 400
 
     return Response(
-        output.getvalue(),
+        iter_csv(grade_rows(classroom, selected_ids)),
         mimetype="text/csv",
         headers={"Content-disposition": "attachment; filename=grades.csv"}
     )
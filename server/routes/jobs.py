@@ -0,0 +1,119 @@
+from flask import Blueprint, jsonify, request, Response
+from models import Classroom, Job
+from exports import parse_id_list
+from identity import get_current_user, get_document, is_instructor
+from jobs import result_store, submit_job
+from utils import reference_id
+
+jobs_bp = Blueprint('jobs', __name__)
+
+EXPORT_KINDS = {
+    'roster': 'roster_export',
+    'attendance': 'attendance_export',
+    'grades': 'grades_export',
+}
+
+
+def serialize_job(job):
+    return {
+        'id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'result': job.result or None,
+        'download_ready': job.status == 'succeeded' and bool(job.result_filename),
+        'error': job.error,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at
+    }
+
+
+def get_owned_job(job_id, user):
+    """Load a job's status for its owner; returns None for anyone else."""
+    job = Job.objects(id=job_id).exclude('payload').first()
+    if not job or reference_id(job, 'owner') != user.pk:
+        return None
+    return job
+
+
+@jobs_bp.route('/classrooms/<classroom_id>/roster/import', methods=['POST'])
+def submit_roster_import(classroom_id):
+    """Queue a roster CSV import; poll the returned job for the report."""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    job = submit_job('roster_import', classroom, user, payload=file.stream.read())
+    return jsonify(serialize_job(job)), 202
+
+
+@jobs_bp.route('/classrooms/<classroom_id>/exports/<kind>', methods=['POST'])
+def submit_export(classroom_id, kind):
+    """Queue a roster, attendance or grades CSV export."""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    if kind not in EXPORT_KINDS:
+        return jsonify({'error': 'Unknown export type'}), 404
+
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    params = {}
+    if kind == 'grades':
+        # Optional column filter: ?assignments=<id>,<id>,...
+        try:
+            assignment_ids = parse_id_list(request.args.get('assignments'))
+        except ValueError:
+            return jsonify({'error': 'Invalid assignment id'}), 400
+        if assignment_ids is not None:
+            params['assignment_ids'] = [str(a_id) for a_id in assignment_ids]
+
+    job = submit_job(EXPORT_KINDS[kind], classroom, user, params=params)
+    return jsonify(serialize_job(job)), 202
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    job = get_owned_job(job_id, user)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(serialize_job(job))
+
+
+@jobs_bp.route('/<job_id>/download', methods=['GET'])
+def download_job_result(job_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    job = get_owned_job(job_id, user)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job.status != 'succeeded' or not job.result_filename:
+        return jsonify({'error': 'Result is not ready'}), 409
+
+    return Response(
+        result_store().get(job.id),
+        mimetype="text/csv",
+        headers={"Content-disposition": f"attachment; filename={job.result_filename}"}
+    )
@@ -1,116 +1,130 @@
-from flask import Blueprint, jsonify, session, request, Response
-from models import User, Classroom, AttendanceSession, AttendanceRecord
-from utils import get_safe_list
+from flask import Blueprint, jsonify, request, Response, session
+from models import User, Classroom, AttendanceSession
+from attendance_store import (
+    add_checkin, checked_in_sessions, records_by_session, set_status, status_counts
+)
+from checkin_buffer import get_buffer, ingestion_mode
+from attendance_codes import code_mode, code_step, display_code, row_display_code, static_code
+from session_cache import cache_session, invalidate_session, validate_checkin
+from utils import iter_csv, parse_iso_datetime, reference_id
+from pagination import encode_cursor, get_page_args, paginated_response
+from lean_reads import fetch_rows, safe_list_rows
+from enrollment import enroll, is_enrolled, unenroll
+from classroom_stats import (record_attendance_change, record_profile_change,
+                             record_session_created)
+from roster_import import import_roster
+from exports import attendance_rows, roster_rows
+from etags import bump_version, bump_versions_for_user, classroom_etag, session_classroom
+from identity import get_current_user, get_document, get_reference, is_instructor
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.queryset.visitor import Q
 import datetime
-import secrets
-import string
-import csv
 import io
 import uuid
 
 roster_bp = Blueprint('roster', __name__)
 
-
-def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.objects(id=user_id).first()
-
-
-def sanitize_for_csv(value):
-    """Prevent CSV injection (Formula Injection)."""
-    if not value:
-        return ""
-    value = str(value)
-    if value.startswith(('=', '+', '-', '@')):
-        return f"'{value}"
-    return value
-
-
-def is_enrolled(classroom, user):
-    """Safely check if user is in classroom.students without crashing on zombie refs."""
-    try:
-        # Use get_safe_list to handle zombies
-        valid_students = get_safe_list(classroom, 'students')
-        return user in valid_students
-    except Exception:
-        return False
+ROSTER_FIELDS = ('name', 'email', 'picture', 'major', 'grad_year', 'student_id')
 
 
 @roster_bp.route('/<classroom_id>/students', methods=['GET'])
+@classroom_etag()
 def get_roster(classroom_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
     # Permission: only instructor
-    if user != classroom.instructor:
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
     # Use self-healing utility to get valid students
-    valid_students = get_safe_list(classroom, 'students')
+    valid_students = safe_list_rows('roster', classroom, 'students', *ROSTER_FIELDS)
 
     roster = [{
-        'id': str(s.id),
-        'name': s.name,
-        'email': s.email,
-        'picture': s.picture,
-        'major': s.major,
-        'grad_year': s.grad_year,
-        'student_id': s.student_id
+        'id': str(s['_id']),
+        'name': s.get('name'),
+        'email': s.get('email'),
+        'picture': s.get('picture'),
+        'major': s.get('major'),
+        'grad_year': s.get('grad_year'),
+        'student_id': s.get('student_id')
     } for s in valid_students]
 
     return jsonify(roster)
 
 
 @roster_bp.route('/<classroom_id>/attendance/sessions', methods=['GET'])
+@classroom_etag(extra=code_step)
 def list_attendance_sessions(classroom_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
-    if user != classroom.instructor and not is_enrolled(classroom, user):
+    viewer_is_instructor = is_instructor(classroom, user)
+    if not viewer_is_instructor and not is_enrolled(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    sessions = AttendanceSession.objects(classroom=classroom).order_by('-date')
+    try:
+        limit, cursor = get_page_args()
+        date_after = request.args.get('date_after')
+        date_before = request.args.get('date_before')
+        date_after = parse_iso_datetime(date_after) if date_after else None
+        date_before = parse_iso_datetime(date_before) if date_before else None
+        if cursor:
+            before_date, before_id = cursor[0], ObjectId(cursor[1])
+    except (ValueError, TypeError, IndexError, InvalidId) as e:
+        return jsonify({'error': str(e) or 'Invalid query parameters'}), 400
+
+    sessions = AttendanceSession.objects(classroom=classroom) \
+        .order_by('-date', '-id').exclude('records')
+    # Optional date window: ?date_after=<iso>&date_before=<iso>
+    if date_after:
+        sessions = sessions.filter(date__gte=date_after)
+    if date_before:
+        sessions = sessions.filter(date__lte=date_before)
+    if cursor:
+        sessions = sessions.filter(
+            Q(date__lt=before_date) | Q(date=before_date, id__lt=before_id))
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        sessions = sessions.limit(limit + 1)
+    sessions = fetch_rows('sessions', sessions, 'date', 'is_open', 'code', 'code_mode')
+    session_ids = [s['_id'] for s in sessions]
+
+    # Instructors get per-status totals, students one flag per session;
+    # neither ships the attendance records themselves
+    if viewer_is_instructor:
+        counts = status_counts(session_ids)
+    else:
+        checked_in = checked_in_sessions(session_ids, user.pk)
 
     result = []
     for s in sessions:
+        is_open = s.get('is_open', True)
         session_data = {
-            'id': str(s.id),
-            'date': s.date.isoformat() + 'Z',
-            'is_open': s.is_open,
-            'code': s.code if (user == classroom.instructor and s.is_open) else None,
-            'has_checked_in': any(r.student == user for r in s.records) if user != classroom.instructor else False
+            'id': str(s['_id']),
+            'date': s['date'],
+            'is_open': is_open,
+            'code': row_display_code(s)[0] if (viewer_is_instructor and is_open) else None,
+            'has_checked_in': not viewer_is_instructor and s['_id'] in checked_in
         }
-
-        # Add records for instructor (needed for attendance count display)
-        if user == classroom.instructor:
-            records_data = []
-            for r in s.records:
-                try:
-                    if r.student:  # Accessing this raises DoesNotExist if student is deleted
-                        records_data.append({
-                            'student_id': str(r.student.id),
-                            'status': r.status
-                        })
-                except Exception:
-                    # Skip records for deleted users
-                    continue
-            session_data['records'] = records_data
+        if viewer_is_instructor:
+            session_data['counts'] = counts[s['_id']]
 
         result.append(session_data)
 
-    return jsonify(result)
+    return paginated_response(result, limit,
+                              lambda item: encode_cursor(item['date'], item['id']))
 
 
 @roster_bp.route('/<classroom_id>/attendance/sessions', methods=['POST'])
@@ -119,24 +133,29 @@ def create_attendance_session(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
-    if not classroom or classroom.instructor != user:
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    # Generate 4-digit numeric code
-    code = ''.join(secrets.choice(string.digits) for _ in range(4))
-
+    # Static sessions store a 4-digit code; rotating ones derive it on demand
+    mode = code_mode()
     session_obj = AttendanceSession(
         classroom=classroom,
-        code=code,
+        code=static_code() if mode == 'static' else None,
+        code_mode=mode,
         date=datetime.datetime.utcnow()
     )
     session_obj.save()
+    record_session_created(classroom)
+    cache_session(session_obj)
+    bump_version(classroom)
 
+    code, expires_at = display_code(session_obj)
     return jsonify({
         'id': str(session_obj.id),
-        'code': session_obj.code,
-        'date': session_obj.date.isoformat() + 'Z'
+        'code': code,
+        'code_expires_at': expires_at,
+        'date': session_obj.date
     })
 
 # --- Import/Export Endpoints ---
@@ -148,8 +167,8 @@ def import_roster_csv(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
-    if not classroom or classroom.instructor != user:
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
     if 'file' not in request.files:
@@ -160,41 +179,9 @@ def import_roster_csv(classroom_id):
         return jsonify({'error': 'No selected file'}), 400
 
     try:
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_input = csv.DictReader(stream)
-
-        # Normalize headers to lowercase
-        csv_input.fieldnames = [name.lower() for name in csv_input.fieldnames]
-
-        added_count = 0
-        for row in csv_input:
-            email = row.get('email')
-            name = row.get('name')
-
-            if not email or not name:
-                continue
-
-            student = User.objects(email=email).first()
-            if not student:
-                student = User(
-                    email=email,
-                    name=name,
-                    google_id=f"imported_{uuid.uuid4()}",
-                    major=row.get('major'),
-                    grad_year=int(row['grad_year']) if row.get(
-                        'grad_year') and row['grad_year'].isdigit() else None,
-                    student_id=row.get('student_id'),
-                    picture="https://ui-avatars.com/api/?name=" +
-                    name.replace(" ", "+")
-                )
-                student.save()
-
-            if student not in classroom.students:
-                classroom.students.append(student)
-                added_count += 1
-
-        classroom.save()
-        return jsonify({'ok': True, 'added': added_count})
+        # Decode incrementally rather than reading the whole upload into memory
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        return jsonify(import_roster(classroom, stream))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -206,26 +193,12 @@ def export_roster_csv(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
-    if not classroom or classroom.instructor != user:
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Name', 'Email', 'Student ID', 'Major', 'Grad Year'])
-
-    for s in classroom.students:
-        row = [
-            sanitize_for_csv(s.name),
-            sanitize_for_csv(s.email),
-            sanitize_for_csv(s.student_id),
-            sanitize_for_csv(s.major),
-            sanitize_for_csv(s.grad_year)
-        ]
-        writer.writerow(row)
-
     return Response(
-        output.getvalue(),
+        iter_csv(roster_rows(classroom)),
         mimetype="text/csv",
         headers={"Content-disposition": "attachment; filename=roster.csv"}
     )
@@ -237,116 +210,117 @@ def export_attendance_csv(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
-    if not classroom or classroom.instructor != user:
+    classroom = get_document(Classroom, classroom_id)
+    if not classroom or not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    sessions = AttendanceSession.objects(classroom=classroom).order_by('date')
-    students = sorted(classroom.students, key=lambda x: x.name)
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Header: Name, Email, [Date1, Date2, ...]
-    headers = ['Name', 'Email', 'Student ID'] + \
-        [s.date.strftime('%Y-%m-%d') for s in sessions] + ['Attendance Rate']
-    writer.writerow(headers)
-
-    for s in students:
-        row = [sanitize_for_csv(s.name), sanitize_for_csv(
-            s.email), sanitize_for_csv(s.student_id)]
-        present_count = 0
-        for sess in sessions:
-            # Check status in this session
-            record = next((r for r in sess.records if r.student == s), None)
-            status = record.status if record else 'absent'
-            row.append(status)
-            if status == 'present':
-                present_count += 1
-
-        rate = 0
-        if len(sessions) > 0:
-            rate = (present_count / len(sessions)) * 100
-        row.append(f"{rate:.1f}%")
-
-        writer.writerow(row)
-
     return Response(
-        output.getvalue(),
+        iter_csv(attendance_rows(classroom)),
         mimetype="text/csv",
         headers={"Content-disposition": "attachment; filename=attendance.csv"}
     )
 
 
+_CHECKIN_ERRORS = {
+    'closed': ('Session is closed or not found', 404),
+    'invalid_code': ('Invalid code', 400),
+    'not_enrolled': ('Not enrolled in this class', 403),
+    'duplicate': ('Already checked in', 400),
+}
+
+
 @roster_bp.route('/attendance/checkin', methods=['POST'])
 def checkin():
-    user = get_current_user()
+    buffered = ingestion_mode() == 'buffered'
+    # The buffered path identifies the student by the session cookie alone;
+    # the enrollment check happens against the cached roster, so no user
+    # lookup is needed
+    user = session.get('user_id') if buffered else get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    data = request.json
+    data = request.get_json(silent=True) or {}
     session_id = data.get('session_id')
     code = data.get('code')
 
-    attendance_session = AttendanceSession.objects(id=session_id).first()
-    if not attendance_session or not attendance_session.is_open:
-        return jsonify({'error': 'Session is closed or not found'}), 404
+    if buffered:
+        return _buffered_checkin(user, session_id, code)
 
-    if attendance_session.code != code:
-        return jsonify({'error': 'Invalid code'}), 400
+    # Validation is answered by the shared open-session cache
+    outcome, open_session = validate_checkin(session_id, code, user)
+    if outcome in _CHECKIN_ERRORS:
+        message, status = _CHECKIN_ERRORS[outcome]
+        return jsonify({'error': message}), status
 
-    # Check if student is in the class
-    if not is_enrolled(attendance_session.classroom, user):
-        return jsonify({'error': 'Not enrolled in this class'}), 403
+    classroom_id = open_session.classroom_id
+    # Rotating codes were checked above and are not stored on the session
+    stored_code = code if open_session.code_mode == 'static' else None
+    outcome = add_checkin(open_session.id, classroom_id, user, stored_code)
+    if outcome in _CHECKIN_ERRORS:
+        message, status = _CHECKIN_ERRORS[outcome]
+        return jsonify({'error': message}), status
 
-    # Check if already checked in
-    existing = next(
-        (r for r in attendance_session.records if r.student == user), None)
-    if existing:
-        return jsonify({'error': 'Already checked in'}), 400
+    record_attendance_change(classroom_id, None, 'present')
+    bump_version(classroom_id)
+
+    return jsonify({'ok': True, 'message': 'Checked in successfully'})
 
-    record = AttendanceRecord(student=user, status='present')
-    attendance_session.records.append(record)
-    attendance_session.save()
+
+def _buffered_checkin(user_id, session_id, code):
+    """Check-in against the worker's buffer; the write reaches MongoDB on the next flush."""
+    outcome = get_buffer().submit(session_id, code, user_id)
+    if outcome in _CHECKIN_ERRORS:
+        message, status = _CHECKIN_ERRORS[outcome]
+        return jsonify({'error': message}), status
 
     return jsonify({'ok': True, 'message': 'Checked in successfully'})
 
 
 @roster_bp.route('/attendance/session/<session_id>', methods=['GET'])
+@classroom_etag(resolve=session_classroom, extra=code_step)
 def get_session_details(session_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    session_obj = AttendanceSession.objects(id=session_id).first()
+    session_obj = AttendanceSession.objects(id=session_id).exclude('records').first()
     if not session_obj:
         return jsonify({'error': 'Session not found'}), 404
 
-    classroom = session_obj.classroom
-    if user != classroom.instructor:
+    classroom = get_reference(session_obj, 'classroom')
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
-    # Get all records with student details
+    # Get all records with student details, loading the students in one query
+    session_records = records_by_session([session_obj.id])[session_obj.id]
+    students = {
+        u['_id']: u for u in User.objects(
+            id__in=[r['student'] for r in session_records]
+        ).only('name', 'email', 'picture').as_pymongo()
+    }
+
     records = []
-    for r in session_obj.records:
-        try:
-            if r.student:  # Raises DoesNotExist if student is deleted
-                records.append({
-                    'student_id': str(r.student.id),
-                    'name': r.student.name,
-                    'email': r.student.email,
-                    'picture': r.student.picture,
-                    'timestamp': r.timestamp.isoformat() + 'Z',
-                    'status': r.status
-                })
-        except Exception:
+    for r in session_records:
+        student = students.get(r['student'])
+        if not student:
             # Skip deleted users
             continue
-
+        records.append({
+            'student_id': r['student'],
+            'name': student.get('name'),
+            'email': student.get('email'),
+            'picture': student.get('picture'),
+            'timestamp': r.get('timestamp'),
+            'status': r.get('status')
+        })
+
+    code, expires_at = display_code(session_obj)
     return jsonify({
         'id': str(session_obj.id),
-        'date': session_obj.date.isoformat() + 'Z',
-        'code': session_obj.code,
+        'date': session_obj.date,
+        'code': code,
+        'code_mode': session_obj.code_mode,
+        'code_expires_at': expires_at,
         'is_open': session_obj.is_open,
         'records': records
     })
@@ -358,11 +332,11 @@ def update_session(session_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    session_obj = AttendanceSession.objects(id=session_id).first()
+    session_obj = get_document(AttendanceSession, session_id)
     if not session_obj:
         return jsonify({'error': 'Session not found'}), 404
 
-    if user != session_obj.classroom.instructor:
+    if not is_instructor(get_reference(session_obj, 'classroom'), user):
         return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
@@ -370,6 +344,8 @@ def update_session(session_id):
         session_obj.is_open = data['is_open']
 
     session_obj.save()
+    invalidate_session(session_obj.id)
+    bump_version(reference_id(session_obj, 'classroom'))
     return jsonify({'ok': True, 'is_open': session_obj.is_open})
 
 
@@ -379,20 +355,18 @@ def remove_student(classroom_id, student_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
-    if user != classroom.instructor:
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
     student = User.objects(id=student_id).first()
     if not student:
         return jsonify({'error': 'Student not found'}), 404
 
-    if student in classroom.students:
-        classroom.students.remove(student)
-        classroom.save()
+    unenroll(classroom, student)
 
     return jsonify({'ok': True})
 
@@ -403,11 +377,11 @@ def manual_add_student(classroom_id):
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    classroom = Classroom.objects(id=classroom_id).first()
+    classroom = get_document(Classroom, classroom_id)
     if not classroom:
         return jsonify({'error': 'Classroom not found'}), 404
 
-    if user != classroom.instructor:
+    if not is_instructor(classroom, user):
         return jsonify({'error': 'Permission denied'}), 403
 
     data = request.json
@@ -424,7 +398,6 @@ def manual_add_student(classroom_id):
     student = User.objects(email=email).first()
     if not student:
         # Create new user
-        import uuid
         student = User(
             email=email,
             name=name,
@@ -439,6 +412,7 @@ def manual_add_student(classroom_id):
     else:
         # Update existing user's profile with provided data (if given)
         updated = False
+        old_major, old_grad_year = student.major, student.grad_year
         if major and student.major != major:
             student.major = major
             updated = True
@@ -450,11 +424,11 @@ def manual_add_student(classroom_id):
             updated = True
         if updated:
             student.save()
+            record_profile_change(student, old_major, old_grad_year)
+            bump_versions_for_user(student)
 
     # Add to classroom if not already in
-    if student not in classroom.students:
-        classroom.students.append(student)
-        classroom.save()
+    enroll(classroom, student)
 
     return jsonify({'ok': True, 'student': {
         'id': str(student.id),
@@ -474,28 +448,25 @@ def manual_checkin():
     student_id = data.get('student_id')
     status = data.get('status', 'present')
 
-    session_obj = AttendanceSession.objects(id=session_id).first()
+    session_obj = AttendanceSession.objects(id=session_id).exclude('records').first()
     if not session_obj:
         return jsonify({'error': 'Session not found'}), 404
 
     # Only instructor
-    if user != session_obj.classroom.instructor:
+    classroom_id = reference_id(session_obj, 'classroom')
+    if not is_instructor(get_document(Classroom, classroom_id), user):
         return jsonify({'error': 'Permission denied'}), 403
 
+    if status not in ('present', 'late', 'absent', 'excused'):
+        return jsonify({'error': 'Invalid status'}), 400
+
     student = User.objects(id=student_id).first()
     if not student:
         return jsonify({'error': 'Student not found'}), 404
 
-    # Check if already has a record
-    existing_record = next(
-        (r for r in session_obj.records if r.student == student), None)
-    if existing_record:
-        existing_record.status = status
-        existing_record.timestamp = datetime.datetime.utcnow()
-    else:
-        record = AttendanceRecord(student=student, status=status)
-        session_obj.records.append(record)
-
-    session_obj.save()
+    # Create or update the record; the previous status keeps the stats exact
+    old_status = set_status(session_obj.id, classroom_id, student, status)
+    record_attendance_change(classroom_id, old_status, status)
+    bump_version(classroom_id)
 
     return jsonify({'ok': True})
@@ -0,0 +1,244 @@
+"""
+Cross-worker cache of open attendance sessions.
+
+Check-in validation reads small JSON files under CHECKIN_CACHE_DIR, shared
+by every gunicorn worker on the host:
+
+- ``session-<id>.json``: classroom id, code mode, code and open flag
+- ``classroom-<id>.json``: enrolled student ids
+
+Files are replaced atomically (write, then rename) and each worker parses a
+file once per change, keyed on its inode and mtime, so a warm check-in costs
+two ``stat()`` calls and no database reads. Routes that change a session or
+a roster call ``invalidate_session`` / ``invalidate_classroom``, which
+replace the entry with a tombstone. A worker that misses notes the entry's
+version before reading the database and, under a per-entry flock, only
+writes its result if the version is unchanged, so a load racing an
+invalidation never stores the data it read before the change.
+
+A rejected check-in is confirmed against the database for that request
+alone; the shared entries are only rewritten if the database disagrees, so
+a burst of mistyped codes does not send every worker back to MongoDB.
+
+Staleness: entries older than CHECKIN_CACHE_TTL seconds are reloaded. That
+TTL is the only bound between hosts that do not share the directory, and
+acceptance is not re-checked against the database here (the direct write
+path re-checks the open flag and code; see checkin_buffer for the buffered
+path).
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from bson import ObjectId
+from models import AttendanceSession, Classroom
+from attendance_codes import code_matches
+from utils import get_ref_id, reference_id, reference_ids
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def _cache_dir():
+    path = os.getenv('CHECKIN_CACHE_DIR',
+                     os.path.join(tempfile.gettempdir(), 'rooster-sessions'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _ttl():
+    return float(os.getenv('CHECKIN_CACHE_TTL', '60'))
+
+
+def _object_id(value):
+    return get_ref_id(value) or ObjectId(str(value))
+
+
+def _path(kind, doc_id):
+    return os.path.join(_cache_dir(), f"{kind}-{_object_id(doc_id)}.json")
+
+
+def _version(path):
+    """Return ``(stat, version)`` for ``path``; both None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None, None
+    # Every write is a new file, so (inode, mtime) identifies its contents
+    return stat, (stat.st_ino, stat.st_mtime_ns)
+
+
+def _read(path):
+    """Return ``(version, data)`` for ``path``.
+
+    ``data`` is None if the entry is missing, expired or a tombstone;
+    ``version`` is what a later ``_write`` must still find to replace it.
+    """
+    stat, version = _version(path)
+    if stat is None:
+        return None, None
+    if time.time() - stat.st_mtime > _ttl():
+        return version, None
+
+    with _parsed_lock:
+        cached = _parsed.get(path)
+    if cached and cached[0] == version:
+        return version, cached[1]
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return version, None
+    if data.get('invalidated'):
+        data = None
+    with _parsed_lock:
+        _parsed[path] = (version, data)
+    return version, data
+
+
+@contextmanager
+def _entry_lock(path):
+    """Serialize writers of one entry across every worker on the host."""
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _replace(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _write(path, data, expected=False):
+    """Store ``data`` at ``path``.
+
+    With ``expected`` (a version from ``_read``, None for a missing file)
+    nothing is written if the entry changed since; returns whether it wrote.
+    """
+    with _entry_lock(path):
+        if expected is not False and _version(path)[1] != expected:
+            return False
+        _replace(path, data)
+        return True
+
+
+def _invalidate(path):
+    # A tombstone rather than a delete, so a load that started before this
+    # sees a new version and drops its result
+    _write(path, {'invalidated': True})
+
+
+class OpenSession:
+    """The parts of an attendance session that check-in validation needs."""
+
+    def __init__(self, session_id, classroom_id, code_mode, code, is_open, students):
+        self.id = session_id
+        self.classroom_id = classroom_id
+        self.code_mode = code_mode
+        self.code = code
+        self.is_open = is_open
+        self.students = students
+
+    def check(self, code, student_id):
+        """Return 'ok', 'closed', 'invalid_code' or 'not_enrolled'."""
+        if not self.is_open:
+            return 'closed'
+        if not code_matches(self.id, self.code_mode, self.code, code):
+            return 'invalid_code'
+        if student_id not in self.students:
+            return 'not_enrolled'
+        return 'ok'
+
+
+def cache_session(session):
+    """Store ``session``'s check-in fields for every worker."""
+    _write(_path('session', session.pk), _session_data(session))
+
+
+def invalidate_session(session_id):
+    _invalidate(_path('session', session_id))
+
+
+def invalidate_classroom(classroom_id):
+    _invalidate(_path('classroom', classroom_id))
+
+
+def _session_data(session):
+    return {'classroom': str(reference_id(session, 'classroom')),
+            'code_mode': session.code_mode, 'code': session.code,
+            'is_open': session.is_open}
+
+
+def _load_session(session_id, refresh=False):
+    path = _path('session', session_id)
+    version, cached = _read(path)
+    if cached is not None and not refresh:
+        return cached
+
+    session = AttendanceSession.objects(id=session_id) \
+        .only('classroom', 'is_open', 'code', 'code_mode').first()
+    if not session:
+        return None
+    data = _session_data(session)
+    if data != cached:
+        _write(path, data, expected=version)
+    return data
+
+
+def _load_students(classroom_id, refresh=False):
+    path = _path('classroom', classroom_id)
+    version, cached = _read(path)
+    if cached is not None and not refresh:
+        return frozenset(ObjectId(s) for s in cached['students'])
+
+    classroom = Classroom.objects(id=classroom_id).only('students').first()
+    data = {'students': [str(s) for s in reference_ids(classroom, 'students')]
+            if classroom else []}
+    if data != cached:
+        _write(path, data, expected=version)
+    return frozenset(ObjectId(s) for s in data['students'])
+
+
+def get_open_session(session_id, refresh=False):
+    """Return the OpenSession for ``session_id``, or None if it does not exist.
+
+    With ``refresh`` the database is read; the shared entries are rewritten
+    only if they were missing or disagree with it.
+    """
+    if not ObjectId.is_valid(str(session_id)):
+        return None
+    session_id = ObjectId(str(session_id))
+
+    data = _load_session(session_id, refresh)
+    if data is None:
+        return None
+    classroom_id = ObjectId(data['classroom'])
+    return OpenSession(session_id, classroom_id, data.get('code_mode', 'static'),
+                       data['code'], data['is_open'],
+                       _load_students(classroom_id, refresh))
+
+
+def validate_checkin(session_id, code, student_id):
+    """Check a check-in against the cache.
+
+    Returns ``(outcome, session)`` where outcome is 'ok', 'closed',
+    'invalid_code' or 'not_enrolled'. Only rejections reach the database.
+    """
+    student_id = _object_id(student_id)
+    session = get_open_session(session_id)
+    outcome = session.check(code, student_id) if session else 'closed'
+    if outcome == 'invalid_code' and session.code_mode == 'rotating':
+        # Rotating codes depend only on the session id and the clock
+        return outcome, session
+    if outcome != 'ok':
+        # Never refuse on stale data: a reopened session, a new code or a
+        # new enrollment on another host is picked up straight away. The
+        # shared entries are left alone unless the database disagrees.
+        session = get_open_session(session_id, refresh=True)
+        outcome = session.check(code, student_id) if session else 'closed'
+    return outcome, session
@@ -4,6 +4,7 @@ Pytest fixtures for testing the Flask application.
 import pytest
 import os
 import sys
+import tempfile
 
 # Set test environment variables BEFORE any imports
 os.environ['FLASK_DEBUG'] = 'True'
@@ -15,6 +16,8 @@ os.environ['OAUTH_CLIENT_SECRET'] = 'test-client-secret'
 os.environ['OAUTH_REDIRECT_URI'] = 'http://localhost:5000/auth'
 # Prevent main.py from connecting to real MongoDB
 os.environ['TESTING'] = 'True'
+# Keep the open-session cache out of the shared temp directory
+os.environ['CHECKIN_CACHE_DIR'] = tempfile.mkdtemp(prefix='rooster-sessions-')
 
 # Add server directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -25,8 +28,12 @@ def app():
     """Create application for testing."""
     # Patch mongoengine to use mongomock before importing app
     import mongomock
+    import mongomock.gridfs
     import mongoengine
 
+    # Job results are stored in GridFS
+    mongomock.gridfs.enable_gridfs_integration()
+
     # Disconnect any existing connections
     mongoengine.disconnect_all()
 
@@ -0,0 +1,77 @@
+"""
+Tests for announcement endpoints.
+"""
+import datetime
+from models import Classroom, Announcement
+
+
+class TestAnnouncementListing:
+    """Test the paginated announcement feed."""
+
+    def test_keyset_pagination(self, authenticated_client, student_client):
+        """Pages walk the feed newest first, including posts with equal timestamps."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Announcement Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='ANNC01'
+        )
+        classroom.save()
+        base = datetime.datetime(2026, 9, 1, 9, 0)
+        # Two posts share a timestamp so the _id tie-break is exercised
+        times = [base, base + datetime.timedelta(hours=1),
+                 base + datetime.timedelta(hours=1), base + datetime.timedelta(hours=2),
+                 base + datetime.timedelta(hours=3)]
+        for i, created_at in enumerate(times):
+            Announcement(classroom=classroom, author=instructor, title=f'Post {i}',
+                         content='Hello', created_at=created_at).save()
+
+        try:
+            url = f'/api/announcements/{classroom.id}/announcements'
+            full = client.get(url).get_json()
+            assert full[0]['title'] == 'Post 4'
+            assert full[0]['author'] == {'id': str(instructor.id),
+                                         'name': 'Test Instructor', 'picture': None}
+            assert 'X-Next-Cursor' not in client.get(url).headers
+
+            paged = []
+            cursor = None
+            while True:
+                query = {'limit': 2}
+                if cursor:
+                    query['cursor'] = cursor
+                response = client.get(url, query_string=query)
+                assert response.status_code == 200
+                page = response.get_json()
+                assert len(page) <= 2
+                paged.extend(page)
+                cursor = response.headers.get('X-Next-Cursor')
+                if not cursor:
+                    break
+
+            assert [a['id'] for a in paged] == [a['id'] for a in full]
+            assert client.get(url, query_string={'cursor': 'bogus'}).status_code == 400
+        finally:
+            Announcement.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_requires_membership(self, authenticated_client, student_client):
+        """Students outside the class cannot read its announcements."""
+        _, instructor = authenticated_client
+        client, _ = student_client
+        classroom = Classroom(
+            name='Announcement Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='ANNC02'
+        )
+        classroom.save()
+
+        try:
+            response = client.get(f'/api/announcements/{classroom.id}/announcements')
+            assert response.status_code == 403
+        finally:
+            classroom.delete()
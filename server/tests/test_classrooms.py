@@ -1,7 +1,13 @@
 """
 Tests for classroom management endpoints.
 """
-from models import Classroom
+from models import (
+    User, Classroom, Assignment, Grade, AttendanceSession, AttendanceRecord,
+    ClassroomStats
+)
+import classroom_stats
+from classroom_stats import compute_statistics, get_statistics, record_session_created
+from etags import classroom_version
 
 
 class TestClassroomAPI:
@@ -94,3 +100,269 @@ class TestClassroomJoinFlow:
 
         # Cleanup
         classroom.delete()
+
+
+class TestClassroomListing:
+    """Test the batched class list."""
+
+    def test_list_with_counts(self, monkeypatch, authenticated_client, student_client):
+        """Classes list with their instructor, counts on request, orphans skipped."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        orphaned_by = User(
+            email='gone@example.com',
+            google_id='gone-google-id',
+            name='Departed Instructor'
+        )
+        orphaned_by.save()
+        classroom = Classroom(
+            name='Listed Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='LIST01'
+        )
+        classroom.save()
+        orphan = Classroom(
+            name='Orphaned Class',
+            term='Fall 2026',
+            instructor=orphaned_by,
+            students=[student],
+            join_code='LIST02'
+        )
+        orphan.save()
+        # Remove the user without the cascade, leaving a dangling reference
+        User._get_collection().delete_one({'_id': orphaned_by.id})
+        Assignment(classroom=classroom, title='HW', points_possible=10).save()
+        AttendanceSession(classroom=classroom, code='1111').save()
+        AttendanceSession(classroom=classroom, code='2222', is_open=False).save()
+
+        try:
+            listed = client.get('/api/classrooms/').get_json()
+            assert listed == [{
+                'id': str(classroom.id),
+                'name': 'Listed Class',
+                'term': 'Fall 2026',
+                'section': None,
+                'instructor_name': 'Test Instructor',
+                'is_instructor': False,
+                'join_code': None
+            }]
+
+            for engine in ('aggregation', 'python'):
+                monkeypatch.setenv('STATISTICS_ENGINE', engine)
+                with_counts = client.get('/api/classrooms/?include=counts').get_json()
+                assert with_counts[0]['counts'] == {
+                    'students': 1, 'assignments': 1, 'open_sessions': 1}
+        finally:
+            Assignment.objects(classroom=classroom).delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            orphan.delete()
+            classroom.delete()
+
+
+class TestClassroomStatistics:
+    """Test the statistics engines."""
+
+    def test_engines_agree(self, authenticated_client, student_client):
+        """Aggregation and python engines should return identical statistics."""
+        instructor_client, instructor = authenticated_client
+        _, student = student_client
+        other = User(
+            email='stats@example.com',
+            google_id='stats-google-id',
+            name='Stats Student',
+            grad_year=2027
+        )
+        other.save()
+        classroom = Classroom(
+            name='Stats Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student, other],
+            join_code='STAT01'
+        )
+        classroom.save()
+        AttendanceSession(classroom=classroom, records=[
+            AttendanceRecord(student=student, status='present'),
+            AttendanceRecord(student=other, status='late')
+        ]).save()
+        AttendanceSession(classroom=classroom, records=[
+            AttendanceRecord(student=student, status='present')
+        ]).save()
+        quiz = Assignment(classroom=classroom, title='Quiz', points_possible=10)
+        quiz.save()
+        Grade(assignment=quiz, student=student, score=8).save()
+        Grade(assignment=quiz, student=other, score=6).save()
+
+        try:
+            expected = {
+                'total_students': 2,
+                'major_distribution': {'Computer Science': 1, 'Undeclared': 1},
+                'year_distribution': {'Unknown': 1, '2027': 1},
+                'attendance_rate': 50.0,
+                'average_grade': 70.0
+            }
+            assert compute_statistics(classroom, engine='aggregation') == expected
+            assert compute_statistics(classroom, engine='python') == expected
+
+            response = instructor_client.get(
+                f'/api/classrooms/{classroom.id}/statistics')
+            assert response.status_code == 200
+            assert response.get_json() == expected
+        finally:
+            Grade.objects(assignment=quiz).delete()
+            quiz.delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
+            other.delete()
+
+    def test_rollup_tracks_incremental_changes(self, authenticated_client, student_client):
+        """The rollup should match a full recompute after routed changes."""
+        instructor_client, instructor = authenticated_client
+        student_client_obj, student = student_client
+        classroom = Classroom(
+            name='Rollup Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='ROLL01'
+        )
+        classroom.save()
+        quiz = Assignment(classroom=classroom, title='Quiz', points_possible=20)
+        quiz.save()
+
+        try:
+            # First read builds the rollup
+            response = instructor_client.get(
+                f'/api/classrooms/{classroom.id}/statistics')
+            assert response.get_json()['total_students'] == 0
+            assert ClassroomStats.objects(id=classroom.id).first() is not None
+
+            student_client_obj.post('/api/classrooms/join', json={'code': 'ROLL01'})
+            session_id = instructor_client.post(
+                f'/api/roster/{classroom.id}/attendance/sessions').get_json()['id']
+            code = AttendanceSession.objects(id=session_id).first().code
+            student_client_obj.post('/api/roster/attendance/checkin', json={
+                'session_id': session_id, 'code': code})
+            instructor_client.post(f'/api/grades/assignment/{quiz.id}/grades', json={
+                'student_id': str(student.id), 'score': 15})
+            instructor_client.post(f'/api/grades/assignment/{quiz.id}/grades', json={
+                'student_id': str(student.id), 'score': 10})
+
+            response = instructor_client.get(
+                f'/api/classrooms/{classroom.id}/statistics')
+            data = response.get_json()
+            assert data == compute_statistics(Classroom.objects(id=classroom.id).first())
+            assert data['total_students'] == 1
+            assert data['attendance_rate'] == 100.0
+            assert data['average_grade'] == 50.0
+
+            instructor_client.delete(
+                f'/api/roster/{classroom.id}/students/{student.id}')
+            response = instructor_client.get(
+                f'/api/classrooms/{classroom.id}/statistics')
+            assert response.get_json()['total_students'] == 0
+        finally:
+            Grade.objects(assignment=quiz).delete()
+            quiz.delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
+
+    def test_rebuild_stats_command(self, app, authenticated_client):
+        """The rebuild command should repair a drifted rollup."""
+        _, instructor = authenticated_client
+        classroom = Classroom(
+            name='Drift Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='DRFT01'
+        )
+        classroom.save()
+        ClassroomStats(id=classroom.id, total_sessions=99).save()
+
+        try:
+            version = classroom_version(classroom.id)
+            result = app.test_cli_runner().invoke(args=['rebuild-stats', str(classroom.id)])
+            assert 'Rebuilt statistics for 1 classroom(s).' in result.output
+            assert ClassroomStats.objects(id=classroom.id).first().total_sessions == 0
+            # Cached statistics responses are invalidated
+            assert classroom_version(classroom.id) != version
+        finally:
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
+
+    def test_rebuild_keeps_concurrent_increments(self, monkeypatch, authenticated_client):
+        """Increments before the first build or during a rebuild are not lost."""
+        _, instructor = authenticated_client
+        classroom = Classroom(
+            name='Race Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='RACE01'
+        )
+        classroom.save()
+
+        try:
+            # An increment to a missing rollup is kept but not served as complete
+            record_session_created(classroom)
+            partial = ClassroomStats.objects(id=classroom.id).first()
+            assert partial.total_sessions == 1 and partial.built_at is None
+            assert get_statistics(classroom)['total_students'] == 0
+            assert ClassroomStats.objects(id=classroom.id).first().total_sessions == 0
+
+            # A session counted while the rebuild is recomputing survives it
+            compute_counters = classroom_stats.compute_counters
+
+            def racing_compute(*args, **kwargs):
+                counters = compute_counters(*args, **kwargs)
+                record_session_created(classroom)
+                return counters
+
+            monkeypatch.setattr(classroom_stats, 'compute_counters', racing_compute)
+            stats = classroom_stats.rebuild_rollup(classroom)
+            assert stats.total_sessions == 1
+            assert stats.built_at is not None
+        finally:
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
+
+    def test_profile_edits_move_distribution_buckets(self, authenticated_client,
+                                                     student_client):
+        """Changing major or year keeps the rollup right through a later removal."""
+        instructor_client, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Profile Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='PROF01'
+        )
+        classroom.save()
+        url = f'/api/classrooms/{classroom.id}/statistics'
+
+        try:
+            get_statistics(classroom)
+            client.post('/api/classrooms/join', json={'code': 'PROF01'})
+            assert client.post('/api/user/update', json={
+                'major': 'CS', 'grad_year': 2028}).status_code == 200
+            data = instructor_client.get(url).get_json()
+            assert data['major_distribution'] == {'CS': 1}
+            assert data['year_distribution'] == {'2028': 1}
+            assert data == compute_statistics(Classroom.objects(id=classroom.id).first())
+
+            # The instructor's add-student form can edit an existing profile too
+            instructor_client.post(f'/api/roster/{classroom.id}/students', json={
+                'email': student.email, 'name': student.name, 'major': 'Math'})
+            data = instructor_client.get(url).get_json()
+            assert data['major_distribution'] == {'Math': 1}
+
+            instructor_client.delete(f'/api/roster/{classroom.id}/students/{student.id}')
+            data = instructor_client.get(url).get_json()
+            assert data['total_students'] == 0
+            assert data['major_distribution'] == {}
+            assert data['year_distribution'] == {}
+        finally:
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
@@ -0,0 +1,65 @@
+"""
+Tests for negotiated response compression.
+"""
+import gzip
+import pytest
+from models import Classroom, User
+
+
+@pytest.fixture
+def large_class(authenticated_client):
+    """A class whose roster is well past the compression threshold."""
+    _, instructor = authenticated_client
+    students = [User(email=f'zip{i}@example.com', google_id=f'zip-{i}',
+                     name=f'Compressed Student {i}').save() for i in range(40)]
+    classroom = Classroom(
+        name='Compression Class',
+        term='Fall 2026',
+        instructor=instructor,
+        students=students,
+        join_code='ZIP01'
+    )
+    classroom.save()
+    yield classroom
+    classroom.delete()
+    User.objects(id__in=[s.id for s in students]).delete()
+
+
+class TestCompression:
+    """Test gzip negotiation, thresholds and streaming."""
+
+    def test_buffered_json_is_gzipped(self, authenticated_client, large_class):
+        """Large JSON is compressed only when the client asks for it."""
+        client, _ = authenticated_client
+        url = f'/api/roster/{large_class.id}/students'
+
+        plain = client.get(url)
+        assert 'Content-Encoding' not in plain.headers
+        assert 'Accept-Encoding' in plain.headers['Vary']
+
+        zipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert zipped.headers['Content-Encoding'] == 'gzip'
+        assert int(zipped.headers['Content-Length']) < len(plain.data)
+        assert gzip.decompress(zipped.data) == plain.data
+
+        small = client.get('/api/classrooms/', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in small.headers
+
+    def test_streamed_csv_is_gzipped(self, authenticated_client, large_class):
+        """Streamed exports are compressed as they are generated."""
+        client, _ = authenticated_client
+        url = f'/api/roster/{large_class.id}/students/export'
+
+        plain = client.get(url)
+        zipped = client.get(url, headers={'Accept-Encoding': 'gzip;q=1.0, identity;q=0.5'})
+        assert zipped.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in zipped.headers
+        assert gzip.decompress(zipped.data) == plain.data
+
+    def test_switch_off(self, monkeypatch, authenticated_client, large_class):
+        """RESPONSE_COMPRESSION=off leaves compression to an upstream proxy."""
+        monkeypatch.setenv('RESPONSE_COMPRESSION', 'off')
+        client, _ = authenticated_client
+        response = client.get(f'/api/roster/{large_class.id}/students',
+                              headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,57 @@
+"""
+Tests for the shared enrollment lookups.
+"""
+from models import User, Classroom
+from enrollment import is_enrolled, enrolled_ids
+
+
+class TestEnrollment:
+    """Test indexed membership checks."""
+
+    def test_is_enrolled(self, authenticated_client, student_client):
+        """Enrolled students match; the instructor and bad ids do not."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Enrollment Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='ENRL01'
+        )
+        classroom.save()
+
+        try:
+            assert is_enrolled(classroom, student)
+            assert is_enrolled(str(classroom.id), str(student.id))
+            assert not is_enrolled(classroom, instructor)
+            assert not is_enrolled(classroom, 'not-an-id')
+        finally:
+            classroom.delete()
+
+    def test_enrolled_ids_bulk(self, authenticated_client, student_client):
+        """The bulk variant should return only the enrolled subset."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        outsider = User(
+            email='outsider@example.com',
+            google_id='outsider-google-id',
+            name='Outsider'
+        )
+        outsider.save()
+        classroom = Classroom(
+            name='Bulk Enrollment Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='ENRL02'
+        )
+        classroom.save()
+
+        try:
+            result = enrolled_ids(classroom, [student, outsider.id, instructor])
+            assert result == {student.id}
+            assert enrolled_ids(classroom, []) == set()
+        finally:
+            classroom.delete()
+            outsider.delete()
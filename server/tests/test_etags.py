@@ -0,0 +1,82 @@
+"""
+Tests for version-driven conditional GETs.
+"""
+from models import Classroom, Announcement
+
+
+class TestConditionalGet:
+    """Test ETag/If-None-Match handling on classroom reads."""
+
+    def test_not_modified_until_a_mutation(self, authenticated_client, student_client):
+        """A matching tag gets 304 until a mutating route bumps the version."""
+        instructor_client, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='ETag Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='ETAG01'
+        )
+        classroom.save()
+
+        try:
+            url = f'/api/announcements/{classroom.id}/announcements'
+            first = client.get(url)
+            assert first.status_code == 200
+            tag = first.headers['ETag']
+            assert first.headers['Cache-Control'] == 'private, no-cache'
+
+            cached = client.get(url, headers={'If-None-Match': tag})
+            assert cached.status_code == 304
+            assert cached.data == b''
+
+            # Same URL, different viewer: different tag
+            assert instructor_client.get(url).headers['ETag'] != tag
+
+            response = instructor_client.post(url, json={'title': 'Hi', 'content': 'News'})
+            assert response.status_code == 200
+
+            fresh = client.get(url, headers={'If-None-Match': tag})
+            assert fresh.status_code == 200
+            assert fresh.headers['ETag'] != tag
+            assert [a['title'] for a in fresh.get_json()] == ['Hi']
+        finally:
+            Announcement.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_errors_and_roster_changes(self, authenticated_client, student_client):
+        """Errors carry no tag, and roster changes invalidate the class list."""
+        instructor_client, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='ETag Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='ETAG02'
+        )
+        classroom.save()
+
+        try:
+            denied = client.get(f'/api/classrooms/{classroom.id}')
+            assert denied.status_code == 403
+            assert 'ETag' not in denied.headers
+
+            listed = client.get('/api/classrooms/')
+            tag = listed.headers['ETag']
+            assert client.get('/api/classrooms/',
+                              headers={'If-None-Match': tag}).status_code == 304
+
+            assert client.post('/api/classrooms/join',
+                               json={'code': 'ETAG02'}).status_code == 200
+            relisted = client.get('/api/classrooms/', headers={'If-None-Match': tag})
+            assert relisted.status_code == 200
+            assert [c['name'] for c in relisted.get_json()] == ['ETag Class']
+
+            roster_url = f'/api/roster/{classroom.id}/students'
+            roster_tag = instructor_client.get(roster_url).headers['ETag']
+            client.post('/api/user/update', json={'major': 'Physics'})
+            roster = instructor_client.get(roster_url, headers={'If-None-Match': roster_tag})
+            assert roster.status_code == 200
+        finally:
+            classroom.delete()
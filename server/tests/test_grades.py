@@ -1,7 +1,12 @@
 """
 Tests for grades and assignment endpoints.
 """
-from models import Classroom, Assignment, Grade
+import csv
+import datetime
+import io
+from models import User, Classroom, Assignment, Grade, ClassroomStats
+from classroom_stats import compute_statistics, get_statistics
+from etags import classroom_version
 
 
 class TestAssignmentAPI:
@@ -58,7 +63,8 @@ class TestAssignmentAPI:
         assignment = Assignment(
             classroom=classroom,
             title='Test Assignment',
-            points_possible=50
+            points_possible=50,
+            due_date=datetime.datetime(2026, 2, 1, 23, 59)
         )
         assignment.save()
 
@@ -70,6 +76,7 @@ class TestAssignmentAPI:
         assert len(data) == 1
         assert data[0]['title'] == 'Test Assignment'
         assert data[0]['points_possible'] == 50
+        assert data[0]['due_date'] == '2026-02-01T23:59:00Z'
 
         # Cleanup
         assignment.delete()
@@ -124,3 +131,282 @@ class TestGradeAPI:
         Grade.objects(assignment=assignment).delete()
         assignment.delete()
         classroom.delete()
+
+
+class TestGradeExport:
+    """Test the streamed gradebook export."""
+
+    def test_export_grades_csv(self, authenticated_client, student_client):
+        """Scores and averages should stream out, optionally filtered by assignment."""
+        instructor_client, instructor = authenticated_client
+        _, student = student_client
+
+        classroom = Classroom(
+            name='Export Grades Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='GEXP01'
+        )
+        classroom.save()
+        quiz = Assignment(classroom=classroom, title='Quiz', points_possible=10)
+        quiz.save()
+        exam = Assignment(classroom=classroom, title='Exam', points_possible=100)
+        exam.save()
+        Grade(assignment=quiz, student=student, score=5).save()
+        Grade(assignment=exam, student=student, score=90).save()
+
+        try:
+            response = instructor_client.get(
+                f'/api/grades/{classroom.id}/grades/export')
+            assert response.status_code == 200
+            rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+            assert rows[0] == ['Name', 'Email', 'Student ID',
+                               'Quiz (/10.0)', 'Exam (/100.0)', 'Average %']
+            assert rows[1] == ['Test Student', 'student@example.com', 'STU001',
+                               '5.0', '90.0', '70.0%']
+
+            response = instructor_client.get(
+                f'/api/grades/{classroom.id}/grades/export?assignments={exam.id}')
+            rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+            assert rows[0] == ['Name', 'Email', 'Student ID',
+                               'Exam (/100.0)', 'Average %']
+            assert rows[1][3:] == ['90.0', '90.0%']
+
+            response = instructor_client.get(
+                f'/api/grades/{classroom.id}/grades/export?assignments=bogus')
+            assert response.status_code == 400
+        finally:
+            Grade.objects(assignment__in=[quiz, exam]).delete()
+            quiz.delete()
+            exam.delete()
+            classroom.delete()
+
+
+class TestAssignmentListing:
+    """Test student grade joins, pagination and due-date filtering."""
+
+    def test_student_sees_own_grades(self, authenticated_client, student_client):
+        """Each assignment should carry the student's score or None."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Listing Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='LIST01'
+        )
+        classroom.save()
+        graded = Assignment(classroom=classroom, title='Graded', points_possible=10)
+        graded.save()
+        ungraded = Assignment(classroom=classroom, title='Ungraded', points_possible=10)
+        ungraded.save()
+        Grade(assignment=graded, student=student, score=9, feedback='Nice').save()
+
+        try:
+            response = client.get(f'/api/grades/{classroom.id}/assignments')
+            assert response.status_code == 200
+            data = {a['title']: a for a in response.get_json()}
+            assert data['Graded']['score'] == 9
+            assert data['Graded']['feedback'] == 'Nice'
+            assert data['Ungraded']['score'] is None
+        finally:
+            Grade.objects(assignment=graded).delete()
+            Assignment.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_cursor_pagination_and_due_window(self, authenticated_client):
+        """Pages should chain through X-Next-Cursor and respect the due window."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='Paging Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='LIST02'
+        )
+        classroom.save()
+        for day in range(1, 6):
+            Assignment(classroom=classroom, title=f'HW{day}', points_possible=10,
+                       due_date=datetime.datetime(2026, 9, day)).save()
+
+        try:
+            url = f'/api/grades/{classroom.id}/assignments'
+            first = client.get(f'{url}?limit=2')
+            assert [a['title'] for a in first.get_json()] == ['HW1', 'HW2']
+            cursor = first.headers['X-Next-Cursor']
+
+            second = client.get(f'{url}?limit=2&cursor={cursor}')
+            assert [a['title'] for a in second.get_json()] == ['HW3', 'HW4']
+
+            third = client.get(
+                f'{url}?limit=2&cursor={second.headers["X-Next-Cursor"]}')
+            assert [a['title'] for a in third.get_json()] == ['HW5']
+            assert 'X-Next-Cursor' not in third.headers
+
+            window = client.get(
+                f'{url}?due_after=2026-09-02T00:00:00Z&due_before=2026-09-03T23:59:00Z')
+            assert [a['title'] for a in window.get_json()] == ['HW2', 'HW3']
+
+            assert client.get(f'{url}?limit=0').status_code == 400
+            assert client.get(f'{url}?cursor=garbage').status_code == 400
+        finally:
+            Assignment.objects(classroom=classroom).delete()
+            classroom.delete()
+
+
+class TestBulkGrades:
+    """Test bulk grade entry and CSV score upload."""
+
+    def _setup(self, instructor, student, join_code):
+        others = [User(email=f'bulk{i}@example.com', google_id=f'bulk-{i}',
+                       name=f'Bulk Student {i}').save() for i in range(3)]
+        outsider = User(email='outsider@example.com', google_id='bulk-outsider',
+                        name='Not Enrolled').save()
+        classroom = Classroom(
+            name='Bulk Grade Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student] + others,
+            join_code=join_code
+        )
+        classroom.save()
+        assignment = Assignment(classroom=classroom, title='Exam', points_possible=50).save()
+        return classroom, assignment, others, outsider
+
+    def _cleanup(self, classroom, assignment, others, outsider):
+        Grade.objects(assignment=assignment).delete()
+        assignment.delete()
+        ClassroomStats.objects(id=classroom.id).delete()
+        classroom.delete()
+        User.objects(id__in=[o.id for o in others] + [outsider.id]).delete()
+
+    def test_bulk_upsert_reports_rows(self, authenticated_client, student_client):
+        """Valid rows are upserted in one request; bad rows are reported, not fatal."""
+        client, instructor = authenticated_client
+        _, student = student_client
+        classroom, assignment, others, outsider = self._setup(instructor, student, 'BULK01')
+        Grade(assignment=assignment, student=student, score=20, feedback='Keep me').save()
+
+        try:
+            # Build the rollup first so the bulk write has to keep it current
+            get_statistics(classroom)
+            url = f'/api/grades/assignment/{assignment.id}/grades/bulk'
+            response = client.post(url, json={'grades': [
+                {'student_id': str(student.id), 'score': 40},
+                {'student_id': str(others[0].id), 'score': '45.5', 'feedback': 'Great'},
+                {'student_id': str(others[1].id), 'score': None},
+                {'student_id': str(outsider.id), 'score': 10},
+                {'student_id': 'not-an-id', 'score': 10},
+                {'student_id': str(others[2].id), 'score': 'lots'},
+                {'student_id': str(others[0].id), 'score': 1},
+                {'student_id': str(others[2].id)},
+            ]})
+            assert response.status_code == 200
+            report = response.get_json()
+            assert (report['created'], report['updated'], report['failed']) == (2, 1, 5)
+            assert [r['status'] for r in report['results']] == [
+                'updated', 'created', 'created', 'error', 'error', 'error', 'error', 'error']
+            assert [r.get('error') for r in report['results'][3:]] == [
+                'Student not enrolled', 'Student not found', 'Invalid score',
+                'Duplicate student', 'Each entry needs student_id and score']
+
+            grades = {g.student.id: g for g in Grade.objects(assignment=assignment)}
+            assert grades[student.id].score == 40
+            assert grades[student.id].feedback == 'Keep me'
+            assert grades[others[0].id].score == 45.5
+            assert grades[others[0].id].feedback == 'Great'
+            assert grades[others[1].id].score is None
+            assert get_statistics(classroom) == compute_statistics(classroom)
+
+            bad = client.post(url, json={'grades': 'nope'})
+            assert bad.status_code == 400
+        finally:
+            self._cleanup(classroom, assignment, others, outsider)
+
+    def test_csv_upload(self, authenticated_client, student_client):
+        """Scores upload by email; blank scores are skipped."""
+        client, instructor = authenticated_client
+        _, student = student_client
+        classroom, assignment, others, outsider = self._setup(instructor, student, 'BULK02')
+
+        csv_data = (
+            "Email,Score,Feedback\n"
+            "student@example.com,48,Excellent\n"
+            "bulk0@example.com,,\n"
+            "nobody@example.com,30,\n"
+            ",12,\n"
+            "bulk1@example.com,33.5,\n"
+        )
+
+        try:
+            url = f'/api/grades/assignment/{assignment.id}/grades/import'
+            response = client.post(
+                url,
+                data={'file': (io.BytesIO(csv_data.encode()), 'scores.csv')},
+                content_type='multipart/form-data'
+            )
+            assert response.status_code == 200
+            report = response.get_json()
+            assert [(r['row'], r['status']) for r in report['results']] == [
+                (2, 'created'), (3, 'skipped'), (4, 'error'), (5, 'error'), (6, 'created')]
+
+            scores = {g.student.id: g.score for g in Grade.objects(assignment=assignment)}
+            assert scores == {student.id: 48, others[1].id: 33.5}
+
+            missing_column = client.post(
+                url,
+                data={'file': (io.BytesIO(b"Email,Name\nstudent@example.com,x\n"), 'x.csv')},
+                content_type='multipart/form-data'
+            )
+            assert missing_column.status_code == 400
+        finally:
+            self._cleanup(classroom, assignment, others, outsider)
+
+    def test_unreadable_csv_keeps_written_rows(self, authenticated_client, student_client):
+        """A file that breaks partway reports what was written and bumps the version."""
+        client, instructor = authenticated_client
+        _, student = student_client
+        classroom, assignment, others, outsider = self._setup(instructor, student, 'BULK03')
+        url = f'/api/grades/assignment/{assignment.id}/grades/import'
+        # Past the decoder's first read, so the header and first rows decode fine
+        padding = b"bulk0@example.com,\n" * 1000
+
+        try:
+            for broken in (b"bulk1@example.com,\xff\xfe\n",
+                           b'bulk1@example.com,"' + b'x' * 200000 + b'"\n'):
+                version = classroom_version(classroom.id)
+                response = client.post(url, data={'file': (io.BytesIO(
+                    b"email,score\nstudent@example.com,41\n" + padding + broken
+                ), 'scores.csv')}, content_type='multipart/form-data')
+
+                assert response.status_code == 400
+                report = response.get_json()
+                assert not report['ok']
+                assert report['error'].startswith('Stopped reading after line')
+                assert report['created'] + report['updated'] == 1
+                assert Grade.objects(assignment=assignment, student=student).first().score == 41
+                assert classroom_version(classroom.id) != version
+
+            # Nothing is written when even the header cannot be read
+            unreadable = client.post(url, data={'file': (io.BytesIO(b"\xff\xfe\x00,"), 'x.csv')},
+                                     content_type='multipart/form-data')
+            assert unreadable.status_code == 400
+            assert 'results' not in unreadable.get_json()
+        finally:
+            self._cleanup(classroom, assignment, others, outsider)
+
+    def test_requires_instructor(self, authenticated_client, student_client):
+        """Students cannot bulk grade."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom, assignment, others, outsider = self._setup(instructor, student, 'BULK03')
+
+        try:
+            response = client.post(
+                f'/api/grades/assignment/{assignment.id}/grades/bulk',
+                json={'grades': [{'student_id': str(student.id), 'score': 50}]})
+            assert response.status_code == 403
+            assert Grade.objects(assignment=assignment).count() == 0
+        finally:
+            self._cleanup(classroom, assignment, others, outsider)
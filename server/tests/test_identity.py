@@ -0,0 +1,50 @@
+"""
+Tests for the request-scoped identity map.
+"""
+from flask import session
+from models import User, Classroom
+from identity import get_current_user, get_document, get_reference, is_instructor
+
+
+class TestIdentityMap:
+    """Test per-request document reuse."""
+
+    def test_current_user_loaded_once(self, app, authenticated_client):
+        """The session user should be the same instance for the whole request."""
+        _, instructor = authenticated_client
+
+        with app.test_request_context():
+            session['user_id'] = str(instructor.id)
+            user = get_current_user()
+
+            assert user.id == instructor.id
+            assert get_current_user() is user
+            assert get_document(User, instructor.id) is user
+
+    def test_reference_resolved_from_map(self, app, authenticated_client):
+        """References to already-loaded documents should reuse them."""
+        _, instructor = authenticated_client
+        classroom = Classroom(
+            name='Identity Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='IDEN01'
+        )
+        classroom.save()
+
+        try:
+            with app.test_request_context():
+                session['user_id'] = str(instructor.id)
+                user = get_current_user()
+                loaded = get_document(Classroom, str(classroom.id))
+
+                assert get_reference(loaded, 'instructor') is user
+                assert is_instructor(loaded, user)
+                assert not is_instructor(None, user)
+        finally:
+            classroom.delete()
+
+    def test_no_session_user(self, app):
+        """Without a session user there is nothing to load."""
+        with app.test_request_context():
+            assert get_current_user() is None
@@ -0,0 +1,65 @@
+"""
+Tests for the index bootstrap and startup check.
+"""
+import os
+import runpy
+import mongoengine
+import pytest
+from models import Assignment, AttendanceEntry
+from indexes import ensure_indexes, index_report, require_unique_indexes
+
+
+class TestIndexes:
+    """Test declared-index reporting and the bootstrap command."""
+
+    def test_missing_indexes_are_reported_and_built(self, app):
+        """A dropped index shows up as missing until ensure-indexes runs."""
+        ensure_indexes()
+        collection = Assignment._get_collection()
+        collection.drop_index('classroom_1__id_1')
+
+        report = index_report()
+        assert report['assignments']['missing'] == [[('classroom', 1), ('_id', 1)]]
+
+        result = app.test_cli_runner().invoke(args=['ensure-indexes'])
+        assert 'assignments: classroom_1__id_1' in result.output
+        assert 'assignments' not in index_report()
+
+        output = app.test_cli_runner().invoke(args=['check-indexes']).output
+        assert 'missing' not in output
+
+    def test_unique_indexes_required_without_auto_create(self, monkeypatch, app):
+        """With AUTO_CREATE_INDEXES=false a missing unique index stops startup."""
+        ensure_indexes()
+        require_unique_indexes()
+        AttendanceEntry._get_collection().drop_index('session_1_student_1')
+
+        try:
+            # The first-query build would restore it, so only fail when it is off
+            require_unique_indexes()
+            monkeypatch.setenv('AUTO_CREATE_INDEXES', 'false')
+            with pytest.raises(RuntimeError, match='attendance_records'):
+                require_unique_indexes()
+        finally:
+            ensure_indexes()
+        require_unique_indexes()
+
+    def test_unique_index_check_runs_at_server_start(self, monkeypatch, app):
+        """Importing the app never checks; gunicorn's when_ready does."""
+        config = runpy.run_path(os.path.join(app.root_path, 'gunicorn.conf.py'))
+        # Keep the test connection instead of opening the configured one
+        monkeypatch.setattr(mongoengine, 'connect', lambda **kwargs: None)
+        monkeypatch.setattr(mongoengine, 'disconnect', lambda: None)
+        monkeypatch.setenv('AUTO_CREATE_INDEXES', 'false')
+        AttendanceEntry._get_collection().drop_index('session_1_student_1')
+
+        try:
+            result = app.test_cli_runner().invoke(args=['ensure-indexes'])
+            assert 'attendance_records: session_1_student_1' in result.output
+            config['when_ready'](None)
+
+            AttendanceEntry._get_collection().drop_index('session_1_student_1')
+            with pytest.raises(RuntimeError):
+                config['when_ready'](None)
+        finally:
+            ensure_indexes()
@@ -0,0 +1,167 @@
+"""
+Tests for background import/export jobs.
+"""
+import datetime
+import io
+from concurrent.futures.process import BrokenProcessPool
+import jobs
+from models import User, Classroom, Job
+from jobs import result_store
+
+
+class TestJobs:
+    """Test job submission, status and downloads (inline executor)."""
+
+    def test_export_job_download(self, authenticated_client, student_client):
+        """An export job should finish and serve its CSV to the owner only."""
+        client, instructor = authenticated_client
+        other_client, student = student_client
+        classroom = Classroom(
+            name='Job Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='JOBS01'
+        )
+        classroom.save()
+
+        try:
+            response = client.post(f'/api/jobs/classrooms/{classroom.id}/exports/roster')
+            assert response.status_code == 202
+            job_id = response.get_json()['id']
+
+            status = client.get(f'/api/jobs/{job_id}').get_json()
+            assert status['status'] == 'succeeded'
+            assert status['progress'] == 100
+            assert status['download_ready']
+            assert status['created_at'].endswith('Z')
+            assert status['finished_at'].endswith('Z')
+
+            download = client.get(f'/api/jobs/{job_id}/download')
+            assert download.status_code == 200
+            assert download.mimetype == 'text/csv'
+            assert 'student@example.com' in download.get_data(as_text=True)
+            assert result_store().exists(Job.objects(id=job_id).first().id)
+
+            assert other_client.get(f'/api/jobs/{job_id}').status_code == 404
+        finally:
+            for stored in Job.objects(classroom=classroom).scalar('id'):
+                result_store().delete(stored)
+            Job.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_import_job_report(self, authenticated_client):
+        """An import job should store the per-row report as its result."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='Job Import Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='JOBS02'
+        )
+        classroom.save()
+        csv_data = b"email,name\njobstudent@example.com,Job Student\n,Missing Email\n"
+
+        try:
+            response = client.post(
+                f'/api/jobs/classrooms/{classroom.id}/roster/import',
+                data={'file': (io.BytesIO(csv_data), 'roster.csv')},
+                content_type='multipart/form-data'
+            )
+            assert response.status_code == 202
+            job_id = response.get_json()['id']
+
+            last = client.get(f'/api/jobs/{job_id}').get_json()
+            assert last['status'] == 'succeeded'
+            assert last['result']['added'] == 1
+            assert len(last['result']['errors']) == 1
+            assert not last['download_ready']
+
+            assert client.get(f'/api/jobs/{job_id}/download').status_code == 409
+        finally:
+            Job.objects(classroom=classroom).delete()
+            classroom.delete()
+            User.objects(email='jobstudent@example.com').delete()
+
+    def test_unknown_export_kind(self, authenticated_client):
+        """Only roster, attendance and grades exports exist."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='Job Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='JOBS03'
+        )
+        classroom.save()
+
+        try:
+            response = client.post(f'/api/jobs/classrooms/{classroom.id}/exports/everything')
+            assert response.status_code == 404
+        finally:
+            classroom.delete()
+
+    def test_sweep_recovers_lost_jobs(self, app, authenticated_client):
+        """Stale queued jobs run again, stuck ones fail, orphaned results go."""
+        _, instructor = authenticated_client
+        classroom = Classroom(
+            name='Sweep Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='JOBS04'
+        )
+        classroom.save()
+        long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+        queued = Job(kind='roster_export', classroom=classroom, owner=instructor,
+                     created_at=long_ago).save()
+        fresh = Job(kind='roster_export', classroom=classroom, owner=instructor).save()
+        stuck = Job(kind='roster_export', classroom=classroom, owner=instructor,
+                    status='running', started_at=long_ago).save()
+        orphan = result_store().put(b'email\n', filename='roster.csv')
+
+        try:
+            result = app.test_cli_runner().invoke(args=['sweep-jobs'])
+            assert 'Requeued 1 job(s), failed 1 stuck job(s), removed 1' in result.output
+            assert queued.reload().status == 'succeeded'
+            assert fresh.reload().status == 'queued'
+            assert stuck.reload().status == 'failed'
+            assert not result_store().exists(orphan)
+            assert result_store().exists(queued.id)
+        finally:
+            result_store().delete(queued.id)
+            Job.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_broken_pool_is_replaced(self, monkeypatch, authenticated_client):
+        """A pool whose process died is discarded and the job resubmitted."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='Broken Pool Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='JOBS05'
+        )
+        classroom.save()
+
+        class BrokenPool:
+            def submit(self, *args):
+                raise BrokenProcessPool('A process in the pool was terminated abruptly')
+
+            def shutdown(self, wait=True):
+                pass
+
+        monkeypatch.setenv('JOB_EXECUTOR', 'thread')
+        monkeypatch.setattr(jobs, '_executor', BrokenPool())
+
+        try:
+            response = client.post(f'/api/jobs/classrooms/{classroom.id}/exports/roster')
+            assert response.status_code == 202
+            job_id = response.get_json()['id']
+            assert not isinstance(jobs._executor, BrokenPool)
+            jobs._executor.shutdown(wait=True)
+            assert client.get(f'/api/jobs/{job_id}').get_json()['status'] == 'succeeded'
+        finally:
+            jobs._executor = None
+            for stored in Job.objects(classroom=classroom).scalar('id'):
+                result_store().delete(stored)
+            Job.objects(classroom=classroom).delete()
+            classroom.delete()
@@ -0,0 +1,85 @@
+"""
+Tests for the app's JSON provider.
+"""
+import datetime
+import json
+import pytest
+from bson import ObjectId
+from models import User, AttendanceSession, Classroom
+import json_provider
+
+
+BACKENDS = [
+    pytest.param(None, id='stdlib'),
+    pytest.param(json_provider.orjson, id='orjson', marks=pytest.mark.skipif(
+        json_provider.orjson is None, reason='orjson is not installed')),
+]
+
+
+class TestJSONProvider:
+    """Test native encoding of Mongo types on both encoding paths."""
+
+    @pytest.mark.parametrize('backend', BACKENDS)
+    def test_encodes_mongo_types(self, app, monkeypatch, backend):
+        """ObjectId, datetimes, documents and raw rows serialize directly."""
+        user = User(email='json@example.com', google_id='json-1', name='Json User').save()
+        try:
+            oid = ObjectId()
+            aware = datetime.datetime(2026, 3, 1, 7, 30, tzinfo=datetime.timezone(
+                datetime.timedelta(hours=-5)))
+            row = User.objects(id=user.id).only('name').as_pymongo().first()
+            payload = {
+                'id': oid,
+                'naive': datetime.datetime(2026, 3, 1, 12, 30, 0, 250000),
+                'aware': aware,
+                'day': datetime.date(2026, 3, 1),
+                'user': user,
+                'row': row,
+            }
+
+            monkeypatch.setattr(json_provider, 'orjson', backend)
+            data = json.loads(app.json.dumps(payload))
+            assert data['id'] == str(oid)
+            assert data['naive'] == '2026-03-01T12:30:00.250000Z'
+            assert data['aware'] == '2026-03-01T12:30:00Z'
+            assert data['day'] == '2026-03-01'
+            assert data['user']['id'] == str(user.id)
+            assert data['user']['name'] == 'Json User'
+            assert '_id' not in data['user']
+            assert data['row'] == {'_id': str(user.id), 'name': 'Json User'}
+        finally:
+            user.delete()
+
+    @pytest.mark.parametrize('backend', BACKENDS)
+    def test_non_ascii_text(self, app, monkeypatch, backend):
+        """Only the escaping of non-ASCII text differs between the paths."""
+        monkeypatch.setattr(json_provider, 'orjson', backend)
+        encoded = app.json.dumps({'name': 'Zoë'})
+        assert json.loads(encoded) == {'name': 'Zoë'}
+        assert encoded == ('{"name":"Zoë"}' if backend else '{"name": "Zo\\u00eb"}')
+
+    def test_route_dates_keep_their_format(self, authenticated_client):
+        """Datetimes handed to jsonify come out as ISO 8601 UTC with Z."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='JSON Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='JSON01'
+        )
+        classroom.save()
+
+        try:
+            response = client.post(f'/api/roster/{classroom.id}/attendance/sessions')
+            assert response.status_code == 200
+            date = response.get_json()['date']
+            assert date.endswith('Z')
+            assert datetime.datetime.fromisoformat(date.replace('Z', '+00:00'))
+
+            listed = client.get(f'/api/roster/{classroom.id}/attendance/sessions').get_json()
+            # MongoDB stores milliseconds, so compare to the second
+            assert listed[0]['date'].endswith('Z')
+            assert listed[0]['date'][:19] == date[:19]
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
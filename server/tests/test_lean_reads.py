@@ -0,0 +1,137 @@
+"""
+Equivalence tests for the lean read path.
+"""
+import datetime
+import pytest
+from models import User, Classroom, AttendanceSession, Assignment, Grade
+from attendance_store import add_checkin
+import lean_reads
+from lean_reads import configure_lean_reads, lean_enabled
+
+
+@pytest.fixture
+def busy_class(authenticated_client, student_client):
+    """A class with a roster, open and closed sessions, assignments and grades."""
+    _, instructor = authenticated_client
+    _, student = student_client
+    others = [User(email=f'lean{i}@example.com', google_id=f'lean-{i}',
+                   name=f'Lean Student {i}', major='Math', grad_year=2027).save()
+              for i in range(3)]
+    classroom = Classroom(
+        name='Lean Class',
+        term='Fall 2026',
+        instructor=instructor,
+        students=[student] + others,
+        join_code='LEAN01'
+    )
+    classroom.save()
+
+    base = datetime.datetime(2026, 9, 1, 9, 0)
+    static = AttendanceSession(classroom=classroom, code='4321', date=base).save()
+    rotating = AttendanceSession(classroom=classroom, code_mode='rotating',
+                                 date=base + datetime.timedelta(days=1)).save()
+    for s in [student] + others[:2]:
+        add_checkin(static.id, classroom.id, s, None)
+    add_checkin(rotating.id, classroom.id, others[0], None)
+    static.update(set__is_open=False)
+
+    graded = Assignment(classroom=classroom, title='Essay', description='Write',
+                        points_possible=10, due_date=base).save()
+    Assignment(classroom=classroom, title='Quiz', points_possible=5).save()
+    Grade(assignment=graded, student=student, score=9, feedback='Good').save()
+    Grade(assignment=graded, student=others[0], score=7).save()
+
+    yield classroom, graded, others
+    Grade.objects(assignment__in=Assignment.objects(classroom=classroom)).delete()
+    Assignment.objects(classroom=classroom).delete()
+    AttendanceSession.objects(classroom=classroom).delete()
+    classroom.delete()
+    User.objects(id__in=[o.id for o in others]).delete()
+
+
+def _use(monkeypatch, value):
+    """Switch LEAN_READS for this test, as if the app started with ``value``."""
+    monkeypatch.setenv('LEAN_READS', value)
+    monkeypatch.setattr(lean_reads, '_routes', lean_reads.lean_routes())
+
+
+def _get_both(monkeypatch, client, url):
+    """Return the JSON of ``url`` read through documents and through raw rows."""
+    _use(monkeypatch, 'none')
+    documents = client.get(url)
+    _use(monkeypatch, 'all')
+    lean = client.get(url)
+    assert documents.status_code == lean.status_code == 200
+    return documents.get_json(), lean.get_json()
+
+
+class TestLeanReads:
+    """Test that raw-row reads return exactly what document reads return."""
+
+    def test_route_switch(self, monkeypatch):
+        """LEAN_READS takes all, none or a list of route names, read once."""
+        monkeypatch.setattr(lean_reads, '_routes', None)
+        assert lean_enabled('roster')
+        monkeypatch.setenv('LEAN_READS', 'roster, grades')
+        # The value is cached until the app is configured again
+        assert lean_enabled('sessions')
+        configure_lean_reads()
+        assert lean_enabled('grades') and not lean_enabled('sessions')
+        monkeypatch.setenv('LEAN_READS', 'none')
+        configure_lean_reads()
+        assert not lean_enabled('roster')
+        monkeypatch.setenv('LEAN_READS', 'roster,bogus')
+        with pytest.raises(ValueError):
+            configure_lean_reads()
+
+    def test_instructor_reads_match(self, monkeypatch, authenticated_client, busy_class):
+        """Roster, sessions, assignments and grades match for the instructor."""
+        client, _ = authenticated_client
+        classroom, graded, _ = busy_class
+        urls = [
+            f'/api/roster/{classroom.id}/students',
+            f'/api/roster/{classroom.id}/attendance/sessions',
+            f'/api/grades/{classroom.id}/assignments',
+            f'/api/grades/{classroom.id}/assignments?limit=1',
+            f'/api/grades/assignment/{graded.id}/grades',
+        ]
+        for url in urls:
+            documents, lean = _get_both(monkeypatch, client, url)
+            assert documents == lean, url
+            assert lean
+
+    def test_student_reads_match(self, monkeypatch, student_client, busy_class):
+        """Session flags, assignment grades and the own-grade read match for a student."""
+        client, _ = student_client
+        classroom, graded, _ = busy_class
+        urls = [
+            f'/api/roster/{classroom.id}/attendance/sessions',
+            f'/api/grades/{classroom.id}/assignments',
+            f'/api/grades/assignment/{graded.id}/grades',
+        ]
+        for url in urls:
+            documents, lean = _get_both(monkeypatch, client, url)
+            assert documents == lean, url
+
+        sessions = client.get(f'/api/roster/{classroom.id}/attendance/sessions').get_json()
+        assert [s['has_checked_in'] for s in sessions] == [False, True]
+        assert all(s['code'] is None for s in sessions)
+
+    @pytest.mark.parametrize('mode', ['all', 'none'])
+    def test_both_paths_self_heal(self, monkeypatch, mode, authenticated_client, busy_class):
+        """Dangling students are pruned from the roster and their grades removed."""
+        client, _ = authenticated_client
+        classroom, graded, others = busy_class
+        _use(monkeypatch, mode)
+        # Remove the user without the delete rules, leaving dangling references
+        User._get_collection().delete_one({'_id': others[0].id})
+
+        roster = client.get(f'/api/roster/{classroom.id}/students').get_json()
+        assert str(others[0].id) not in [s['id'] for s in roster]
+        assert len(roster) == 3
+        classroom.reload()
+        assert others[0].id not in [s.id for s in classroom.students]
+
+        grades = client.get(f'/api/grades/assignment/{graded.id}/grades').get_json()
+        assert [g['student_name'] for g in grades] == ['Test Student']
+        assert Grade.objects(assignment=graded).count() == 1
@@ -0,0 +1,702 @@
+"""
+Tests for roster and attendance endpoints.
+"""
+import csv
+import datetime
+import io
+import os
+import time
+import pytest
+import checkin_buffer
+from attendance_store import add_checkin, set_status, status_map
+from attendance_codes import code_matches, current_code
+from models import (
+    User, Classroom, AttendanceSession, AttendanceRecord, AttendanceEntry,
+    ClassroomStats
+)
+
+
+class TestAttendanceExport:
+    """Test the streamed attendance CSV export."""
+
+    def test_export_attendance_csv(self, authenticated_client, student_client):
+        """Each student row should carry one status per session and a rate."""
+        instructor_client, instructor = authenticated_client
+        _, student = student_client
+        other = User(
+            email='aaron@example.com',
+            google_id='export-google-id-aaron',
+            name='Aaron Early'
+        )
+        other.save()
+
+        classroom = Classroom(
+            name='Export Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student, other],
+            join_code='EXPT01'
+        )
+        classroom.save()
+
+        first = AttendanceSession(
+            classroom=classroom,
+            date=datetime.datetime(2026, 9, 1),
+            records=[AttendanceRecord(student=student, status='present'),
+                     AttendanceRecord(student=other, status='late')]
+        )
+        first.save()
+        second = AttendanceSession(
+            classroom=classroom,
+            date=datetime.datetime(2026, 9, 3),
+            records=[AttendanceRecord(student=student, status='present')]
+        )
+        second.save()
+
+        try:
+            response = instructor_client.get(
+                f'/api/roster/{classroom.id}/attendance/export')
+
+            assert response.status_code == 200
+            assert response.mimetype == 'text/csv'
+            rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+            assert rows[0] == ['Name', 'Email', 'Student ID',
+                               '2026-09-01', '2026-09-03', 'Attendance Rate']
+            assert rows[1] == ['Aaron Early', 'aaron@example.com', '',
+                               'late', 'absent', '0.0%']
+            assert rows[2] == ['Test Student', 'student@example.com', 'STU001',
+                               'present', 'present', '100.0%']
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+            other.delete()
+
+    def test_export_requires_instructor(self, authenticated_client, student_client):
+        """Students cannot export attendance."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Export Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='EXPT02'
+        )
+        classroom.save()
+
+        try:
+            response = client.get(f'/api/roster/{classroom.id}/attendance/export')
+            assert response.status_code == 403
+        finally:
+            classroom.delete()
+
+
+class TestRosterImport:
+    """Test the bulk roster CSV import."""
+
+    def test_import_reports_rows(self, authenticated_client, student_client):
+        """New, existing, duplicate and invalid rows should each be accounted for."""
+        client, instructor = authenticated_client
+        _, student = student_client
+        existing = User(
+            email='existing@example.com',
+            google_id='import-existing-google-id',
+            name='Existing User'
+        )
+        existing.save()
+        classroom = Classroom(
+            name='Import Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='IMPT01'
+        )
+        classroom.save()
+
+        csv_data = (
+            "Email,Name,Major,Grad_Year,Student_ID\n"
+            "new1@example.com,New One,Physics,2027,N1\n"
+            "existing@example.com,Existing User,,,\n"
+            "student@example.com,Test Student,,,\n"
+            "new1@example.com,New One Again,,,\n"
+            "nobody@example.com,,,,\n"
+            "not-an-email,Bad Email,,,\n"
+        )
+
+        try:
+            response = client.post(
+                f'/api/roster/{classroom.id}/students/import',
+                data={'file': (io.BytesIO(csv_data.encode()), 'roster.csv')},
+                content_type='multipart/form-data'
+            )
+
+            assert response.status_code == 200
+            data = response.get_json()
+            assert data['added'] == 2
+            assert data['created'] == 1
+            assert [(d['row'], d['reason']) for d in data['duplicates']] == [
+                (5, 'Duplicate row in file'), (4, 'Already enrolled')]
+            assert sorted(e['row'] for e in data['errors']) == [6, 7]
+
+            created = User.objects(email='new1@example.com').first()
+            assert created.major == 'Physics'
+            assert created.grad_year == 2027
+            assert not User.objects(email='not-an-email').first()
+
+            classroom.reload()
+            assert {s.id for s in classroom.students} == {
+                student.id, existing.id, created.id}
+        finally:
+            classroom.delete()
+            User.objects(email__in=['existing@example.com',
+                                    'new1@example.com']).delete()
+
+    def test_import_requires_file(self, authenticated_client):
+        """A request without a file part should be rejected."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='Import Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='IMPT02'
+        )
+        classroom.save()
+
+        try:
+            response = client.post(f'/api/roster/{classroom.id}/students/import')
+            assert response.status_code == 400
+        finally:
+            classroom.delete()
+
+
+class TestCheckin:
+    """Test the conditional check-in write."""
+
+    def test_checkin_outcomes(self, authenticated_client, student_client):
+        """Check-in succeeds once, then reports duplicates and closed sessions."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Checkin Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='CHKN01'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+
+        try:
+            url = '/api/roster/attendance/checkin'
+            payload = {'session_id': str(session_obj.id), 'code': '1234'}
+
+            assert client.post(url, json={**payload, 'code': '0000'}).status_code == 400
+            assert client.post(url, json=payload).status_code == 200
+
+            response = client.post(url, json=payload)
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Already checked in'
+
+            session_obj.reload()
+            assert len(session_obj.records) == 1
+            assert session_obj.records[0].status == 'present'
+
+            AttendanceSession.objects(id=session_obj.id).update_one(set__is_open=False)
+            assert client.post(url, json=payload).status_code == 404
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    @pytest.mark.parametrize('ingestion', ['direct', 'buffered'])
+    def test_checkin_requires_login_first(self, monkeypatch, tmp_path, client, ingestion):
+        """Anonymous check-ins get 401 whatever the body holds."""
+        monkeypatch.setenv('CHECKIN_INGESTION', ingestion)
+        monkeypatch.setenv('CHECKIN_SPILL_DIR', str(tmp_path))
+        monkeypatch.setattr(checkin_buffer, '_buffer', None)
+        url = '/api/roster/attendance/checkin'
+        assert client.post(url, data='not json', content_type='text/plain').status_code == 401
+        assert client.post(url, json={'session_id': 'x', 'code': '1'}).status_code == 401
+
+    def test_checkin_requires_enrollment(self, authenticated_client, student_client):
+        """Students outside the class cannot check in."""
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Checkin Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='CHKN02'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+
+        try:
+            response = client.post('/api/roster/attendance/checkin', json={
+                'session_id': str(session_obj.id), 'code': '1234'})
+            assert response.status_code == 403
+            session_obj.reload()
+            assert session_obj.records == []
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+
+class TestSessionDetails:
+    """Test the instructor's view of one session."""
+
+    def test_legacy_record_without_timestamp(self, monkeypatch, authenticated_client,
+                                             student_client):
+        """Records stored before timestamps existed are listed with a null time."""
+        monkeypatch.setenv('ATTENDANCE_STORAGE', 'embedded')
+        client, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Legacy Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='LEGACY'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='5555').save()
+        AttendanceSession._get_collection().update_one(
+            {'_id': session_obj.id},
+            {'$push': {'records': {'student': student.id, 'status': 'present'}}})
+
+        try:
+            response = client.get(f'/api/roster/attendance/session/{session_obj.id}')
+            assert response.status_code == 200
+            [record] = response.get_json()['records']
+            assert record['timestamp'] is None
+            assert record['status'] == 'present'
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+
+class TestAttendanceCollectionStorage:
+    """Test the one-document-per-record attendance layout."""
+
+    def test_checkin_export_and_stats(self, monkeypatch, authenticated_client, student_client):
+        """Check-in, manual marks, export and statistics should use the collection."""
+        monkeypatch.setenv('ATTENDANCE_STORAGE', 'collection')
+        instructor_client, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Collection Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='COLL01'
+        )
+        classroom.save()
+        first = AttendanceSession(classroom=classroom, code='1111',
+                                  date=datetime.datetime(2026, 9, 1))
+        first.save()
+        second = AttendanceSession(classroom=classroom, code='2222',
+                                   date=datetime.datetime(2026, 9, 2))
+        second.save()
+
+        try:
+            url = '/api/roster/attendance/checkin'
+            payload = {'session_id': str(first.id), 'code': '1111'}
+            assert client.post(url, json=payload).status_code == 200
+            assert client.post(url, json=payload).status_code == 400
+
+            response = instructor_client.post('/api/roster/attendance/manual_checkin', json={
+                'session_id': str(second.id), 'student_id': str(student.id),
+                'status': 'late'})
+            assert response.status_code == 200
+
+            first.reload()
+            assert first.records == []
+            assert AttendanceEntry.objects(classroom=classroom).count() == 2
+
+            details = instructor_client.get(f'/api/roster/attendance/session/{first.id}')
+            assert [r['email'] for r in details.get_json()['records']] == [
+                'student@example.com']
+
+            export = instructor_client.get(f'/api/roster/{classroom.id}/attendance/export')
+            rows = list(csv.reader(io.StringIO(export.get_data(as_text=True))))
+            assert rows[1][3:] == ['present', 'late', '50.0%']
+
+            stats = instructor_client.get(f'/api/classrooms/{classroom.id}/statistics')
+            assert stats.get_json()['attendance_rate'] == 50.0
+        finally:
+            AttendanceEntry.objects(classroom=classroom).delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
+
+    def test_checkin_checks_session_state(self, monkeypatch, authenticated_client,
+                                          student_client):
+        """Closed sessions and stale codes are refused before an entry is written."""
+        monkeypatch.setenv('ATTENDANCE_STORAGE', 'collection')
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Collection Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='COLL03'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='3333').save()
+
+        try:
+            assert add_checkin(session_obj.id, classroom.id, student, '4444') == 'closed'
+            session_obj.update(set__is_open=False)
+            assert add_checkin(session_obj.id, classroom.id, student, '3333') == 'closed'
+            assert add_checkin(session_obj.id, classroom.id, student, None) == 'closed'
+            assert AttendanceEntry.objects(session=session_obj).count() == 0
+
+            session_obj.update(set__is_open=True)
+            assert add_checkin(session_obj.id, classroom.id, student, '3333') == 'added'
+            assert add_checkin(session_obj.id, classroom.id, student, '3333') == 'duplicate'
+        finally:
+            AttendanceEntry.objects(classroom=classroom).delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_migrate_attendance_command(self, app, authenticated_client, student_client):
+        """Embedded records should be copied once and optionally cleared."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Migration Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='COLL02'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, records=[
+            AttendanceRecord(student=student, status='excused')])
+        session_obj.save()
+
+        try:
+            runner = app.test_cli_runner()
+            result = runner.invoke(args=['migrate-attendance'])
+            assert 'Migrated 1 record(s) from 1 session(s).' in result.output
+            runner.invoke(args=['migrate-attendance', '--clear-embedded'])
+
+            entries = AttendanceEntry.objects(session=session_obj)
+            assert entries.count() == 1
+            assert entries.first().status == 'excused'
+            session_obj.reload()
+            assert session_obj.records == []
+        finally:
+            AttendanceEntry.objects(classroom=classroom).delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+
+class TestBufferedCheckin:
+    """Test write-buffered check-in ingestion."""
+
+    @pytest.fixture
+    def buffered(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('CHECKIN_INGESTION', 'buffered')
+        monkeypatch.setenv('CHECKIN_SPILL_DIR', str(tmp_path))
+        monkeypatch.setattr(checkin_buffer, '_buffer', None)
+        return tmp_path
+
+    @pytest.mark.parametrize('storage', ['embedded', 'collection'])
+    def test_checkin_is_written_on_flush(self, monkeypatch, buffered, storage,
+                                         authenticated_client, student_client):
+        """Check-ins are acknowledged, spilled to disk and written in one flush."""
+        monkeypatch.setenv('ATTENDANCE_STORAGE', storage)
+        _, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Buffered Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code=f'BUF-{storage}'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+
+        try:
+            url = '/api/roster/attendance/checkin'
+            payload = {'session_id': str(session_obj.id), 'code': '1234'}
+
+            assert client.post(url, json={**payload, 'code': '0000'}).status_code == 400
+            assert client.post(url, json=payload).status_code == 200
+            response = client.post(url, json=payload)
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Already checked in'
+
+            # Acknowledged but not yet in MongoDB; the spill file holds it
+            assert status_map([session_obj.id])[session_obj.id] == {}
+            assert len(list(buffered.glob('checkins-*.jsonl'))[0].read_text().splitlines()) == 1
+
+            assert checkin_buffer.get_buffer().flush() == 1
+            assert status_map([session_obj.id])[session_obj.id] == {student.id: 'present'}
+            assert [p.read_text() for p in buffered.glob('checkins-*.jsonl')] == ['']
+        finally:
+            AttendanceEntry.objects(classroom=classroom).delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_idle_duplicate_sets_are_evicted(self, monkeypatch, buffered,
+                                             authenticated_client, student_client):
+        """Sessions idle past CHECKIN_SEEN_TTL drop their duplicate set."""
+        monkeypatch.setenv('CHECKIN_SEEN_TTL', '0')
+        monkeypatch.setenv('ATTENDANCE_STORAGE', 'embedded')
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Buffered Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='BUF-SEEN'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+
+        try:
+            buffer = checkin_buffer.CheckinBuffer(spill_dir=str(buffered),
+                                                  start_flusher=False)
+            assert buffer.submit(str(session_obj.id), '1234', str(student.id)) == 'added'
+            assert buffer._seen
+            assert buffer.flush() == 1
+            assert not buffer._seen
+
+            # A repeat after eviction is acknowledged but not written twice
+            assert buffer.submit(str(session_obj.id), '1234', str(student.id)) == 'added'
+            assert buffer.flush() == 0
+            session_obj.reload()
+            assert len(session_obj.records) == 1
+            buffer.close()
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_spilled_checkins_survive_a_crash(self, buffered, authenticated_client,
+                                              student_client):
+        """A new buffer replays the segments an unflushed buffer left behind."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Buffered Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='BUF-CRASH'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+
+        try:
+            crashed = checkin_buffer.CheckinBuffer(spill_dir=str(buffered),
+                                                   start_flusher=False)
+            assert crashed.submit(str(session_obj.id), '1234', str(student.id)) == 'added'
+
+            # A live buffer's segments are left alone
+            replacement = checkin_buffer.CheckinBuffer(spill_dir=str(buffered),
+                                                       start_flusher=False)
+            assert replacement.flush() == 0
+
+            # The process dying releases its lock; the next recovery pass
+            # (not just a new buffer) picks up the segment
+            crashed._owner_lock.close()
+            replacement._last_recover = 0
+            assert replacement.flush() == 1
+            assert replacement.flush() == 0
+            assert list(buffered.glob(f'*{crashed.owner}*')) == []
+            replacement.close()
+            assert list(buffered.iterdir()) == []
+
+            session_obj.reload()
+            assert [r.student.id for r in session_obj.records] == [student.id]
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_recovery_race_on_a_dead_owner(self, monkeypatch, buffered):
+        """A worker that loses the race for a dead owner still starts up."""
+        crashed = checkin_buffer.CheckinBuffer(spill_dir=str(buffered),
+                                               start_flusher=False)
+        crashed._owner_lock.close()
+
+        opened = []
+        lock_if_dead = checkin_buffer.CheckinBuffer._lock_if_dead
+
+        def lose_race(self, owner):
+            # The other worker recovers the owner and removes its lock file
+            # after this one has opened and locked it
+            dead, lock_file = lock_if_dead(self, owner)
+            os.remove(self._lock_path(owner))
+            opened.append(lock_file)
+            return dead, lock_file
+
+        monkeypatch.setattr(checkin_buffer.CheckinBuffer, '_lock_if_dead', lose_race)
+        replacement = checkin_buffer.CheckinBuffer(spill_dir=str(buffered),
+                                                   start_flusher=False)
+        assert opened and opened[0].closed
+        replacement.close()
+
+
+class TestRotatingCodes:
+    """Test HMAC-derived rotating check-in codes."""
+
+    def test_code_window(self, monkeypatch):
+        """Codes rotate every period and the previous step stays valid."""
+        monkeypatch.setenv('ATTENDANCE_CODE_PERIOD', '30')
+        monkeypatch.setenv('ATTENDANCE_CODE_WINDOW', '1')
+        session_id = '64b000000000000000000001'
+        now = 1_700_000_010
+
+        code, expires_at = current_code(session_id, now)
+        assert len(code) == 6 and code.isdigit()
+        assert expires_at == datetime.datetime.utcfromtimestamp(1_700_000_010 // 30 * 30 + 30)
+
+        assert code_matches(session_id, 'rotating', None, code, now)
+        assert code_matches(session_id, 'rotating', None, code, now + 30)
+        assert not code_matches(session_id, 'rotating', None, code, now + 60)
+        assert not code_matches('64b000000000000000000002', 'rotating', None, code, now)
+        # Non-ASCII input is refused, not a TypeError
+        assert not code_matches(session_id, 'rotating', None, '١٢٣٤٥٦', now)
+        assert not code_matches(session_id, 'rotating', None, 123456, now)
+
+    def test_rotating_session_checkin(self, monkeypatch, authenticated_client, student_client):
+        """Instructors see the current code and its expiry; students check in with it."""
+        monkeypatch.setenv('ATTENDANCE_CODE_MODE', 'rotating')
+        instructor_client, instructor = authenticated_client
+        client, student = student_client
+        classroom = Classroom(
+            name='Rotating Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='ROTATE01'
+        )
+        classroom.save()
+
+        try:
+            created = instructor_client.post(
+                f'/api/roster/{classroom.id}/attendance/sessions').get_json()
+            session_id = created['id']
+            assert AttendanceSession.objects(id=session_id).first().code is None
+
+            details = instructor_client.get(
+                f'/api/roster/attendance/session/{session_id}').get_json()
+            assert details['code_mode'] == 'rotating'
+            assert details['code'] == created['code']
+            assert details['code_expires_at'].endswith('Z')
+
+            url = '/api/roster/attendance/checkin'
+            stale, _ = current_code(session_id, time.time() - 300)
+            response = client.post(url, json={'session_id': session_id, 'code': stale})
+            assert response.status_code == 400
+
+            response = client.post(url, json={'session_id': session_id,
+                                              'code': details['code']})
+            assert response.status_code == 200
+            assert [r.student.id for r in AttendanceSession.objects(
+                id=session_id).first().records] == [student.id]
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            ClassroomStats.objects(id=classroom.id).delete()
+            classroom.delete()
+
+
+class TestSessionListing:
+    """Test the aggregated, date-paginated session list."""
+
+    @pytest.mark.parametrize('storage', ['embedded', 'collection'])
+    def test_counts_and_flags(self, monkeypatch, storage, authenticated_client, student_client):
+        """Instructors get status totals and students a flag, without any records."""
+        monkeypatch.setenv('ATTENDANCE_STORAGE', storage)
+        instructor_client, instructor = authenticated_client
+        client, student = student_client
+        others = [User(email=f'count{i}@example.com', google_id=f'count-{i}',
+                       name=f'Count {i}').save() for i in range(3)]
+        classroom = Classroom(
+            name='Counting Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student] + others,
+            join_code=f'CNT-{storage}'
+        )
+        classroom.save()
+        base = datetime.datetime(2026, 9, 1, 9, 0)
+        first = AttendanceSession(classroom=classroom, code='1111', date=base).save()
+        second = AttendanceSession(classroom=classroom, code='2222',
+                                   date=base + datetime.timedelta(days=1)).save()
+
+        try:
+            set_status(first.id, classroom.id, student, 'present')
+            set_status(first.id, classroom.id, others[0], 'late')
+            set_status(first.id, classroom.id, others[1], 'absent')
+            set_status(first.id, classroom.id, others[2], 'present')
+            set_status(second.id, classroom.id, others[0], 'present')
+            # A deleted user's record is not counted
+            User._get_collection().delete_one({'_id': others[2].id})
+
+            url = f'/api/roster/{classroom.id}/attendance/sessions'
+            listed = instructor_client.get(url).get_json()
+            assert [s['id'] for s in listed] == [str(second.id), str(first.id)]
+            assert listed[1]['counts'] == {'present': 1, 'late': 1, 'absent': 1, 'excused': 0}
+            assert listed[0]['counts']['present'] == 1
+            assert all('records' not in s for s in listed)
+
+            mine = client.get(url).get_json()
+            assert [s['has_checked_in'] for s in mine] == [False, True]
+            assert all('counts' not in s for s in mine)
+        finally:
+            AttendanceEntry.objects(classroom=classroom).delete()
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+            User.objects(id__in=[o.id for o in others]).delete()
+
+    def test_date_range_pagination(self, authenticated_client):
+        """Pages walk a date window newest first, including equal dates."""
+        client, instructor = authenticated_client
+        classroom = Classroom(
+            name='Paged Sessions Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='PAGE-SESS'
+        )
+        classroom.save()
+        base = datetime.datetime(2026, 9, 1, 9, 0)
+        # Two sessions share a date so the _id tie-break is exercised
+        days = [0, 1, 1, 2, 3, 10]
+        for day in days:
+            AttendanceSession(classroom=classroom, code='3333',
+                              date=base + datetime.timedelta(days=day)).save()
+
+        try:
+            url = f'/api/roster/{classroom.id}/attendance/sessions'
+            window = {'date_after': '2026-09-01T00:00:00Z', 'date_before': '2026-09-05T00:00:00Z'}
+            full = client.get(url, query_string=window).get_json()
+            assert len(full) == 5
+
+            paged = []
+            cursor = None
+            while True:
+                query = dict(window, limit=2)
+                if cursor:
+                    query['cursor'] = cursor
+                response = client.get(url, query_string=query)
+                assert response.status_code == 200
+                paged.extend(response.get_json())
+                cursor = response.headers.get('X-Next-Cursor')
+                if not cursor:
+                    break
+
+            assert [s['id'] for s in paged] == [s['id'] for s in full]
+            assert client.get(url, query_string={'date_after': 'soon'}).status_code == 400
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
@@ -0,0 +1,170 @@
+"""
+Tests for the cross-worker open-session cache.
+"""
+import os
+import session_cache
+from models import Classroom, AttendanceSession
+from enrollment import unenroll
+from session_cache import get_open_session, invalidate_session, validate_checkin
+
+
+class TestSessionCache:
+    """Test check-in validation against the shared cache."""
+
+    def test_warm_cache_needs_no_queries(self, monkeypatch, authenticated_client,
+                                        student_client):
+        """Once loaded, validation is answered without touching the database."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Cache Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='CACHE01'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+
+        try:
+            outcome, cached = validate_checkin(str(session_obj.id), '1234', student)
+            assert outcome == 'ok'
+            assert cached.classroom_id == classroom.id
+
+            # Any database read would now fail
+            monkeypatch.setattr(session_cache, 'AttendanceSession', None)
+            monkeypatch.setattr(session_cache, 'Classroom', None)
+            assert validate_checkin(str(session_obj.id), '1234', student)[0] == 'ok'
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_invalidation(self, authenticated_client, student_client):
+        """Closing a session and unenrolling a student take effect immediately."""
+        instructor_client, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Cache Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='CACHE02'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+        session_id = str(session_obj.id)
+
+        try:
+            assert validate_checkin(session_id, '1234', student)[0] == 'ok'
+
+            unenroll(classroom, student)
+            assert validate_checkin(session_id, '1234', student)[0] == 'not_enrolled'
+
+            Classroom.objects(id=classroom.id).update_one(push__students=student.id)
+            response = instructor_client.patch(f'/api/roster/attendance/session/{session_id}',
+                                               json={'is_open': False})
+            assert response.status_code == 200
+            assert validate_checkin(session_id, '1234', student)[0] == 'closed'
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_rejections_are_rechecked(self, authenticated_client, student_client):
+        """A stale cache never refuses a check-in the database would accept."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Cache Class',
+            term='Fall 2026',
+            instructor=instructor,
+            join_code='CACHE03'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+        session_id = str(session_obj.id)
+
+        try:
+            assert validate_checkin(session_id, '1234', student)[0] == 'not_enrolled'
+            assert validate_checkin('not-an-id', '1234', student)[0] == 'closed'
+
+            # Written behind the cache's back, e.g. by a worker on another host
+            Classroom.objects(id=classroom.id).update_one(push__students=student.id)
+            AttendanceSession.objects(id=session_obj.id).update_one(set__code='9999')
+            assert validate_checkin(session_id, '9999', student)[0] == 'ok'
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_rejections_keep_shared_entries(self, authenticated_client, student_client):
+        """A mistyped code is re-checked without rewriting the shared files."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Cache Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='CACHE04'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+        session_id = str(session_obj.id)
+        paths = [session_cache._path('session', session_obj.id),
+                 session_cache._path('classroom', classroom.id)]
+
+        try:
+            assert validate_checkin(session_id, '1234', student)[0] == 'ok'
+            before = [os.stat(p).st_ino for p in paths]
+            assert validate_checkin(session_id, '0000', student)[0] == 'invalid_code'
+            assert [os.stat(p).st_ino for p in paths] == before
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
+
+    def test_load_racing_invalidation_is_dropped(self, monkeypatch, authenticated_client,
+                                                 student_client):
+        """Data read before an invalidation is never written back over it."""
+        _, instructor = authenticated_client
+        _, student = student_client
+        classroom = Classroom(
+            name='Cache Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[student],
+            join_code='CACHE05'
+        )
+        classroom.save()
+        session_obj = AttendanceSession(classroom=classroom, code='1234')
+        session_obj.save()
+        invalidate_session(session_obj.id)
+
+        class RacingSessions:
+            """Answers the load, then closes the session before it is cached."""
+            objects = staticmethod(lambda **kwargs: RacingQuery(**kwargs))
+
+        class RacingQuery:
+            def __init__(self, **kwargs):
+                self.query = AttendanceSession.objects(**kwargs)
+
+            def only(self, *fields):
+                self.query = self.query.only(*fields)
+                return self
+
+            def first(self):
+                loaded = self.query.first()
+                AttendanceSession.objects(id=session_obj.id).update_one(set__is_open=False)
+                invalidate_session(session_obj.id)
+                return loaded
+
+        try:
+            monkeypatch.setattr(session_cache, 'AttendanceSession', RacingSessions)
+            assert get_open_session(session_obj.id).is_open
+            monkeypatch.undo()
+            assert not get_open_session(session_obj.id).is_open
+        finally:
+            AttendanceSession.objects(classroom=classroom).delete()
+            classroom.delete()
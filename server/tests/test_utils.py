@@ -0,0 +1,113 @@
+"""
+Tests for the self-healing reference helpers.
+"""
+from unittest import mock
+from models import User, Classroom, Assignment, Grade
+from utils import get_safe_list, get_safe_references
+
+
+def _make_user(suffix):
+    user = User(
+        email=f'helper{suffix}@example.com',
+        google_id=f'helper-google-id-{suffix}',
+        name=f'Helper {suffix}'
+    )
+    user.save()
+    return user
+
+
+class TestGetSafeList:
+    """Test batched resolution of reference lists."""
+
+    def test_returns_students_in_stored_order(self, authenticated_client):
+        """Valid references should come back as documents in list order."""
+        _, instructor = authenticated_client
+        students = [_make_user(i) for i in range(3)]
+        classroom = Classroom(
+            name='Safe List Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=list(reversed(students)),
+            join_code='SAFE01'
+        )
+        classroom.save()
+
+        try:
+            classroom = Classroom.objects(id=classroom.id).first()
+            result = get_safe_list(classroom, 'students')
+
+            assert [s.id for s in result] == [s.id for s in reversed(students)]
+            assert all(isinstance(s, User) for s in result)
+        finally:
+            classroom.delete()
+            for s in students:
+                s.delete()
+
+    def test_heals_dangling_references(self, authenticated_client):
+        """Missing users should be dropped and pulled from the stored list."""
+        _, instructor = authenticated_client
+        kept = _make_user('kept')
+        zombie = _make_user('zombie')
+        classroom = Classroom(
+            name='Zombie Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=[kept, zombie],
+            join_code='SAFE02'
+        )
+        classroom.save()
+
+        # Bypass reverse_delete_rule so the reference is left dangling
+        User._get_collection().delete_one({'_id': zombie.id})
+
+        try:
+            classroom = Classroom.objects(id=classroom.id).first()
+            result = get_safe_list(classroom, 'students')
+
+            assert [s.id for s in result] == [kept.id]
+            raw = Classroom._get_collection().find_one({'_id': classroom.id})
+            assert raw['students'] == [kept.id]
+        finally:
+            classroom.delete()
+            kept.delete()
+
+
+class TestGetSafeReferences:
+    """Test batched resolution of single references across many documents."""
+
+    def test_resolves_and_heals_in_bulk(self, authenticated_client):
+        """Students load in one query and grades of deleted students are removed."""
+        _, instructor = authenticated_client
+        students = [_make_user(f'ref{i}') for i in range(3)]
+        classroom = Classroom(
+            name='Safe Reference Class',
+            term='Fall 2026',
+            instructor=instructor,
+            students=students,
+            join_code='SAFE03'
+        )
+        classroom.save()
+        assignment = Assignment(classroom=classroom, title='Lab', points_possible=10).save()
+        for i, s in enumerate(students):
+            Grade(assignment=assignment, student=s, score=i).save()
+
+        # Bypass reverse_delete_rule so the reference is left dangling
+        User._get_collection().delete_one({'_id': students[1].id})
+
+        try:
+            grades = list(Grade.objects(assignment=assignment).no_dereference().order_by('score'))
+            with mock.patch.object(User, 'objects', wraps=User.objects) as user_queries:
+                result = get_safe_references(grades, 'student')
+            assert user_queries.call_count == 1
+
+            assert [getattr(s, 'id', None) for s in result] == [students[0].id, None, students[2].id]
+            assert Grade.objects(assignment=assignment).count() == 2
+
+            rows = get_safe_references(grades[:1], 'student', fields=('name',))
+            assert rows == [{'_id': students[0].id, 'name': 'Helper ref0'}]
+        finally:
+            Grade.objects(assignment=assignment).delete()
+            assignment.delete()
+            classroom.delete()
+            for s in (students[0], students[2]):
+                s.delete()
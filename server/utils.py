@@ -1,121 +1,194 @@
-from mongoengine.errors import DoesNotExist
+import csv
+import datetime
+from mongoengine.context_managers import no_dereference
 from bson import DBRef, ObjectId
 
 
-def get_safe_list(parent_doc, field_name):
+def get_ref_id(value):
+    """Extract the raw ObjectId from a Document, DBRef or ObjectId reference value."""
+    if isinstance(value, DBRef):
+        return value.id
+    if isinstance(value, ObjectId):
+        return value
+    return getattr(value, 'pk', None)
+
+
+def reference_id(doc, field_name):
+    """Return the ObjectId stored in a reference field without dereferencing it."""
+    if doc is None:
+        return None
+    return get_ref_id(doc._data.get(field_name))
+
+
+def reference_ids(doc, field_name):
+    """Return the ObjectIds stored in a list of references without dereferencing it."""
+    if doc is None or not hasattr(doc, field_name):
+        return []
+    with no_dereference(doc.__class__):
+        raw_items = list(getattr(doc, field_name) or [])
+    return [ref_id for ref_id in (get_ref_id(item) for item in raw_items)
+            if ref_id is not None]
+
+
+def parse_iso_datetime(value):
+    """Parse an ISO 8601 string (``Z`` suffix allowed) into a naive UTC datetime.
+
+    Raises ValueError if the string is not a valid timestamp.
+    """
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class _CsvLine:
+    """File-like sink that hands back each line csv.writer produces."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """Yield ``rows`` as CSV-formatted lines, one at a time, for a streamed Response."""
+    writer = csv.writer(_CsvLine())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def get_safe_list(parent_doc, field_name, fields=None):
     """
     Safely retrieves a ListField of ReferenceFields, automatically removing
     dangling references (zombies) to self-heal the database.
 
+    The raw ids are read without dereferencing and resolved with a single
+    ``$in`` query, so the cost no longer grows with one round trip per entry.
+    Any dangling ids are removed from the stored document with one ``$pull``.
+
     Args:
         parent_doc: The MongoEngine document instance (e.g., Classroom).
         field_name: The string name of the list field (e.g., 'students').
+        fields: Optional field names; when given, the referenced documents
+            are returned as raw ``as_pymongo()`` rows projected to them.
 
     Returns:
-        list: A list of valid, existing referenced documents.
+        list: A list of valid, existing referenced documents (or rows).
     """
     if not hasattr(parent_doc, field_name):
         return []
 
-    original_list = getattr(parent_doc, field_name)
-    valid_items = []
-    has_changes = False
-
-    # We iterate a copy of the list because we might modify the original structure
-    # or simply to filter. However, modifying 'original_list' in place via removal
-    # is tricky while iterating. Better to build a new list of valid items.
-
-    # Note: iterating 'original_list' yields Proxy objects.
-    # Accessing fields on them triggers the dereference.
-
-    for item in original_list:
-        try:
-            # Force dereference by accessing the PK (ID) and another field.
-            # Just accessing .id might be served from the DBRef/Proxy without DB hit.
-            # Accessing a concrete field forces the DB lookup.
-            if item.pk and item._data:
-                # _data access usually ensures it's loaded.
-                # Or just accessing a known field like 'id' is safest start,
-                # but 'id' might not trigger DoesNotExist if it's just the proxy ID.
-                # We typically need to touch a field that isn't the ID.
-                # But 'item' itself being truthy usually implies existence if fetched.
-                # Let's try explicitly reloading if in doubt, or just accessing 'id'
-                # inside the try block is standard.
-                # Actually, MongoEngine proxies raise DoesNotExist immediately upon access
-                # if the doc is missing.
-                _ = item.id
-                valid_items.append(item)
-        except (DoesNotExist, Exception):
-            # Found a zombie
-            has_changes = True
-            continue
-
-    if has_changes:
-        # Update the parent document to remove zombies permanently
+    field = parent_doc._fields.get(field_name)
+    target_cls = getattr(getattr(field, 'field', None), 'document_type', None)
+    if target_cls is None:
+        # Not a list of references - nothing to resolve
+        return list(getattr(parent_doc, field_name) or [])
+
+    # Collect the raw ids without triggering a per-item dereference
+    ids = reference_ids(parent_doc, field_name)
+
+    if not ids:
+        return []
+
+    # One round trip for every referenced document that still exists
+    targets = target_cls.objects(pk__in=list(set(ids)))
+    if fields:
+        found = {row['_id']: row for row in targets.only(*fields).as_pymongo()}
+    else:
+        found = {doc.pk: doc for doc in targets}
+    valid_items = [found[ref_id] for ref_id in ids if ref_id in found]
+    missing = list({ref_id for ref_id in ids if ref_id not in found})
+
+    if missing:
+        # Remove zombies permanently with a single atomic $pull
         # This is the "Self-Healing" part.
-        setattr(parent_doc, field_name, valid_items)
-        parent_doc.save()
+        parent_doc.__class__.objects(pk=parent_doc.pk).update_one(
+            **{f'pull__{field_name}__in': missing})
+        setattr(parent_doc, field_name,
+                [ref_id for ref_id in ids if ref_id in found] if fields else valid_items)
         print(f"Self-healed {parent_doc.__class__.__name__} {parent_doc.id}: "
-              f"Removed dangling references from {field_name}")
+              f"Removed {len(missing)} dangling references from {field_name}")
 
     return valid_items
 
 
-def get_safe_reference(parent_doc, field_name):
+def heal_dangling_references(parent_cls, field_name, parent_ids):
     """
-    Safely retrieves a ReferenceField, setting it to None if the reference is dangling.
+    Self-heals ``parent_cls`` documents whose ``field_name`` reference is dangling.
+
+    A required reference makes the parent invalid, so those parents are deleted;
+    an optional one is unset. Either way it is a single write for all of them.
     """
-    if not hasattr(parent_doc, field_name):
-        return None
+    parent_ids = list(parent_ids)
+    if not parent_ids:
+        return
+
+    parents = parent_cls.objects(pk__in=parent_ids)
+    field = parent_cls._fields.get(field_name)
+    if field and field.required:
+        parents.delete()
+        print(f"Self-healed: Deleted {len(parent_ids)} orphan {parent_cls.__name__}(s) "
+              f"because {field_name} is required")
+    else:
+        parents.update(**{f'unset__{field_name}': True})
+        print(f"Self-healed {len(parent_ids)} {parent_cls.__name__}(s): "
+              f"Nullified dangling reference {field_name}")
+
+
+def get_safe_references(docs, field_name, fields=None):
+    """
+    Batched ``get_safe_reference``: resolves ``field_name`` on every document
+    in ``docs`` (all of one class) with a single ``$in`` query.
 
-    try:
-        # Accessing the field triggers dereference in MongoEngine
-        ref = getattr(parent_doc, field_name)
-
-        if not ref:
-            return None
-
-        # If it's a DBRef or ObjectId (from no_dereference), we must verify it manually
-        if isinstance(ref, (DBRef, ObjectId)):
-            # Find the document class for this field
-            field = parent_doc._fields.get(field_name)
-            if not field:
-                return None
-
-            target_cls = field.document_type
-            ref_id = ref.id if isinstance(ref, DBRef) else ref
-
-            # Query existence
-            actual_doc = target_cls.objects(id=ref_id).first()
-            if not actual_doc:
-                raise DoesNotExist("Zombie DBRef detected")
-            return actual_doc
-
-        # If it's a Document/Proxy, ensure it's loaded
-        if hasattr(ref, 'reload'):
-            ref.reload()
-        elif hasattr(ref, 'pk'):
-            # Accessing pk usually doesn't trigger load, but reloading is safer
-            # If reload isn't available, accessing a field might help
-            _ = ref.pk
-
-        return ref
-
-    except (DoesNotExist, Exception) as e:
-        print(
-            f"Caught exception in get_safe_reference: {type(e).__name__}: {e}")
-        # Zombie reference
-
-        # Check if field is required - if so, we must delete the parent doc as it's invalid
-        field = parent_doc._fields.get(field_name)
-        if field and field.required:
-            parent_doc.delete()
-            print(f"Self-healed: Deleted orphan {parent_doc.__class__.__name__} {parent_doc.id} "
-                  f"because {field_name} is required")
+    The raw ids are read without dereferencing, so load ``docs`` with
+    ``no_dereference()`` or from a plain queryset. Dangling references are
+    healed in bulk with ``heal_dangling_references``.
+
+    Args:
+        docs: MongoEngine documents of the same class (e.g., Grades).
+        field_name: The string name of the reference field (e.g., 'student').
+        fields: Optional field names; when given, the referenced documents
+            are returned as raw ``as_pymongo()`` rows projected to them.
+
+    Returns:
+        list: Parallel to ``docs``; the referenced document (or row), or None
+        where the reference is empty or dangling.
+    """
+    docs = list(docs)
+    if not docs:
+        return []
+
+    parent_cls = docs[0].__class__
+    field = parent_cls._fields.get(field_name)
+    target_cls = getattr(field, 'document_type', None)
+    if target_cls is None:
+        # Not a reference field - nothing to resolve
+        return [getattr(doc, field_name, None) for doc in docs]
+
+    ids = [reference_id(doc, field_name) for doc in docs]
+    wanted = list({ref_id for ref_id in ids if ref_id is not None})
+    found = {}
+    if wanted:
+        # One round trip for every referenced document that still exists
+        targets = target_cls.objects(pk__in=wanted)
+        if fields:
+            found = {row['_id']: row for row in targets.only(*fields).as_pymongo()}
         else:
-            setattr(parent_doc, field_name, None)
-            parent_doc.save()
-            print(f"Self-healed {parent_doc.__class__.__name__} {parent_doc.id}: "
-                  f"Nullified dangling reference {field_name}")
+            found = {doc.pk: doc for doc in targets}
+
+    orphans = [doc for doc, ref_id in zip(docs, ids)
+               if ref_id is not None and ref_id not in found]
+    if orphans:
+        heal_dangling_references(parent_cls, field_name, [doc.pk for doc in orphans])
+        if not field.required:
+            for doc in orphans:
+                setattr(doc, field_name, None)
+
+    return [found.get(ref_id) for ref_id in ids]
+
 
+def get_safe_reference(parent_doc, field_name):
+    """
+    Safely retrieves a ReferenceField, setting it to None if the reference is dangling.
+    """
+    if not hasattr(parent_doc, field_name):
         return None
+    return get_safe_references([parent_doc], field_name)[0]